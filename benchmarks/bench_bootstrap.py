@@ -0,0 +1,73 @@
+# run with "PYTHONPATH=src python3 benchmarks/bench_bootstrap.py"
+"""
+Runs get_rest_devices end to end against FakeHatchServer and
+FakeShadowConnection and reports wall time and REST request counts as the
+fleet grows, without a client side rate limiter, which is the default. The last
+column is the least time an opted in RateLimiter() of DEFAULT_RATE requests per
+second would need for the same requests. Below each size, RestStats breaks the
+REST time down per endpoint.
+"""
+import asyncio
+import time
+
+from aiohttp import ClientSession
+from bench_state_extractor import REPORTED
+
+from hatch_rest_api.fake_rest import FakeHatchServer, fake_iot_devices
+from hatch_rest_api.fake_shadow import FakeShadowConnection
+from hatch_rest_api.rate_limit import DEFAULT_BURST, DEFAULT_RATE
+from hatch_rest_api.rest_stats import RestStats
+from hatch_rest_api.util_bootstrap import get_rest_devices
+
+FLEET_SIZES = (10, 100, 1000)
+PRODUCTS = ("riot", "restoreV5", "restBaby")
+# seconds per REST response and per MQTT hop
+SERVER_LATENCY = 0.005
+LINK_LATENCY = 0.005
+
+
+async def bootstrap(size: int) -> tuple[float, RestStats]:
+    iot_devices = fake_iot_devices(size, PRODUCTS)
+    connection = FakeShadowConnection(latency=LINK_LATENCY, seed=size)
+    rest_stats = RestStats()
+    for device in iot_devices:
+        connection.add_thing(device["thingName"], reported=REPORTED)
+    async with (
+        FakeHatchServer(iot_devices, latency=SERVER_LATENCY) as server,
+        ClientSession() as session,
+    ):
+        started = time.perf_counter()
+        api, _, devices, _ = await get_rest_devices(
+            "user@example.com",
+            "password",
+            client_session=session,
+            api_url=server.api_url,
+            contentful_url=server.contentful_url,
+            cognito_url=server.cognito_url,
+            mqtt_connection=connection,
+            rest_stats=rest_stats,
+        )
+        elapsed = time.perf_counter() - started
+        assert len(devices) == size
+    connection.close()
+    return elapsed, rest_stats
+
+
+async def run(sizes=FLEET_SIZES):
+    print(f"{'devices':>8} {'wall time':>10} {'requests':>9} {'with RateLimiter()':>19}")
+    for size in sizes:
+        elapsed, rest_stats = await bootstrap(size)
+        endpoints = rest_stats.snapshot()
+        requests = sum(stats.requests for stats in endpoints.values())
+        limited = max(requests - DEFAULT_BURST, 0) / DEFAULT_RATE
+        print(f"{size:8d} {elapsed * 1000:8.0f} ms {requests:9d} {limited:17.0f} s")
+        by_total_time = sorted(endpoints.items(), key=lambda item: -item[1].latency.sum)
+        for endpoint, stats in by_total_time:
+            print(
+                f"{'':8} {stats.requests:>21d}  {stats.latency.sum * 1000:7.0f} ms total"
+                f" {stats.mean_latency * 1000:6.1f} ms mean  {endpoint.client} {endpoint.path}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
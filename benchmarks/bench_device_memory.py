@@ -0,0 +1,69 @@
+# run with "PYTHONPATH=src python3 benchmarks/bench_device_memory.py"
+"""
+Measures the per-device memory of a simulated fleet: devices are created the
+way get_rest_devices does, share one sound catalog and apply a full reported
+shadow. The state record line compares the slotted record against the dict
+entries the same attributes took when they lived in each instance __dict__.
+"""
+import gc
+import sys
+import tracemalloc
+
+from bench_state_extractor import REPORTED
+
+from hatch_rest_api.rest_iot import RestIot
+from hatch_rest_api.restore_v5 import RestoreV5
+from hatch_rest_api.sound_catalog import SoundCatalog
+
+FLEET_SIZE = 1000
+CATALOG = SoundCatalog(
+    {"id": sound_id, "title": f"Sound {sound_id}", "wavUrl": f"https://example.com/{sound_id}.wav"}
+    for sound_id in range(120)
+)
+
+
+def build_fleet(device_class, size: int) -> list:
+    devices = []
+    for index in range(size):
+        device = device_class(
+            f"Device {index}", f"thing-{index}", f"mac-{index}", None,
+            sounds=CATALOG, subscribe=False,
+        )
+        device._update_local_state(REPORTED)
+        devices.append(device)
+    return devices
+
+
+def measure(device_class, size: int = FLEET_SIZE):
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    devices = build_fleet(device_class, size)
+    gc.collect()
+    total = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    device = devices[0]
+    state = device._state
+    record = sys.getsizeof(state)
+    as_dict = sys.getsizeof({slot: getattr(state, slot, None) for slot in type(state).__slots__})
+    catalog = device.sounds
+    indexes = sum(
+        sys.getsizeof(index)
+        for index in (catalog.by_id, catalog.by_title, catalog.wav_url_by_id)
+    )
+    shared = all(other.sounds is catalog for other in devices)
+    print(f"{device_class.__name__} x {size}")
+    print(f"  per device:    {total / size:8.0f} bytes")
+    print(f"  state record:  {record:8d} bytes ({len(type(state).__slots__)} slots, {as_dict} as a dict)")
+    print(f"  instance dict: {sys.getsizeof(device.__dict__):8d} bytes ({len(device.__dict__)} entries)")
+    print(f"  sound indexes: {indexes:8d} bytes ({'shared by every device' if shared else 'per device'})")
+
+
+def main():
+    for device_class in (RestIot, RestoreV5):
+        measure(device_class)
+
+
+if __name__ == "__main__":
+    main()
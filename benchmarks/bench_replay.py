@@ -0,0 +1,74 @@
+# run with "PYTHONPATH=src python3 benchmarks/bench_replay.py [recording.jsonl]"
+"""
+Replays shadow traffic into fresh RestIot devices and reports per-message parse
+and dispatch latency percentiles, at maximum speed and at the original pace.
+Without a recording, one is made first by running FLEET_SIZE devices through
+COMMANDS_PER_DEVICE volume changes against FakeShadowConnection. A recording
+of a real account can be made by setting
+ShadowClientSubscriberMixin.shadow_recorder before get_rest_devices.
+"""
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+from awsiot.iotshadow import IotShadowClient
+from bench_shadow import build_fleet
+from bench_state_extractor import REPORTED
+
+from hatch_rest_api.fake_shadow import FakeShadowConnection
+from hatch_rest_api.rest_iot import RestIot
+from hatch_rest_api.shadow_recorder import ShadowRecorder, read_recording, replay_shadow_traffic
+from hatch_rest_api.util_bootstrap import _subscribe_all
+
+FLEET_SIZE = 100
+COMMANDS_PER_DEVICE = 5
+LINK_LATENCY = 0.005
+
+
+async def record(path: Path):
+    connection = FakeShadowConnection(latency=LINK_LATENCY, seed=FLEET_SIZE)
+    devices = build_fleet(RestIot, connection, FLEET_SIZE)
+    recorder = ShadowRecorder(path)
+    for device in devices:
+        device.shadow_recorder = recorder
+    await _subscribe_all(devices)
+    for command in range(COMMANDS_PER_DEVICE):
+        converged = [
+            await device.async_update({"current": {"sound": {"v": 1000 * (command + 1)}}})
+            for device in devices
+        ]
+        await asyncio.wait_for(asyncio.gather(*converged), 10)
+    recorder.close()
+    connection.close()
+
+
+def fresh_devices(path: Path) -> dict:
+    connection = FakeShadowConnection()
+    shadow_client = IotShadowClient(connection)
+    thing_names = {record.thing_name for record in read_recording(path)}
+    return {
+        thing_name: RestIot(thing_name, thing_name, thing_name, shadow_client, subscribe=False)
+        for thing_name in sorted(thing_names)
+    }
+
+
+def run(path: Path):
+    print(f"{'speed':>8} {'messages':>9} {'elapsed':>9}  {'stage':<9} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+    for label, speed in (("max", None), ("original", 1.0)):
+        report = replay_shadow_traffic(path, fresh_devices(path), speed=speed)
+        for stage, summary in (("parse", report.parse), ("dispatch", report.dispatch)):
+            print(
+                f"{label:>8} {report.messages:9d} {report.elapsed:7.2f} s  {stage:<9}"
+                + "".join(f" {value * 1e6:5.0f} us" for value in summary[1:])
+            )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run(Path(sys.argv[1]))
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            recording = Path(directory) / "shadow.jsonl"
+            asyncio.run(record(recording))
+            run(recording)
@@ -0,0 +1,138 @@
+# run with "PYTHONPATH=src python3 benchmarks/bench_shadow.py"
+"""
+Runs simulated fleets against FakeShadowConnection instead of AWS IoT and
+reports, per device class and fleet size:
+
+- bootstrap: subscribing every device and applying its first shadow get, the
+  MQTT half of get_rest_devices
+- throughput: reported shadow messages parsed, applied and dispatched to
+  callbacks per second, with no network latency
+- round trip: publish to converged report for one command per device, all
+  devices at once, over a link with a few milliseconds of latency
+"""
+import asyncio
+import statistics
+import threading
+import time
+
+from awsiot.iotshadow import IotShadowClient
+from bench_state_extractor import REPORTED
+
+from hatch_rest_api.fake_shadow import FakeShadowConnection
+from hatch_rest_api.rest_iot import RestIot
+from hatch_rest_api.restore_v5 import RestoreV5
+from hatch_rest_api.util_bootstrap import _subscribe_all
+
+FLEET_SIZES = (10, 100, 1000)
+MESSAGES_PER_DEVICE = 20
+LINK_LATENCY = 0.005
+LINK_JITTER = 0.002
+DEVICE_LATENCY = 0.01
+
+
+def build_fleet(device_class, connection: FakeShadowConnection, size: int) -> list:
+    shadow_client = IotShadowClient(connection)
+    devices = []
+    for index in range(size):
+        connection.add_thing(f"thing-{index}", reported=REPORTED)
+        devices.append(
+            device_class(
+                f"Device {index}", f"thing-{index}", f"mac-{index}", shadow_client,
+                subscribe=False, track_convergence=True,
+            )
+        )
+    return devices
+
+
+def wait_for_callbacks(devices: list, count: int) -> threading.Event:
+    """Event set once the devices have notified their callbacks count times in total."""
+    done = threading.Event()
+    remaining = count
+    lock = threading.Lock()
+
+    def on_update():
+        nonlocal remaining
+        with lock:
+            remaining -= 1
+            if remaining == 0:
+                done.set()
+
+    for device in devices:
+        device.register_callback(on_update)
+    return done
+
+
+async def bootstrap(device_class, size: int) -> float:
+    connection = FakeShadowConnection(latency=LINK_LATENCY, jitter=LINK_JITTER, seed=size)
+    devices = build_fleet(device_class, connection, size)
+    applied = wait_for_callbacks(devices, size)
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    await _subscribe_all(devices)
+    await loop.run_in_executor(None, applied.wait)
+    elapsed = time.perf_counter() - started
+    connection.close()
+    return elapsed
+
+
+async def throughput(device_class, size: int) -> float:
+    connection = FakeShadowConnection()
+    devices = build_fleet(device_class, connection, size)
+    await _subscribe_all(devices)
+    await asyncio.sleep(0.1)
+    applied = wait_for_callbacks(devices, size * MESSAGES_PER_DEVICE)
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    for message in range(MESSAGES_PER_DEVICE):
+        # alternate so every message changes the volume
+        volume = 0 if message % 2 else 65535
+        for device in devices:
+            connection.report(device.thing_name, {"current": {"sound": {"v": volume}}})
+    await loop.run_in_executor(None, applied.wait)
+    elapsed = time.perf_counter() - started
+    connection.close()
+    return size * MESSAGES_PER_DEVICE / elapsed
+
+
+async def round_trip(device_class, size: int) -> list[float]:
+    connection = FakeShadowConnection(
+        latency=LINK_LATENCY, jitter=LINK_JITTER, device_latency=DEVICE_LATENCY, seed=size
+    )
+    devices = build_fleet(device_class, connection, size)
+    await _subscribe_all(devices)
+    await asyncio.sleep(0.1)
+
+    async def command(device) -> float:
+        started = time.perf_counter()
+        converged = await device.async_update({"current": {"sound": {"v": 65535}}})
+        await converged
+        return time.perf_counter() - started
+
+    samples = await asyncio.gather(*(command(device) for device in devices))
+    connection.close()
+    return samples
+
+
+def milliseconds(seconds: float) -> str:
+    return f"{seconds * 1000:7.1f} ms"
+
+
+async def run(sizes=FLEET_SIZES):
+    for device_class in (RestIot, RestoreV5):
+        for size in sizes:
+            bootstrap_time = await bootstrap(device_class, size)
+            messages_per_second = await throughput(device_class, size)
+            samples = await round_trip(device_class, size)
+            percentiles = statistics.quantiles(samples, n=100, method="inclusive")
+            print(f"{device_class.__name__} x {size}")
+            print(f"  bootstrap:  {milliseconds(bootstrap_time)}")
+            print(f"  throughput: {messages_per_second:7.0f} messages/s")
+            print(
+                f"  round trip: p50 {milliseconds(percentiles[49])}"
+                f"  p95 {milliseconds(percentiles[94])}"
+                f"  p99 {milliseconds(percentiles[98])}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
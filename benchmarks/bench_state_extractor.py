@@ -0,0 +1,99 @@
+# run with "PYTHONPATH=src python3 benchmarks/bench_state_extractor.py"
+"""
+Compares the compiled StateExtractor used by _update_local_state against the
+per-field safely_get_json_value walks it replaced, on a full RestIot shadow.
+"""
+import contextlib
+import timeit
+
+from hatch_rest_api.const import RIoTAudioTrack
+from hatch_rest_api.rest_iot import RestIot
+from hatch_rest_api.util import (
+    convert_to_hex,
+    convert_to_percentage,
+    safely_get_json_value,
+)
+
+REPORTED = {
+    "connected": True,
+    "deviceInfo": {"f": "5.11.0", "b": 80, "powerStatus": 3},
+    "toddlerLockOn": False,
+    "toddlerLock": {"turnOnMode": "never"},
+    "current": {
+        "playing": "remote",
+        "srId": 0,
+        "step": 1,
+        "sound": {"id": 10137, "v": 32767, "mute": False},
+        "color": {"id": 9999, "r": 65535, "g": 0, "b": 0, "w": 0, "i": 65535},
+    },
+    "clock": {"i": 32767, "flags": 34816},
+}
+
+
+def legacy_extract(state) -> dict:
+    """The RestIot._update_local_state walks as they were before StateExtractor."""
+    values = {}
+    if safely_get_json_value(state, "deviceInfo.f") is not None:
+        values["firmware_version"] = safely_get_json_value(state, "deviceInfo.f")
+    if safely_get_json_value(state, "deviceInfo.b") is not None:
+        values["battery_level"] = safely_get_json_value(state, "deviceInfo.b", int)
+    if safely_get_json_value(state, "deviceInfo.powerStatus") is not None:
+        values["charging_status"] = safely_get_json_value(state, "deviceInfo.powerStatus", int)
+    if safely_get_json_value(state, "toddlerLockOn") is not None:
+        values["toddler_lock"] = safely_get_json_value(state, "toddlerLockOn", bool)
+    if safely_get_json_value(state, "toddlerLock.turnOnMode") is not None:
+        values["toddler_lock_mode"] = safely_get_json_value(state, "toddlerLock.turnOnMode", str)
+    if safely_get_json_value(state, "current.playing") is not None:
+        values["current_playing"] = safely_get_json_value(state, "current.playing")
+    if safely_get_json_value(state, "current.srId") is not None:
+        values["current_id"] = safely_get_json_value(state, "current.srId")
+    if safely_get_json_value(state, "current.step") is not None:
+        values["current_step"] = safely_get_json_value(state, "current.step")
+    if safely_get_json_value(state, "connected") is not None:
+        values["is_online"] = safely_get_json_value(state, "connected", bool)
+    if safely_get_json_value(state, "current.sound.v") is not None:
+        values["volume"] = convert_to_percentage(safely_get_json_value(state, "current.sound.v", int))
+    if safely_get_json_value(state, "current.sound.id", int) is not None:
+        values["sound_id"] = safely_get_json_value(state, "current.sound.id", int)
+        with contextlib.suppress(ValueError):
+            values["audio_track"] = RIoTAudioTrack(values["sound_id"])
+    if safely_get_json_value(state, "current.color.id") is not None:
+        values["color_id"] = safely_get_json_value(state, "current.color.id", int)
+    if safely_get_json_value(state, "current.color.w") is not None:
+        values["white"] = safely_get_json_value(state, "current.color.w", int)
+    if safely_get_json_value(state, "current.color.r") is not None:
+        values["red"] = convert_to_hex(safely_get_json_value(state, "current.color.r", int))
+    if safely_get_json_value(state, "current.color.g") is not None:
+        values["green"] = convert_to_hex(safely_get_json_value(state, "current.color.g", int))
+    if safely_get_json_value(state, "current.color.b") is not None:
+        values["blue"] = convert_to_hex(safely_get_json_value(state, "current.color.b", int))
+    if safely_get_json_value(state, "current.color.i") is not None:
+        values["brightness"] = convert_to_percentage(safely_get_json_value(state, "current.color.i", int))
+    if safely_get_json_value(state, "clock.i") is not None:
+        values["clock"] = convert_to_percentage(safely_get_json_value(state, "clock.i", int))
+    if safely_get_json_value(state, "clock.flags") is not None:
+        values["flags"] = safely_get_json_value(state, "clock.flags", int)
+    return values
+
+
+def compiled_extract(state) -> dict:
+    values = RestIot.state_fields.extract(state)
+    if "sound_id" in values:
+        with contextlib.suppress(ValueError):
+            values["audio_track"] = RIoTAudioTrack(values["sound_id"])
+    return values
+
+
+def main(number: int = 20000, repeat: int = 5):
+    assert legacy_extract(REPORTED) == compiled_extract(REPORTED)
+    best = {}
+    for name, extract in (("legacy", legacy_extract), ("compiled", compiled_extract)):
+        best[name] = min(
+            timeit.repeat(lambda: extract(REPORTED), number=number, repeat=repeat)
+        )
+        print(f"{name:>8}: {best[name] / number * 1e6:6.2f} us per shadow message")
+    print(f" speedup: {best['legacy'] / best['compiled']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
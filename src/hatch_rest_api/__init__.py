@@ -8,7 +8,11 @@ from .rest_baby import RestBaby
 from .restore_iot import RestoreIot
 from .restore_v4 import RestoreV4
 from .restore_v5 import RestoreV5
+from .rate_limit import RateLimiter
+from .rest_stats import RestStats
 from .scheduled_routine import ScheduledRoutineAlarm
+from .snapshot import BootstrapSnapshot, SnapshotStore
+from .sound_catalog import SoundCatalog, SoundCatalogCache
 from .util_bootstrap import get_rest_devices
 from .const import (
     RestMiniAudioTrack,
@@ -1,9 +1,9 @@
 import logging
 
-from aiohttp import ClientSession, ClientResponse
-import json
+from aiohttp import ClientError, ClientSession, ClientResponse
 
-from .util_http import request_with_logging
+from .rest_stats import RestStats
+from .util_http import DecodedResponse, request_with_logging
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -11,7 +11,18 @@ API_URL: str = "https://data.hatchbaby.com/"
 
 
 class AwsHttp:
-    def __init__(self, client_session: ClientSession = None):
+    # labels this client's calls in RestStats
+    stats_client = "cognito"
+
+    def __init__(
+        self,
+        client_session: ClientSession = None,
+        base_url: str | None = None,
+        rest_stats: RestStats | None = None,
+    ):
+        # None uses the regional Cognito endpoint of each request
+        self.base_url = base_url
+        self.rest_stats = rest_stats
         if client_session is None:
             self.api_session = ClientSession(raise_for_status=True)
         else:
@@ -22,12 +33,12 @@ class AwsHttp:
 
     @request_with_logging
     async def _post_request_with_logging_and_errors_raised(
-        self, url: str, json_body: dict, headers: dict = None
+        self, url: str, data: bytes, headers: dict = None
     ) -> ClientResponse:
-        return await self.api_session.post(url=url, json=json_body, headers=headers)
+        return await self.api_session.post(url=url, data=data, headers=headers)
 
     async def aws_credentials(self, region: str, identityId: str, aws_token: str):
-        url = f"https://cognito-identity.{region}.amazonaws.com"
+        url = self.base_url or f"https://cognito-identity.{region}.amazonaws.com"
         json_body = {
             "IdentityId": identityId,
             "Logins": {
@@ -38,10 +49,15 @@ class AwsHttp:
             "content-type": "application/x-amz-json-1.1",
             "X-Amz-Target": "AWSCognitoIdentityService.GetCredentialsForIdentity",
         }
-        response: ClientResponse = (
+        decoded: DecodedResponse = (
             await self._post_request_with_logging_and_errors_raised(
                 url=url, json_body=json_body, headers=headers
             )
         )
-        data = await response.read()
-        return json.loads(data)
+        # the session may be the Hatch one, which does not raise for status
+        decoded.response.raise_for_status()
+        if decoded.json is None:
+            raise ClientError(
+                f"Invalid response format from Cognito (status: {decoded.status})"
+            )
+        return decoded.json
@@ -1,25 +1,215 @@
+import asyncio
+import inspect
 import logging
+import threading
+from collections import deque
+from collections.abc import Callable, Iterable
+from typing import NamedTuple
 
 _LOGGER = logging.getLogger(__name__)
 
+# Notifications queued for the callback loop before the overflow policy kicks in.
+DEFAULT_MAX_PENDING_UPDATES = 64
+# When the queue is full, drop the oldest notification...
+OVERFLOW_DROP = "drop"
+# ...or fold the new changes into the newest queued notification.
+OVERFLOW_MERGE = "merge"
+
+
+class _CallbackSpec(NamedTuple):
+    accepts_changes: bool
+    is_coroutine: bool
+
+
+def _merge_changes(
+    first: frozenset[str] | None, second: frozenset[str] | None
+) -> frozenset[str] | None:
+    if first is None or second is None:
+        return None
+    return first | second
+
 
 class CallbacksMixin:
+    _callback_loop: asyncio.AbstractEventLoop | None = None
+    # Names callbacks may register fields for, None accepts any name.
+    callback_fields: frozenset[str] | None = None
+    # Properties computed from other attributes, mapped to the attributes they
+    # read. A callback registered for one wakes when any of those change.
+    property_fields: dict[str, tuple[str, ...]] = {}
+
     def _setup_callbacks(self):
-        self._callbacks = set()
+        # callback -> how to call it
+        self._callbacks: dict[Callable, _CallbackSpec] = {}
+        # callbacks registered without fields, woken by every change
+        self._unfiltered_callbacks: dict[Callable, _CallbackSpec] = {}
+        # attribute name -> callbacks registered for it
+        self._field_callbacks: dict[str, dict[Callable, _CallbackSpec]] = {}
+        self._callback_fields: dict[Callable, frozenset[str]] = {}
+        self._callback_tasks: set[asyncio.Task] = set()
+
+    def register_callback(self, callback, fields: Iterable[str] | None = None) -> None:
+        """
+        callback is called with no arguments. With fields it is only called
+        when one of those attributes changed, unknown names raise ValueError.
+        Coroutine functions are scheduled as tasks on the callback loop.
+        """
+        self._register(callback, fields, accepts_changes=False)
+
+    def register_field_callback(
+        self, callback, fields: Iterable[str] | None = None
+    ) -> None:
+        """
+        Like register_callback, but callback is called with a frozenset of the
+        changed attribute names, or None when they are unknown.
+        """
+        self._register(callback, fields, accepts_changes=True)
 
-    def register_callback(self, callback) -> None:
+    def _register(self, callback, fields: Iterable[str] | None, accepts_changes: bool):
         if not hasattr(self, "_callbacks"):
             self._setup_callbacks()
-        self._callbacks.add(callback)
+        if fields is not None:
+            fields = self._resolve_fields(fields)
+        self.remove_callback(callback)
+        spec = _CallbackSpec(accepts_changes, inspect.iscoroutinefunction(callback))
+        self._callbacks[callback] = spec
+        if fields is None:
+            self._unfiltered_callbacks[callback] = spec
+            return
+        self._callback_fields[callback] = fields
+        for field in self._callback_fields[callback]:
+            self._field_callbacks.setdefault(field, {})[callback] = spec
+
+    def _resolve_fields(self, fields: Iterable[str]) -> frozenset[str]:
+        fields = frozenset(fields)
+        if self.callback_fields is not None:
+            unknown = fields - self.callback_fields
+            if unknown:
+                raise ValueError(
+                    f"{type(self).__name__} has no fields {', '.join(sorted(unknown))}"
+                )
+        return frozenset(
+            attribute
+            for field in fields
+            for attribute in self.property_fields.get(field, (field,))
+        )
 
     def remove_callback(self, callback) -> None:
         if not hasattr(self, "_callbacks"):
             self._setup_callbacks()
-        self._callbacks.discard(callback)
+        self._callbacks.pop(callback, None)
+        self._unfiltered_callbacks.pop(callback, None)
+        for field in self._callback_fields.pop(callback, ()):
+            subscribers = self._field_callbacks[field]
+            del subscribers[callback]
+            if not subscribers:
+                del self._field_callbacks[field]
+
+    def set_callback_loop(
+        self,
+        loop: asyncio.AbstractEventLoop | None,
+        max_pending: int = DEFAULT_MAX_PENDING_UPDATES,
+        overflow: str = OVERFLOW_MERGE,
+    ) -> None:
+        """
+        Runs callbacks on loop instead of the thread that received the shadow
+        message. Notifications wait in a queue of max_pending entries; once it
+        is full the overflow policy drops the oldest or merges into the newest.
+        None goes back to calling callbacks directly.
+        """
+        if overflow not in (OVERFLOW_DROP, OVERFLOW_MERGE):
+            raise ValueError(f"unknown overflow policy: {overflow}")
+        if max_pending < 1:
+            raise ValueError("max_pending must be at least 1")
+        self._callback_loop = loop
+        self._callback_overflow = overflow
+        self._max_pending_updates = max_pending
+        self._pending_updates: deque[frozenset[str] | None] = deque()
+        self._pending_updates_lock = threading.Lock()
+        self._drain_scheduled = False
 
-    def publish_updates(self) -> None:
+    def publish_updates(self, changed: Iterable[str] | None = None) -> None:
+        """Notifies callbacks, nothing is called when changed is given but empty."""
         if not hasattr(self, "_callbacks"):
             self._setup_callbacks()
-        _LOGGER.debug(f"{self.device_name} publishing updates")
-        for callback in self._callbacks:
-            callback()
+        if changed is not None:
+            changed = frozenset(changed)
+            if not changed:
+                return
+        if self._callback_loop is None:
+            self._dispatch_updates(changed)
+        else:
+            self._queue_updates(changed)
+
+    def _queue_updates(self, changed: frozenset[str] | None):
+        with self._pending_updates_lock:
+            pending = self._pending_updates
+            if len(pending) < self._max_pending_updates:
+                pending.append(changed)
+            elif self._callback_overflow == OVERFLOW_MERGE:
+                pending[-1] = _merge_changes(pending[-1], changed)
+            else:
+                pending.popleft()
+                pending.append(changed)
+                _LOGGER.debug("%s dropped a queued update", self.device_name)
+            if self._drain_scheduled:
+                return
+            self._drain_scheduled = True
+        try:
+            self._callback_loop.call_soon_threadsafe(self._drain_updates)
+        except RuntimeError:
+            # the loop is closed, nobody is listening any more
+            with self._pending_updates_lock:
+                self._pending_updates.clear()
+                self._drain_scheduled = False
+
+    def _drain_updates(self):
+        with self._pending_updates_lock:
+            updates = list(self._pending_updates)
+            self._pending_updates.clear()
+            self._drain_scheduled = False
+        for changed in updates:
+            self._dispatch_updates(changed, isolate=True)
+
+    def _dispatch_updates(self, changed: frozenset[str] | None, isolate: bool = False):
+        if changed is None:
+            targets = dict(self._callbacks)
+        else:
+            targets = dict(self._unfiltered_callbacks)
+            for field in changed:
+                subscribers = self._field_callbacks.get(field)
+                if subscribers:
+                    targets.update(subscribers)
+        if not targets:
+            return
+        _LOGGER.debug("%s publishing updates: %s", self.device_name, changed)
+        for callback, spec in targets.items():
+            try:
+                result = callback(changed) if spec.accepts_changes else callback()
+                if spec.is_coroutine:
+                    self._start_callback_task(result)
+            except Exception:
+                if not isolate:
+                    raise
+                _LOGGER.exception("%s callback failed", self.device_name)
+
+    def _start_callback_task(self, coroutine):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            coroutine.close()
+            _LOGGER.warning(
+                "%s has a coroutine callback but no callback loop, "
+                "call set_callback_loop first",
+                self.device_name,
+            )
+            return
+        task = loop.create_task(coroutine)
+        self._callback_tasks.add(task)
+        task.add_done_callback(self._callback_task_done)
+
+    def _callback_task_done(self, task: asyncio.Task):
+        self._callback_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            _LOGGER.error(
+                "%s callback failed", self.device_name, exc_info=task.exception()
+            )
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import random
+from collections.abc import Callable
+from concurrent.futures import Future
+
+from awscrt import mqtt
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds over which the shadow gets after a lost session are spread, so a
+# broker blip does not turn into one get per device at the same instant.
+DEFAULT_RESYNC_JITTER = 5.0
+
+
+class ConnectionSupervisor:
+    """
+    Watches connection resumes. When the broker did not keep the session, every
+    subscription is gone: each device subscribes again, one topic filter per
+    SUBSCRIBE since AWS IoT rejects requests with more than 8, and its shadow is
+    requested again, spread over ``resync_jitter`` seconds.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        on_connection_resumed: Callable | None = None,
+        resync_jitter: float = DEFAULT_RESYNC_JITTER,
+    ):
+        self.loop = loop
+        self.resync_jitter = resync_jitter
+        self.devices: list = []
+        self._on_connection_resumed = on_connection_resumed
+        self._resync: Future | None = None
+
+    def on_connection_resumed(
+        self,
+        connection: mqtt.Connection,
+        return_code: mqtt.ConnectReturnCode,
+        session_present: bool,
+        **kwargs,
+    ):
+        # called on the awscrt event-loop thread
+        if self._on_connection_resumed is not None:
+            try:
+                self._on_connection_resumed(
+                    connection=connection,
+                    return_code=return_code,
+                    session_present=session_present,
+                    **kwargs,
+                )
+            except Exception:
+                _LOGGER.exception("on_connection_resumed callback failed")
+        if not session_present:
+            self.schedule_resync()
+
+    def schedule_resync(self):
+        """Thread safe, a resync already running is replaced by the new one."""
+        if self.loop.is_closed():
+            return
+        if self._resync is not None:
+            self._resync.cancel()
+        self._resync = asyncio.run_coroutine_threadsafe(
+            self.resync(), self.loop
+        )
+
+    async def resync(self):
+        _LOGGER.info(
+            "mqtt session was not resumed, resubscribing %s devices", len(self.devices)
+        )
+        await self.resubscribe_all()
+        await self.refresh_all()
+
+    async def resubscribe_all(self):
+        devices = list(self.devices)
+        for shadow_fleet in {
+            device.shadow_fleet for device in devices if device.shadow_fleet is not None
+        }:
+            shadow_fleet.resubscribe()
+        results = await asyncio.gather(
+            *(device.async_subscribe(refresh=False) for device in devices),
+            return_exceptions=True,
+        )
+        for device, result in zip(devices, results):
+            if isinstance(result, Exception):
+                _LOGGER.warning(
+                    "Could not resubscribe %s after reconnect: %r", device.device_name, result
+                )
+
+    async def refresh_all(self):
+        async def refresh(device):
+            await asyncio.sleep(random.uniform(0, self.resync_jitter))
+            await device.async_refresh()
+
+        devices = list(self.devices)
+        results = await asyncio.gather(
+            *(refresh(device) for device in devices), return_exceptions=True
+        )
+        for device, result in zip(devices, results):
+            if isinstance(result, Exception):
+                _LOGGER.warning(
+                    "Could not refresh %s after reconnect: %r", device.device_name, result
+                )
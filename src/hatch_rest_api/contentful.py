@@ -1,9 +1,12 @@
-import asyncio
 import logging
 
 from aiohttp import ClientError, ClientResponse, ClientSession
+from aiohttp.hdrs import CONTENT_TYPE
 
 from .errors import RateError
+from .rate_limit import RateLimiter, back_off, parse_retry_after
+from .rest_stats import RestStats
+from .util_http import DecodedResponse, request_with_logging
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -15,45 +18,64 @@ AUTH_TOKEN: str = "w81AL3BhokPlPGus5Pbs2UjK9hOEH-WYoJ4OOpOQpUI"
 
 
 class Contentful:
-    def __init__(self, client_session: ClientSession = None):
+    # labels this client's calls in RestStats
+    stats_client = "contentful"
+
+    def __init__(
+        self,
+        client_session: ClientSession = None,
+        rate_limiter: RateLimiter | None = None,
+        base_url: str = API_URL,
+        rest_stats: RestStats | None = None,
+    ):
+        self.base_url = base_url
+        self.rest_stats = rest_stats
         self.api_session = client_session or ClientSession()
+        # None sends requests straight away and only backs off after a 429
+        self.rate_limiter = rate_limiter
 
     async def cleanup_client_session(self):
         await self.api_session.close()
 
+    @request_with_logging
+    async def _post_request_with_logging(self, url: str, data: bytes, headers: dict) -> ClientResponse:
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire(url)
+        return await self.api_session.post(url=url, data=data, headers=headers)
+
     async def graphql_query(self, query, auth_token=None, max_retries=3, **variables):
         retry_count = 0
         while True:
             try:
-                headers = {"Authorization": f"Bearer {AUTH_TOKEN}"}
+                headers = {
+                    "Authorization": f"Bearer {AUTH_TOKEN}",
+                    CONTENT_TYPE: "application/json",
+                }
                 if auth_token:
                     headers["X-HatchBaby-Auth"] = auth_token
 
-                response: ClientResponse = await self.api_session.post(
-                    url=API_URL,
-                    json={"query": query, "variables": variables},
+                decoded: DecodedResponse = await self._post_request_with_logging(
+                    url=self.base_url,
+                    json_body={"query": query, "variables": variables},
                     headers=headers,
                 )
+                response = decoded.response
                 if response.status == 429:
                     _LOGGER.warning("Rate limited (429) for GraphQL query")
                     raise RateError(
-                        "GraphQL API rate limit exceeded. Please wait before retrying."
+                        "GraphQL API rate limit exceeded. Please wait before retrying.",
+                        retry_after=parse_retry_after(
+                            response.headers.get("Retry-After")
+                        ),
                     )
 
                 response.raise_for_status()
 
-                try:
-                    response_json = await response.json()
-                except Exception:
-                    try:
-                        response_text = await response.text()
-                        _LOGGER.error(
-                            f"Failed to parse JSON response. Status: {response.status}, Content: {response_text[:500]}"
-                        )
-                    except Exception:
-                        _LOGGER.error(
-                            f"Failed to parse response. Status: {response.status}"
-                        )
+                response_json = decoded.json
+                if not isinstance(response_json, dict):
+                    _LOGGER.error(
+                        f"Failed to parse JSON response. Status: {response.status}, Content: {decoded.text(500)}"
+                    )
                     raise ClientError(
                         f"Invalid response format from GraphQL API (status: {response.status})"
                     )
@@ -64,7 +86,7 @@ class Contentful:
 
                 return response_json.get("data")
 
-            except RateError:
+            except RateError as error:
                 retry_count += 1
                 if retry_count > max_retries:
                     _LOGGER.error(
@@ -72,8 +94,9 @@ class Contentful:
                     )
                     raise
 
-                wait_time = 2**retry_count
+                if self.rest_stats is not None:
+                    self.rest_stats.retried(self.stats_client, self.base_url)
                 _LOGGER.warning(
-                    f"Rate limited. Retrying in {wait_time} seconds (attempt {retry_count}/{max_retries})"
+                    "Rate limited, backing off before retrying (attempt %s/%s)", retry_count, max_retries
                 )
-                await asyncio.sleep(wait_time)
+                await back_off(self.rate_limiter, self.base_url, retry_count, error.retry_after)
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime
+
+from aiohttp import ClientError
+from awscrt import mqtt
+from awscrt.auth import AwsCredentials, AwsCredentialsProvider
+from awscrt.exceptions import AwsCrtError
+
+from .aws_http import AwsHttp
+from .errors import AuthError
+from .hatch import Hatch
+from .shadow_client_subscriber import await_mqtt_future
+
+_LOGGER = logging.getLogger(__name__)
+
+# Fetch new credentials this many seconds before the current ones expire.
+DEFAULT_REFRESH_MARGIN = 5 * 60
+# Seconds to wait before retrying a failed refresh or reconnect.
+CREDENTIAL_RETRY_DELAY = 30
+# Seconds to wait for the MQTT connection to go down and come back up.
+RECONNECT_TIMEOUT = 30
+
+
+def credentials_from_cognito(aws_credentials: dict) -> AwsCredentials:
+    credentials = aws_credentials["Credentials"]
+    return AwsCredentials(
+        credentials["AccessKeyId"],
+        credentials["SecretKey"],
+        session_token=credentials["SessionToken"],
+        expiration=datetime.fromtimestamp(credentials["Expiration"], UTC),
+    )
+
+
+class CredentialRefresher:
+    """
+    Keeps the Cognito credentials behind the MQTT connection fresh. The
+    connection signs with ``provider``, which always hands out the latest
+    credentials, so a refresh only swaps them and reconnects the existing
+    connection; devices and their subscriptions are left alone.
+    """
+
+    def __init__(
+        self,
+        api: Hatch,
+        aws_http: AwsHttp,
+        auth_token: str,
+        aws_token: dict,
+        aws_credentials: dict,
+        refresh_margin: float = DEFAULT_REFRESH_MARGIN,
+    ):
+        self.api = api
+        self.aws_http = aws_http
+        self.auth_token = auth_token
+        self.aws_token = aws_token
+        self.refresh_margin = refresh_margin
+        self.mqtt_connection: mqtt.Connection | None = None
+        # awaited after a reconnect that did not get the previous session back
+        self.on_session_lost: Callable[[], Awaitable] | None = None
+        # awaited for a new Hatch auth token once the current one is rejected
+        self.relogin: Callable[[], Awaitable[str]] | None = None
+        self._lock = threading.Lock()
+        self._set_credentials(aws_credentials)
+        self.provider = AwsCredentialsProvider.new_delegate(self._get_credentials)
+
+    @property
+    def expiration(self) -> float:
+        return self._expiration
+
+    def _get_credentials(self) -> AwsCredentials:
+        # called by awscrt on its own thread whenever it signs a connection
+        with self._lock:
+            return self._credentials
+
+    def _set_credentials(self, aws_credentials: dict):
+        credentials = credentials_from_cognito(aws_credentials)
+        with self._lock:
+            self._credentials = credentials
+            self._expiration = aws_credentials["Credentials"]["Expiration"]
+
+    def seconds_until_refresh(self) -> float:
+        return max(self._expiration - self.refresh_margin - time.time(), 0)
+
+    async def refresh(self):
+        """
+        Fetches new Cognito credentials, connections signed after this use them.
+        A rejected auth token is replaced through relogin when it is set,
+        otherwise the AuthError is raised.
+        """
+        try:
+            self.aws_token = await self.api.token(auth_token=self.auth_token)
+        except AuthError:
+            if self.relogin is None:
+                raise
+            _LOGGER.info("Hatch auth token was rejected, logging in again")
+            self.auth_token = await self.relogin()
+            self.aws_token = await self.api.token(auth_token=self.auth_token)
+        aws_credentials = await self.aws_http.aws_credentials(
+            region=self.aws_token["region"],
+            identityId=self.aws_token["identityId"],
+            aws_token=self.aws_token["token"],
+        )
+        self._set_credentials(aws_credentials)
+        _LOGGER.debug("AWS credentials refreshed, expiring at %s", self._expiration)
+
+    async def reconnect(self):
+        await await_mqtt_future(self.mqtt_connection.disconnect(), RECONNECT_TIMEOUT)
+        connected = await await_mqtt_future(
+            self.mqtt_connection.connect(), RECONNECT_TIMEOUT
+        )
+        _LOGGER.debug("mqtt connection reconnected with refreshed credentials")
+        if not connected["session_present"] and self.on_session_lost is not None:
+            await self.on_session_lost()
+
+    async def run(self, mqtt_connection: mqtt.Connection):
+        """
+        Refreshes ahead of every expiration until cancelled. Stops with the
+        AuthError when the Hatch account can no longer be logged in to, since
+        retrying with the same token would never succeed.
+        """
+        self.mqtt_connection = mqtt_connection
+        while True:
+            await asyncio.sleep(self.seconds_until_refresh())
+            try:
+                await self.refresh()
+            except AuthError:
+                _LOGGER.error(
+                    "Could not refresh AWS credentials, the Hatch login was rejected"
+                )
+                raise
+            except (ClientError, TimeoutError) as error:
+                _LOGGER.warning(
+                    "Could not refresh AWS credentials, retrying in %s seconds: %s",
+                    CREDENTIAL_RETRY_DELAY,
+                    error,
+                )
+                await asyncio.sleep(CREDENTIAL_RETRY_DELAY)
+                continue
+            while True:
+                try:
+                    await self.reconnect()
+                    break
+                except (AwsCrtError, TimeoutError) as error:
+                    _LOGGER.warning(
+                        "Could not reconnect with refreshed AWS credentials, "
+                        "retrying in %s seconds: %s",
+                        CREDENTIAL_RETRY_DELAY,
+                        error,
+                    )
+                    await asyncio.sleep(CREDENTIAL_RETRY_DELAY)
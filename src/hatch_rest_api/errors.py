@@ -6,7 +6,10 @@ class BaseError(ClientError):
 
 
 class RateError(BaseError):
-    pass
+    def __init__(self, *args, retry_after: float | None = None):
+        super().__init__(*args)
+        # seconds from the Retry-After header, None when the server sent none
+        self.retry_after = retry_after
 
 
 class AuthError(BaseError):
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+from .const import NO_SOUND_ID
+from .scheduled_routine import ALARM_ROUTINE_TYPE, SCHEDULED_ROUTINE_ALARM_PRODUCTS
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds sent in the Retry-After header of an injected 429.
+DEFAULT_RETRY_AFTER = 1
+# Seconds the fake Cognito credentials stay valid.
+CREDENTIALS_LIFETIME = 60 * 60
+
+
+def fake_iot_devices(count: int, products=("riot", "restoreV5")) -> list[dict]:
+    """An iotDevice/v2/fetch payload of count devices cycling through products."""
+    return [
+        {
+            "product": products[index % len(products)],
+            "name": f"Device {index}",
+            "thingName": f"thing-{index}",
+            "macAddress": f"00:00:00:00:{index // 256:02X}:{index % 256:02X}",
+        }
+        for index in range(count)
+    ]
+
+
+def _success(payload=None, **fields) -> web.Response:
+    return web.json_response({"status": "success", "payload": payload, **fields})
+
+
+class FakeHatchServer:
+    """
+    Local aiohttp stand-in for the Hatch REST API, Contentful GraphQL and
+    Cognito, for benchmarks and tests without the cloud.
+
+    Pass api_url, contentful_url and cognito_url as the base_url of Hatch,
+    Contentful and AwsHttp, or to get_rest_devices. Every response is delayed by
+    ``latency`` seconds and ``rate_limit`` is the probability a request gets a
+    429 with a Retry-After of ``retry_after`` seconds. ``request_counts`` and
+    ``throttled`` count requests per path.
+    """
+
+    def __init__(
+        self,
+        iot_devices: list[dict] | None = None,
+        sounds_per_catalog: int = 20,
+        latency: float = 0.0,
+        rate_limit: float = 0.0,
+        retry_after: float = DEFAULT_RETRY_AFTER,
+        seed: int | None = None,
+        host: str = "127.0.0.1",
+    ):
+        self.iot_devices = iot_devices if iot_devices is not None else fake_iot_devices(1)
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.host = host
+        self.request_counts: Counter[str] = Counter()
+        self.throttled: Counter[str] = Counter()
+        self.url: str | None = None
+        self._random = random.Random(seed)
+        self._runner: web.AppRunner | None = None
+        self._data_version = 0
+        self._sounds = [
+            {"id": 10000 + index, "title": f"Sound {index}", "wavUrl": f"https://example.com/{index}.wav"}
+            for index in range(sounds_per_catalog)
+        ]
+        # alarm id -> alarm, every scheduled routine device starts with one
+        self._alarms: dict[int, dict] = {
+            index: {
+                "id": index,
+                "macAddress": device["macAddress"],
+                "type": ALARM_ROUTINE_TYPE,
+                "name": "Wake up",
+                "active": True,
+                "enabled": True,
+                "displayOrder": 0,
+                "daysOfWeek": 62,
+                "startTime": "07:00:00",
+                "endTime": "07:30:00",
+            }
+            for index, device in enumerate(self.iot_devices, start=1)
+            if device["product"] in SCHEDULED_ROUTINE_ALARM_PRODUCTS
+        }
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.url}/"
+
+    @property
+    def contentful_url(self) -> str:
+        return f"{self.url}/contentful"
+
+    @property
+    def cognito_url(self) -> str:
+        return f"{self.url}/cognito"
+
+    async def start(self) -> str:
+        app = web.Application(middlewares=[self._middleware])
+        app.add_routes(
+            [
+                web.post("/public/v1/login", self._login),
+                web.get("/service/app/v2/member", self._member),
+                web.get("/service/app/iotDevice/v2/fetch", self._iot_devices),
+                web.get("/service/app/restPlus/token/v1/fetch", self._token),
+                web.get("/service/app/routine/v2/fetch", self._routines),
+                web.get("/service/app/routine/v3/fetch", self._scheduled_routines),
+                web.get("/service/app/content/v1/fetchByProduct", self._content),
+                web.post("/service/app/routine/v2/editMultiple", self._edit_multiple),
+                web.post("/service/app/v2/dataVersion", self._confirm_data_version),
+                web.post("/contentful", self._graphql),
+                web.post("/cognito", self._cognito),
+            ]
+        )
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://{self.host}:{port}"
+        _LOGGER.debug("fake hatch server listening on %s", self.url)
+        return self.url
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "FakeHatchServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        self.request_counts[request.path] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.rate_limit and self._random.random() < self.rate_limit:
+            self.throttled[request.path] += 1
+            return web.json_response(
+                {"status": "failure", "message": "Too Many Requests"},
+                status=429,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        return await handler(request)
+
+    async def _login(self, request: web.Request) -> web.Response:
+        return _success(token="fake-auth-token")
+
+    async def _member(self, request: web.Request) -> web.Response:
+        return _success({"email": "user@example.com"})
+
+    async def _iot_devices(self, request: web.Request) -> web.Response:
+        return _success(self.iot_devices)
+
+    async def _token(self, request: web.Request) -> web.Response:
+        return _success(
+            {
+                "region": "us-east-1",
+                "identityId": "us-east-1:fake-identity",
+                "token": "fake-aws-token",
+                "endpoint": "https://fake-ats.iot.us-east-1.amazonaws.com",
+            }
+        )
+
+    async def _routines(self, request: web.Request) -> web.Response:
+        mac = request.query.get("macAddress")
+        routine_type = request.query.get("types", "favorite")
+        return _success(
+            [
+                {"id": index, "name": f"{routine_type} {index}", "type": routine_type, "active": True, "displayOrder": index, "macAddress": mac}
+                for index in range(1, 3)
+            ]
+        )
+
+    async def _scheduled_routines(self, request: web.Request) -> web.Response:
+        return _success(self._alarms_for(request.query.get("macAddress")))
+
+    async def _content(self, request: web.Request) -> web.Response:
+        return _success({"contentItems": [{"id": NO_SOUND_ID, "title": "None"}, *self._sounds]})
+
+    async def _edit_multiple(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        edited = []
+        for change in body["mrds"]:
+            alarm = self._alarms.get(change["id"])
+            if alarm is not None:
+                alarm.update(change)
+                edited.append(alarm)
+        self._data_version += 1
+        return _success(
+            {
+                "item": edited,
+                "dataVersion": str(self._data_version),
+                "confirmDataVersion": True,
+            }
+        )
+
+    async def _confirm_data_version(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        return _success(self._alarms_for(body["macAddress"]))
+
+    async def _graphql(self, request: web.Request) -> web.Response:
+        items = [
+            {"title": sound["title"], "id": sound["id"], "wavFile": {"url": sound["wavUrl"]}}
+            for sound in self._sounds
+        ]
+        return web.json_response(
+            {"data": {"soundCollection": {"total": len(items), "limit": 1000, "items": items}}}
+        )
+
+    async def _cognito(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "IdentityId": "us-east-1:fake-identity",
+                "Credentials": {
+                    "AccessKeyId": "fake-access-key",
+                    "SecretKey": "fake-secret-key",
+                    "SessionToken": "fake-session-token",
+                    "Expiration": int(time.time()) + CREDENTIALS_LIFETIME,
+                },
+            }
+        )
+
+    def _alarms_for(self, mac: str | None) -> list[dict]:
+        return [dict(alarm) for alarm in self._alarms.values() if alarm["macAddress"] == mac]
@@ -0,0 +1,301 @@
+import heapq
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+
+from awscrt import mqtt
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds a reordered message is held back at most, on top of its latency.
+DEFAULT_REORDER_WINDOW = 0.05
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """MQTT topic filter matching with the + and # wildcards."""
+    filter_levels = topic_filter.split("/")
+    levels = topic.split("/")
+    for index, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if index >= len(levels) or level not in ("+", levels[index]):
+            return False
+    return len(filter_levels) == len(levels)
+
+
+def shadow_delta(desired: dict, reported: dict) -> dict:
+    """Desired leaves the reported document does not match, as the shadow service computes them."""
+    delta = {}
+    for key, value in desired.items():
+        existing = reported.get(key)
+        if isinstance(value, dict) and isinstance(existing, dict):
+            nested = shadow_delta(value, existing)
+            if nested:
+                delta[key] = nested
+        elif value != existing or key not in reported:
+            delta[key] = value
+    return delta
+
+
+def _merge_document(document: dict, update: dict):
+    # null removes a key from a shadow document
+    for key, value in update.items():
+        if value is None:
+            document.pop(key, None)
+        elif isinstance(value, dict):
+            existing = document.get(key)
+            if not isinstance(existing, dict):
+                existing = document[key] = {}
+            _merge_document(existing, value)
+        else:
+            document[key] = value
+
+
+def _done(result) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+class _Scheduler(threading.Thread):
+    """Runs callbacks at their due time on one thread, like the awscrt event loop."""
+
+    def __init__(self):
+        super().__init__(name="fake-shadow", daemon=True)
+        self._queue: list = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def call_later(self, delay: float, callback: Callable, *args):
+        with self._condition:
+            heapq.heappush(
+                self._queue,
+                (time.monotonic() + delay, next(self._sequence), callback, args),
+            )
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while not self._closed:
+                    if self._queue:
+                        timeout = self._queue[0][0] - time.monotonic()
+                        if timeout <= 0:
+                            break
+                    else:
+                        timeout = None
+                    self._condition.wait(timeout)
+                if self._closed:
+                    return
+                _, _, callback, args = heapq.heappop(self._queue)
+            try:
+                callback(*args)
+            except Exception:
+                _LOGGER.exception("fake shadow callback failed")
+
+
+class FakeShadowConnection(mqtt.Connection):
+    """
+    In-process stand-in for the AWS IoT MQTT connection and the device shadow
+    service behind it, for benchmarks and tests without AWS.
+
+    Hand it to IotShadowClient or ShadowFleetDispatcher like a real connection.
+    Shadow get and update requests are answered on the accepted, rejected and
+    delta topics with versioned documents, and every thing plays a device that
+    reports each desired change after ``device_latency`` seconds (None never
+    reports). Each hop between client and broker takes ``latency`` plus up to
+    ``jitter`` seconds; ``loss`` is the probability a message to a subscriber
+    is dropped and ``reorder`` the probability it is held back by up to
+    ``reorder_window`` seconds. Callbacks run on a single background thread.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        loss: float = 0.0,
+        reorder: float = 0.0,
+        reorder_window: float = DEFAULT_REORDER_WINDOW,
+        device_latency: float | None = 0.0,
+        seed: int | None = None,
+    ):
+        # mqtt.Connection.__init__ needs a native client, none is created here
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.reorder = reorder
+        self.reorder_window = reorder_window
+        self.device_latency = device_latency
+        self.connected = True
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        # thing name -> {"desired": {}, "reported": {}, "version": int}
+        self._shadows: dict[str, dict] = {}
+        # topic filter -> (qos, callback)
+        self._subscriptions: dict[str, tuple] = {}
+        # the filters with wildcards, exact filters are looked up directly
+        self._wildcard_filters: set[str] = set()
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._packet_ids = itertools.count(1)
+        self._scheduler = _Scheduler()
+        self._scheduler.start()
+
+    def add_thing(self, thing_name: str, reported: dict | None = None, desired: dict | None = None):
+        # copied, updates are merged into the documents in place
+        shadow = json.loads(
+            json.dumps({"desired": desired or {}, "reported": reported or {}, "version": 1})
+        )
+        with self._lock:
+            self._shadows[thing_name] = shadow
+
+    def shadow(self, thing_name: str) -> dict:
+        with self._lock:
+            return json.loads(json.dumps(self._shadows[thing_name]))
+
+    def report(self, thing_name: str, reported: dict):
+        """The device changes state on its own, e.g. from its buttons."""
+        self._update_shadow(thing_name, {"state": {"reported": reported}})
+
+    def close(self):
+        self._scheduler.close()
+
+    def _hop(self) -> float:
+        return self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+
+    def _later(self, result) -> Future:
+        future = Future()
+        self._scheduler.call_later(2 * self._hop(), future.set_result, result)
+        return future
+
+    def connect(self) -> Future:
+        self.connected = True
+        return self._later({"return_code": mqtt.ConnectReturnCode.ACCEPTED, "session_present": True})
+
+    def disconnect(self) -> Future:
+        self.connected = False
+        return _done({})
+
+    def subscribe(self, topic, qos, callback=None):
+        packet_id = next(self._packet_ids)
+        with self._lock:
+            self._subscriptions[topic] = (qos, callback)
+            if "+" in topic or "#" in topic:
+                self._wildcard_filters.add(topic)
+        return self._later({"packet_id": packet_id, "topic": topic, "qos": qos}), packet_id
+
+    def unsubscribe(self, topic):
+        packet_id = next(self._packet_ids)
+        with self._lock:
+            self._subscriptions.pop(topic, None)
+            self._wildcard_filters.discard(topic)
+        return self._later({"packet_id": packet_id}), packet_id
+
+    def resubscribe_existing_topics(self):
+        packet_id = next(self._packet_ids)
+        with self._lock:
+            topics = [(topic, qos) for topic, (qos, _) in self._subscriptions.items()]
+        return self._later({"packet_id": packet_id, "topics": topics}), packet_id
+
+    def publish(self, topic, payload, qos, retain=False):
+        packet_id = next(self._packet_ids)
+        with self._lock:
+            self.published += 1
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self._scheduler.call_later(self._hop(), self._receive, topic, payload)
+        return self._later({"packet_id": packet_id}), packet_id
+
+    def _receive(self, topic: str, payload: bytes):
+        # $aws/things/<thing name>/shadow/<operation>
+        levels = topic.split("/")
+        if len(levels) == 5 and levels[:2] == ["$aws", "things"] and levels[3] == "shadow":
+            request = json.loads(payload) if payload else {}
+            if levels[4] == "get":
+                self._get_shadow(levels[2], request)
+            elif levels[4] == "update":
+                self._update_shadow(levels[2], request)
+            return
+        self._send(topic, payload)
+
+    def _get_shadow(self, thing_name: str, request: dict):
+        with self._lock:
+            shadow = self._shadows.get(thing_name)
+            if shadow is None:
+                response = {"code": 404, "message": f"No shadow exists with name: '{thing_name}'"}
+                result = "rejected"
+            else:
+                state = {"desired": shadow["desired"], "reported": shadow["reported"]}
+                delta = shadow_delta(shadow["desired"], shadow["reported"])
+                if delta:
+                    state["delta"] = delta
+                response = {"state": state, "version": shadow["version"]}
+                result = "accepted"
+            payload = self._response(response, request)
+        self._send(f"$aws/things/{thing_name}/shadow/get/{result}", payload)
+
+    def _update_shadow(self, thing_name: str, request: dict):
+        state = request.get("state") or {}
+        with self._lock:
+            shadow = self._shadows.setdefault(
+                thing_name, {"desired": {}, "reported": {}, "version": 0}
+            )
+            _merge_document(shadow["desired"], state.get("desired") or {})
+            _merge_document(shadow["reported"], state.get("reported") or {})
+            shadow["version"] += 1
+            accepted = self._response({"state": state, "version": shadow["version"]}, request)
+            delta = shadow_delta(shadow["desired"], shadow["reported"])
+            delta_payload = self._response({"state": delta, "version": shadow["version"]}, {})
+        self._send(f"$aws/things/{thing_name}/shadow/update/accepted", accepted)
+        if delta and "desired" in state:
+            self._send(f"$aws/things/{thing_name}/shadow/update/delta", delta_payload)
+            if self.device_latency is not None:
+                self._scheduler.call_later(self.device_latency, self.report, thing_name, delta)
+
+    @staticmethod
+    def _response(response: dict, request: dict) -> bytes:
+        response["timestamp"] = int(time.time())
+        if request.get("clientToken"):
+            response["clientToken"] = request["clientToken"]
+        return json.dumps(response).encode()
+
+    def _send(self, topic: str, payload: bytes):
+        with self._lock:
+            topic_filters = [
+                topic_filter
+                for topic_filter in self._wildcard_filters
+                if topic_matches(topic_filter, topic)
+            ]
+            if topic in self._subscriptions:
+                topic_filters.append(topic)
+            subscribers = [
+                self._subscriptions[topic_filter]
+                for topic_filter in topic_filters
+                if self._subscriptions[topic_filter][1] is not None
+            ]
+        for qos, callback in subscribers:
+            if not self.connected or self._random.random() < self.loss:
+                with self._lock:
+                    self.dropped += 1
+                continue
+            delay = self._hop()
+            if self.reorder and self._random.random() < self.reorder:
+                delay += self._random.uniform(0, self.reorder_window)
+            self._scheduler.call_later(delay, self._deliver, callback, topic, payload, qos)
+
+    def _deliver(self, callback: Callable, topic: str, payload: bytes, qos):
+        with self._lock:
+            self.delivered += 1
+        callback(topic=topic, payload=payload, dup=False, qos=qos, retain=False)
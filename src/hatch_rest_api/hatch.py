@@ -1,13 +1,15 @@
 import asyncio
 import logging
-from collections.abc import Iterable
+from collections.abc import Coroutine, Iterable
 from datetime import time
 from typing import Any
 
 from aiohttp import ClientError, ClientResponse, ClientSession, __version__
-from aiohttp.hdrs import USER_AGENT
+from aiohttp.hdrs import CONTENT_TYPE, USER_AGENT
 
 from .errors import AuthError, RateError
+from .rate_limit import RateLimiter, back_off, parse_retry_after
+from .rest_stats import RestStats
 from .scheduled_routine import (
     ALARM_ROUTINE_TYPE,
     ScheduledRoutineAlarm,
@@ -16,7 +18,7 @@ from .scheduled_routine import (
     alarm_weekdays_update_payload,
     alarm_wake_time_update_payload,
 )
-from .util_http import request_with_logging
+from .util_http import DecodedResponse, request_with_logging
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -25,28 +27,27 @@ API_URL: str = "https://data.hatchbaby.com/"
 
 def request_with_logging_and_errors(func):
     async def request_with_logging_wrapper(*args, **kwargs):
-        response = await func(*args, **kwargs)
+        decoded: DecodedResponse = await func(*args, **kwargs)
+        response = decoded.response
 
         if response.status == 429:
             _LOGGER.warning(f"Rate limited (429) for URL: {response.url}")
-            raise RateError("API rate limit exceeded. Please wait before retrying.")
+            raise RateError(
+                "API rate limit exceeded. Please wait before retrying.",
+                retry_after=parse_retry_after(response.headers.get("Retry-After")),
+            )
 
-        try:
-            response_json = await response.json()
-        except Exception:
-            try:
-                response_text = await response.text()
-                _LOGGER.error(
-                    f"Failed to parse JSON response. Status: {response.status}, Content: {response_text[:500]}"
-                )
-            except Exception:
-                _LOGGER.error(f"Failed to parse response. Status: {response.status}")
+        response_json = decoded.json
+        if not isinstance(response_json, dict):
+            _LOGGER.error(
+                f"Failed to parse JSON response. Status: {response.status}, Content: {decoded.text(500)}"
+            )
             raise ClientError(
                 f"Invalid response format from API (status: {response.status})"
             )
 
         if response_json.get("status") == "success":
-            return response
+            return response_json
         if response_json.get("errorCode") == 1001:
             _LOGGER.debug("error: session invalid")
             raise AuthError
@@ -56,62 +57,86 @@ def request_with_logging_and_errors(func):
 
 
 class Hatch:
-    def __init__(self, client_session: ClientSession = None):
-        if client_session is None:
-            self.api_session = ClientSession(raise_for_status=True)
-        else:
-            self.api_session = client_session
+    # labels this client's calls in RestStats
+    stats_client = "hatch"
+
+    def __init__(
+        self,
+        client_session: ClientSession = None,
+        rate_limiter: RateLimiter | None = None,
+        base_url: str = API_URL,
+        rest_stats: RestStats | None = None,
+    ):
+        self.base_url = base_url
+        self.rest_stats = rest_stats
+        # no raise_for_status, a 429 has to reach request_with_logging_and_errors
+        # to become a RateError that is retried
+        self.api_session = client_session or ClientSession()
+        # None sends requests straight away and only backs off after a 429
+        self.rate_limiter = rate_limiter
+        self._background_tasks: set[asyncio.Task] = set()
         _LOGGER.debug(f"api_session_version: {__version__}")
 
+    def start_background_task(self, coroutine: Coroutine) -> asyncio.Task:
+        """Runs work that uses this client, cancelled by cleanup_client_session."""
+        task = asyncio.ensure_future(coroutine)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
     async def cleanup_client_session(self):
+        for task in list(self._background_tasks):
+            task.cancel()
         await self.api_session.close()
 
     @request_with_logging_and_errors
     @request_with_logging
     async def _post_request_with_logging_and_errors_raised(
-        self, url: str, json_body: dict, auth_token: str = None
+        self, url: str, data: bytes, auth_token: str = None
     ) -> ClientResponse:
-        headers = {USER_AGENT: "hatch_rest_api"}
+        headers = {USER_AGENT: "hatch_rest_api", CONTENT_TYPE: "application/json"}
         if auth_token is not None:
             headers["X-HatchBaby-Auth"] = auth_token
-        return await self.api_session.post(url=url, json=json_body, headers=headers)
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire(url)
+        return await self.api_session.post(url=url, data=data, headers=headers)
 
-    @request_with_logging
     @request_with_logging_and_errors
+    @request_with_logging
     async def _get_request_with_logging_and_errors_raised(
         self, url: str, auth_token: str = None, params: dict = None
     ) -> ClientResponse:
         headers = {USER_AGENT: "hatch_rest_api"}
         if auth_token is not None:
             headers["X-HatchBaby-Auth"] = auth_token
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire(url)
         return await self.api_session.get(url=url, headers=headers, params=params)
 
     async def login(self, email: str, password: str) -> str:
-        url = API_URL + "public/v1/login"
+        url = self.base_url + "public/v1/login"
         json_body = {
             "email": email,
             "password": password,
         }
-        response: ClientResponse = (
+        response_json = (
             await self._post_request_with_logging_and_errors_raised(
                 url=url, json_body=json_body
             )
         )
-        response_json = await response.json()
         return response_json["token"]
 
     async def member(self, auth_token: str):
-        url = API_URL + "service/app/v2/member"
-        response: ClientResponse = (
+        url = self.base_url + "service/app/v2/member"
+        response_json = (
             await self._get_request_with_logging_and_errors_raised(
                 url=url, auth_token=auth_token
             )
         )
-        response_json = await response.json()
         return response_json["payload"]
 
     async def iot_devices(self, auth_token: str):
-        url = API_URL + "service/app/iotDevice/v2/fetch"
+        url = self.base_url + "service/app/iotDevice/v2/fetch"
         params = {
             "iotProducts": [
                 "restMini",
@@ -124,46 +149,42 @@ class Hatch:
                 "restoreV5",
             ]
         }
-        response: ClientResponse = (
+        response_json = (
             await self._get_request_with_logging_and_errors_raised(
                 url=url, auth_token=auth_token, params=params
             )
         )
-        response_json = await response.json()
         return response_json["payload"]
 
     async def token(self, auth_token: str):
-        url = API_URL + "service/app/restPlus/token/v1/fetch"
-        response: ClientResponse = (
+        url = self.base_url + "service/app/restPlus/token/v1/fetch"
+        response_json = (
             await self._get_request_with_logging_and_errors_raised(
                 url=url, auth_token=auth_token
             )
         )
-        response_json = await response.json()
         return response_json["payload"]
 
     async def favorites(self, auth_token: str, mac: str):
-        url = API_URL + "service/app/routine/v2/fetch"
+        url = self.base_url + "service/app/routine/v2/fetch"
         params = {"macAddress": mac}
-        response: ClientResponse = (
+        response_json = (
             await self._get_request_with_logging_and_errors_raised(
                 url=url, auth_token=auth_token, params=params
             )
         )
-        response_json = await response.json()
         favorites = response_json["payload"]
         favorites.sort(key=lambda x: x.get("displayOrder", float("inf")))
         return favorites
 
     async def routines(self, auth_token: str, mac: str):
-        url = API_URL + "service/app/routine/v2/fetch"
+        url = self.base_url + "service/app/routine/v2/fetch"
         params = {"macAddress": mac, "types": "routine"}
-        response: ClientResponse = (
+        response_json = (
             await self._get_request_with_logging_and_errors_raised(
                 url=url, auth_token=auth_token, params=params
             )
         )
-        response_json = await response.json()
         routines = response_json["payload"]
         routines.sort(key=lambda x: x.get("displayOrder", float("inf")))
         return routines
@@ -174,16 +195,15 @@ class Hatch:
         mac: str,
         types: list[str] | None = None,
     ) -> list[ScheduledRoutineAlarm]:
-        url = API_URL + "service/app/routine/v3/fetch"
+        url = self.base_url + "service/app/routine/v3/fetch"
         params: dict[str, str | list[str]] = {"macAddress": mac}
         if types is not None:
             params["types"] = types
-        response: ClientResponse = (
+        response_json = (
             await self._get_request_with_logging_and_errors_raised(
                 url=url, auth_token=auth_token, params=params
             )
         )
-        response_json = await response.json()
         routines = response_json["payload"]
         routines.sort(key=lambda x: x.get("displayOrder", float("inf")))
         return routines
@@ -278,8 +298,8 @@ class Hatch:
         mutable_scheduled_routines: list[dict[str, Any]],
         routine_type: str,
     ) -> dict:
-        url = API_URL + "service/app/routine/v2/editMultiple"
-        response: ClientResponse = (
+        url = self.base_url + "service/app/routine/v2/editMultiple"
+        response_json = (
             await self._post_request_with_logging_and_errors_raised(
                 url=url,
                 auth_token=auth_token,
@@ -289,7 +309,6 @@ class Hatch:
                 },
             )
         )
-        response_json = await response.json()
         return response_json["payload"]
 
     async def confirm_data_version(
@@ -300,8 +319,8 @@ class Hatch:
         success: bool = True,
         return_all_routines: bool = True,
     ) -> list[ScheduledRoutineAlarm]:
-        url = API_URL + "service/app/v2/dataVersion"
-        response: ClientResponse = (
+        url = self.base_url + "service/app/v2/dataVersion"
+        response_json = (
             await self._post_request_with_logging_and_errors_raised(
                 url=url,
                 auth_token=auth_token,
@@ -313,27 +332,25 @@ class Hatch:
                 },
             )
         )
-        response_json = await response.json()
         return response_json["payload"]
 
     async def content(
         self, auth_token: str, product: str, content: list, max_retries: int = 3
     ):
         # content options are ["sound", "color", "windDown"]
-        url = API_URL + "service/app/content/v1/fetchByProduct"
+        url = self.base_url + "service/app/content/v1/fetchByProduct"
         params = {"product": product, "contentTypes": content}
 
         retry_count = 0
         while True:
             try:
-                response: ClientResponse = (
+                response_json = (
                     await self._get_request_with_logging_and_errors_raised(
                         url=url, auth_token=auth_token, params=params
                     )
                 )
-                response_json = await response.json()
                 return response_json["payload"]
-            except RateError:
+            except RateError as error:
                 retry_count += 1
                 if retry_count > max_retries:
                     _LOGGER.error(
@@ -341,9 +358,9 @@ class Hatch:
                     )
                     raise
 
-                # Calculate exponential backoff wait time (2^retry_count seconds)
-                wait_time = 2**retry_count
+                if self.rest_stats is not None:
+                    self.rest_stats.retried(self.stats_client, url)
                 _LOGGER.warning(
-                    f"Rate limited. Retrying in {wait_time} seconds (attempt {retry_count}/{max_retries})"
+                    "Rate limited, backing off before retrying (attempt %s/%s)", retry_count, max_retries
                 )
-                await asyncio.sleep(wait_time)
+                await back_off(self.rate_limiter, url, retry_count, error.retry_after)
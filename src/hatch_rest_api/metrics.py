@@ -0,0 +1,174 @@
+import threading
+from bisect import bisect_left
+from collections.abc import Mapping
+from typing import Protocol
+
+# Histogram bucket upper bounds in seconds, from a fast PUBACK to a timeout.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Setter call to the broker's PUBACK of the shadow update.
+COMMAND_PUBLISH_SECONDS = "hatch_command_publish_seconds"
+# Setter call to the device reporting every desired leaf of the command.
+COMMAND_CONVERGENCE_SECONDS = "hatch_command_convergence_seconds"
+# Commands whose publish, or convergence when tracked, timed out.
+COMMAND_TIMEOUTS = "hatch_command_timeouts_total"
+# REST call latency per client and endpoint path, see RestStats.
+REST_REQUEST_SECONDS = "hatch_rest_request_seconds"
+# REST calls per client, endpoint path and status, "error" without a response.
+REST_REQUESTS = "hatch_rest_requests_total"
+REST_RETRIES = "hatch_rest_retries_total"
+REST_RATE_LIMITED = "hatch_rest_rate_limited_total"
+REST_BYTES_SENT = "hatch_rest_sent_bytes_total"
+REST_BYTES_RECEIVED = "hatch_rest_received_bytes_total"
+
+METRIC_HELP = {
+    COMMAND_PUBLISH_SECONDS: "Seconds from a setter call to the PUBACK of its shadow update.",
+    COMMAND_CONVERGENCE_SECONDS: "Seconds from a setter call to the device reporting the desired state.",
+    COMMAND_TIMEOUTS: "Commands that timed out before being published, or reported when tracking convergence.",
+    REST_REQUEST_SECONDS: "Seconds per REST call, including client side rate limiting.",
+    REST_REQUESTS: "REST calls by response status.",
+    REST_RETRIES: "Retries of rate limited REST calls.",
+    REST_RATE_LIMITED: "REST calls answered with 429 Too Many Requests.",
+    REST_BYTES_SENT: "JSON request body bytes sent to REST endpoints.",
+    REST_BYTES_RECEIVED: "Response body bytes received from REST endpoints.",
+}
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class MetricsSink(Protocol):
+    """
+    Receives measurements as they happen, from any thread. Implementations must
+    be cheap and must not raise; InMemoryMetricsSink is the built-in one.
+    """
+
+    def observe(self, name: str, value: float, labels: Mapping[str, str]) -> None:
+        """Adds value to the histogram name."""
+
+    def increment(self, name: str, labels: Mapping[str, str], amount: float = 1) -> None:
+        """Adds amount to the counter name."""
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # per bucket, not cumulative, the last one is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def copy(self) -> "Histogram":
+        histogram = Histogram(self.buckets)
+        histogram.counts = list(self.counts)
+        histogram.sum = self.sum
+        histogram.count = self.count
+        return histogram
+
+    def cumulative(self) -> list[tuple[float, int]]:
+        """(upper bound, observations at or below it) pairs, ending with +Inf."""
+        total = 0
+        pairs = []
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def __repr__(self):
+        return f"Histogram(count={self.count}, sum={self.sum})"
+
+
+def _labels_key(labels: Mapping[str, str]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class InMemoryMetricsSink:
+    """Thread safe MetricsSink keeping histograms and counters per label set."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms: dict[str, dict[Labels, Histogram]] = {}
+        self._counters: dict[str, dict[Labels, float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, labels: Mapping[str, str]) -> None:
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def increment(self, name: str, labels: Mapping[str, str], amount: float = 1) -> None:
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def histogram(self, name: str, **labels: str) -> Histogram | None:
+        with self._lock:
+            histogram = self._histograms.get(name, {}).get(_labels_key(labels))
+            return histogram.copy() if histogram is not None else None
+
+    def counter(self, name: str, **labels: str) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(_labels_key(labels), 0)
+
+    def snapshot(self) -> dict[str, dict[Labels, Histogram | float]]:
+        """Copies of every series, keyed by metric name and sorted label pairs."""
+        with self._lock:
+            snapshot: dict[str, dict[Labels, Histogram | float]] = {
+                name: {key: histogram.copy() for key, histogram in series.items()}
+                for name, series in self._histograms.items()
+            }
+            for name, series in self._counters.items():
+                snapshot[name] = dict(series)
+        return snapshot
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value)
+
+
+def prometheus_text(sink: InMemoryMetricsSink, help_texts: Mapping[str, str] = METRIC_HELP) -> str:
+    """Renders the sink in the Prometheus text exposition format."""
+    lines = []
+    for name, series in sorted(sink.snapshot().items()):
+        is_histogram = any(isinstance(value, Histogram) for value in series.values())
+        if name in help_texts:
+            lines.append(f"# HELP {name} {help_texts[name]}")
+        lines.append(f"# TYPE {name} {'histogram' if is_histogram else 'counter'}")
+        for labels, value in sorted(series.items()):
+            if not is_histogram:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            for bound, count in value.cumulative():
+                bucket_labels = (*labels, ("le", _format_value(float(bound))))
+                lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value.sum)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value.count}")
+    return "\n".join(lines) + "\n" if lines else ""
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+_LOGGER = logging.getLogger(__name__)
+
+# Requests per second and burst size per host of a RateLimiter built without
+# arguments. Conservative guesses, not measured Hatch limits; the REST clients
+# only use a limiter when one is passed in.
+DEFAULT_RATE = 5.0
+DEFAULT_BURST = 10
+# Upper bound for a single backoff sleep, in seconds.
+DEFAULT_MAX_BACKOFF = 60.0
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parses a Retry-After header given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=UTC)
+    return max((retry_at - datetime.now(UTC)).total_seconds(), 0.0)
+
+
+def retry_delay(attempt: int, retry_after: float | None = None, max_backoff: float = DEFAULT_MAX_BACKOFF) -> float:
+    if retry_after is not None:
+        return min(retry_after, max_backoff)
+    ceiling = min(max_backoff, 2.0**attempt)
+    # equal jitter, so retries from concurrent callers spread out
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """Takes a token and returns 0, or returns how long to wait for one."""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    async def acquire(self):
+        while (wait := self.try_acquire()) > 0:
+            await asyncio.sleep(wait)
+
+    def block_for(self, seconds: float):
+        """Holds every caller of this bucket back for seconds and drains it."""
+        now = time.monotonic()
+        self._refill(now)
+        self._tokens = 0.0
+        self._blocked_until = max(self._blocked_until, now + seconds)
+
+
+class RateLimiter:
+    """
+    Proactive per host token bucket limiter shared by the REST clients, with
+    jittered exponential backoff that honors Retry-After once a 429 does happen.
+    """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        host_limits: dict[str, tuple[float, int]] | None = None,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.host_limits = dict(host_limits or {})
+        self.max_backoff = max_backoff
+        self._buckets: dict[str, TokenBucket] = {}
+
+    def bucket(self, url) -> TokenBucket:
+        host = urlsplit(str(url)).hostname or ""
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            rate, burst = self.host_limits.get(host, (self.rate, self.burst))
+            bucket = self._buckets[host] = TokenBucket(rate, burst)
+        return bucket
+
+    async def acquire(self, url):
+        await self.bucket(url).acquire()
+
+    def retry_delay(self, attempt: int, retry_after: float | None = None) -> float:
+        return retry_delay(attempt, retry_after, self.max_backoff)
+
+    def throttle(self, url, attempt: int, retry_after: float | None = None) -> float:
+        """Records a 429 for url's host and returns how long to wait before retrying."""
+        delay = self.retry_delay(attempt, retry_after)
+        self.bucket(url).block_for(delay)
+        _LOGGER.debug("throttling %s for %.2f seconds", urlsplit(str(url)).hostname, delay)
+        return delay
+
+
+async def back_off(rate_limiter: RateLimiter | None, url, attempt: int, retry_after: float | None = None) -> float:
+    """
+    Waits out a 429 for url and returns how long that takes. A rate_limiter holds
+    back every request to the host instead, so the next acquire does the waiting.
+    """
+    if rate_limiter is not None:
+        return rate_limiter.throttle(url, attempt, retry_after)
+    delay = retry_delay(attempt, retry_after)
+    await asyncio.sleep(delay)
+    return delay
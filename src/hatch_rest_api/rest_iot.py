@@ -3,11 +3,13 @@ import logging
 
 from .types import SoundContent, SimpleSoundContent
 from .util import (
-    convert_to_percentage,
-    safely_get_json_value,
+    StateExtractor,
+    StateField,
     convert_from_percentage,
     convert_from_hex,
-    convert_to_hex,
+    hex_from_state,
+    percentage_from_state,
+    safely_get_json_value,
 )
 from .const import (
     RIOT_FLAGS_CLOCK_ON,
@@ -21,6 +23,9 @@ from .shadow_client_subscriber import ShadowClientSubscriberMixin
 
 _LOGGER = logging.getLogger(__name__)
 
+# Built once, set_audio_track falls back to it for tracks the API catalog lacks.
+_AUDIO_TRACK_URLS = RIoTAudioTrack.sound_url_map()
+
 
 class RestIot(ShadowClientSubscriberMixin):
     audio_track: RIoTAudioTrack = None
@@ -45,65 +50,52 @@ class RestIot(ShadowClientSubscriberMixin):
     toddler_lock: bool = False
     toddler_lock_mode: str = None
 
+    derived_state_attributes = ("audio_track",)
+    property_fields = {
+        "is_on": ("color_id", "sound_id"),
+        "is_light_on": ("color_id",),
+        "is_playing": ("sound_id",),
+        "is_clock_on": ("flags",),
+        "is_clock_24h": ("flags",),
+    }
+    state_fields = StateExtractor(
+        (
+            StateField("deviceInfo.f", "firmware_version"),
+            StateField("deviceInfo.b", "battery_level", int),
+            StateField("deviceInfo.powerStatus", "charging_status", int),
+            StateField("toddlerLockOn", "toddler_lock", bool),
+            StateField("toddlerLock.turnOnMode", "toddler_lock_mode", str),
+            StateField("current.playing", "current_playing"),
+            StateField("current.srId", "current_id"),
+            StateField("current.step", "current_step"),
+            StateField("connected", "is_online", bool),
+            StateField("current.sound.v", "volume", percentage_from_state),
+            StateField("current.sound.id", "sound_id", int),
+            StateField("current.color.id", "color_id", int),
+            StateField("current.color.w", "white", int),
+            StateField("current.color.r", "red", hex_from_state),
+            StateField("current.color.g", "green", hex_from_state),
+            StateField("current.color.b", "blue", hex_from_state),
+            StateField("current.color.i", "brightness", percentage_from_state),
+            StateField("clock.i", "clock", percentage_from_state),
+            StateField("clock.flags", "flags", int),
+        )
+    )
+
     def _update_local_state(self, state):
-        _LOGGER.debug(f"update local state: {self.device_name}, {state}")
-        if safely_get_json_value(state, "deviceInfo.f") is not None:
-            self.firmware_version = safely_get_json_value(state, "deviceInfo.f")
-        if safely_get_json_value(state, "deviceInfo.b") is not None:
-            self.battery_level = safely_get_json_value(state, "deviceInfo.b", int)
-        if safely_get_json_value(state, "deviceInfo.powerStatus") is not None:
-            self.charging_status = safely_get_json_value(state, "deviceInfo.powerStatus", int)
-        if safely_get_json_value(state, "toddlerLockOn") is not None:
-            self.toddler_lock = safely_get_json_value(state, "toddlerLockOn", bool)
-        if safely_get_json_value(state, "toddlerLock.turnOnMode") is not None:
-            self.toddler_lock_mode = safely_get_json_value(
-                state, "toddlerLock.turnOnMode", str
-            )
-        if safely_get_json_value(state, "current.playing") is not None:
-            self.current_playing = safely_get_json_value(state, "current.playing")
-        if safely_get_json_value(state, "current.srId") is not None:
-            self.current_id = safely_get_json_value(state, "current.srId")
-        if safely_get_json_value(state, "current.step") is not None:
-            self.current_step = safely_get_json_value(state, "current.step")
-        if safely_get_json_value(state, "connected") is not None:
-            self.is_online = safely_get_json_value(state, "connected", bool)
-        if safely_get_json_value(state, "current.sound.v") is not None:
-            self.volume = convert_to_percentage(
-                safely_get_json_value(state, "current.sound.v", int)
-            )
-        if safely_get_json_value(state, "current.sound.id", int) is not None:
-            self.sound_id = safely_get_json_value(state, "current.sound.id", int)
+        _LOGGER.debug("update local state: %s, %s", self.device_name, state)
+        changed = self._apply_state(state)
+        # a first report of the default sound leaves sound_id unchanged but still
+        # has to set the track
+        if "sound_id" in changed or (
+            self.audio_track is None
+            and safely_get_json_value(state, "current.sound.id") is not None
+        ):
             with contextlib.suppress(ValueError):
-                self.audio_track = RIoTAudioTrack(self.sound_id)
-        if safely_get_json_value(state, "current.color.id") is not None:
-            self.color_id = safely_get_json_value(state, "current.color.id", int)
-        if safely_get_json_value(state, "current.color.w") is not None:
-            self.white = safely_get_json_value(state, "current.color.w", int)
-        if safely_get_json_value(state, "current.color.r") is not None:
-            self.red = convert_to_hex(
-                safely_get_json_value(state, "current.color.r", int)
-            )
-        if safely_get_json_value(state, "current.color.g") is not None:
-            self.green = convert_to_hex(
-                safely_get_json_value(state, "current.color.g", int)
-            )
-        if safely_get_json_value(state, "current.color.b") is not None:
-            self.blue = convert_to_hex(
-                safely_get_json_value(state, "current.color.b", int)
-            )
-        if safely_get_json_value(state, "current.color.i") is not None:
-            self.brightness = convert_to_percentage(
-                safely_get_json_value(state, "current.color.i", int)
-            )
-        if safely_get_json_value(state, "clock.i") is not None:
-            self.clock = convert_to_percentage(
-                safely_get_json_value(state, "clock.i", int)
-            )
-        if safely_get_json_value(state, "clock.flags") is not None:
-            self.flags = safely_get_json_value(state, "clock.flags", int)
+                self._set_state_attribute(changed, "audio_track", RIoTAudioTrack(self.sound_id))
 
-        _LOGGER.debug(f"new state:{self}")
-        self.publish_updates()
+        _LOGGER.debug("new state:%s", self)
+        self.publish_updates(changed)
 
     def __repr__(self):
         return {
@@ -168,67 +160,62 @@ class RestIot(ShadowClientSubscriberMixin):
         return names
 
     def set_volume(self, percentage: int):
-        _LOGGER.debug(f"Setting volume: {percentage}")
-        self._update({"current": {"sound": {"v": convert_from_percentage(percentage)}}})
+        _LOGGER.debug("Setting volume: %s", percentage)
+        return self._update({"current": {"sound": {"v": convert_from_percentage(percentage)}}}, command="set_volume")
 
     # Expected string value for mode is "never" or "always". The API also supports "custom" for defining a time range
     def set_toddler_lock(self, on: bool):
-        _LOGGER.debug(f"Setting Toddler On Lock: {on}")
+        _LOGGER.debug("Setting Toddler On Lock: %s", on)
         mode = "always" if on else "never"
-        self._update({"toddlerLock": {"turnOnMode": mode}})
+        return self._update({"toddlerLock": {"turnOnMode": mode}}, command="set_toddler_lock")
 
     def set_clock(self, brightness: int = 0):
-        _LOGGER.debug(f"Setting clock on: {brightness}")
-        self._update(
+        _LOGGER.debug("Setting clock on: %s", brightness)
+        return self._update(
             {
                 "clock": {
                     "flags": self.flags | RIOT_FLAGS_CLOCK_ON,
                     "i": convert_from_percentage(brightness),
                 }
-            }
+            },
+            command="set_clock",
         )
 
     def turn_clock_off(self):
         _LOGGER.debug("Turn off clock")
-        self._update({"clock": {"flags": self.flags ^ RIOT_FLAGS_CLOCK_ON, "i": 655}})
+        return self._update({"clock": {"flags": self.flags ^ RIOT_FLAGS_CLOCK_ON, "i": 655}}, command="turn_clock_off")
 
     # favorite_name_id is expected to be a string of name-id since name alone isn't unique
     def set_favorite(self, favorite_name_id: str):
-        _LOGGER.debug(f"Setting favorite: {favorite_name_id}")
+        _LOGGER.debug("Setting favorite: %s", favorite_name_id)
         fav_id = int(favorite_name_id.rsplit("-", 1)[1])
-        self._update({"current": {"srId": fav_id, "step": 1, "playing": "routine"}})
+        return self._update({"current": {"srId": fav_id, "step": 1, "playing": "routine"}}, command="set_favorite")
 
     def set_audio_track(self, audio_track: RIoTAudioTrack):
-        _LOGGER.debug(f"Setting audio track: {audio_track}")
+        _LOGGER.debug("Setting audio track: %s", audio_track)
         if audio_track == RIoTAudioTrack.NONE:
-            self.turn_off()
-            return
+            return self.turn_off()
 
-        sound_url_map = RIoTAudioTrack.sound_url_map()
-        # update the map with any changes from the API
-        sound_url_map.update({
-            sound.get('id'): sound.get('wavUrl') for sound in self.sounds
-        })
-        _LOGGER.debug(f'Available Sounds: {sound_url_map}')
-        self._update({"current": {"playing": "remote", "step": 1, "sound": {
+        # urls from the API win over the hard-coded ones
+        url = self.sounds.wav_url_by_id.get(audio_track.value) or _AUDIO_TRACK_URLS[audio_track.value]
+        return self._update({"current": {"playing": "remote", "step": 1, "sound": {
                 "id": audio_track.value,
-                "url": sound_url_map[audio_track.value],
+                "url": url,
                 "mute": False,
                 "until": "indefinite",
-            }}})
+            }}}, command="set_audio_track")
 
     def set_sound(self, sound_or_id_or_title: SoundContent | SimpleSoundContent | str | int | None, duration: int = 0, until="indefinite"):
         """
         Set a sound by passing SoundContent item from self.sounds, id, or title.
         """
         if sound_or_id_or_title is None or sound_or_id_or_title == NO_SOUND_ID or sound_or_id_or_title == "none":
-            self.turn_off()
-            return
+            return self.turn_off()
 
         if isinstance(sound_or_id_or_title, int):
-            sound = self.sounds_by_id.get(sound_or_id_or_title)
+            sound = self.sounds.by_id.get(sound_or_id_or_title)
         elif isinstance(sound_or_id_or_title, str):
-            sound = self.sounds_by_name.get(sound_or_id_or_title)
+            sound = self.sounds.by_title.get(sound_or_id_or_title)
         else:
             # Assume it's a SoundContent or SimpleSoundContent object
             sound = sound_or_id_or_title
@@ -237,8 +224,8 @@ class RestIot(ShadowClientSubscriberMixin):
             _LOGGER.error(f"Sound not found: {sound_or_id_or_title}")
             return
 
-        _LOGGER.debug(f"Setting sound: {sound.get('title') or sound['id']}")
-        self._update(
+        _LOGGER.debug("Setting sound: %s", sound.get('title') or sound['id'])
+        return self._update(
             {
                 "current": {
                     "playing": "remote",
@@ -250,7 +237,8 @@ class RestIot(ShadowClientSubscriberMixin):
                         "until": until,
                     },
                 }
-            }
+            },
+            command="set_sound",
         )
 
     def set_sound_url(self, sound_url: str = 'http://codeskulptor-demos.commondatastorage.googleapis.com/GalaxyInvaders/theme_01.mp3'):
@@ -259,25 +247,26 @@ class RestIot(ShadowClientSubscriberMixin):
 
         i.e. http://codeskulptor-demos.commondatastorage.googleapis.com/GalaxyInvaders/theme_01.mp3
         """
-        _LOGGER.debug(f"Setting sound URL: {sound_url}")
-        self._update(
+        _LOGGER.debug("Setting sound URL: %s", sound_url)
+        return self._update(
             {
                 "current": {
                     "playing": "remote",
                     "sound": {"mute": False, "url": sound_url},
                 }
-            }
+            },
+            command="set_sound_url",
         )
 
     def turn_off(self):
         _LOGGER.debug("Turning off sound")
-        self._update({"current": {"srId": 0, "step": 0, "playing": "none"}})
+        return self._update({"current": {"srId": 0, "step": 0, "playing": "none"}}, command="turn_off")
 
     def turn_light_off(self):
         _LOGGER.debug("Turning light off")
         # if favorite is playing then light can be turned off without turning off sound
         if self.current_playing == "routine":
-            self._update(
+            return self._update(
                 {
                     "current": {
                         "color": {
@@ -288,10 +277,11 @@ class RestIot(ShadowClientSubscriberMixin):
                             "w": 0,
                         }
                     }
-                }
+                },
+                command="turn_light_off",
             )
         if self.current_playing == "remote":
-            self._update(
+            return self._update(
                 {
                     "current": {
                         "playing": "none",
@@ -303,7 +293,8 @@ class RestIot(ShadowClientSubscriberMixin):
                             "w": 0,
                         },
                     }
-                }
+                },
+                command="turn_light_off",
             )
 
     def set_color(
@@ -311,11 +302,16 @@ class RestIot(ShadowClientSubscriberMixin):
     ):
         new_color_id = CUSTOM_COLOR_ID
         _LOGGER.debug(
-            f"red: {red} green: {green} blue: {blue} brightness: {brightness} white: {white}"
+            "red: %s green: %s blue: %s brightness: %s white: %s",
+            red,
+            green,
+            blue,
+            brightness,
+            white,
         )
         # If there is no sound playing, and you want to turn on the light the playing value has to be set to remote
         if self.current_playing == "none":
-            self._update(
+            return self._update(
                 {
                     "current": {
                         "srId": 0,
@@ -330,10 +326,11 @@ class RestIot(ShadowClientSubscriberMixin):
                             "w": white,
                         },
                     }
-                }
+                },
+                command="set_color",
             )
         else:
-            self._update(
+            return self._update(
                 {
                     "current": {
                         "color": {
@@ -345,5 +342,6 @@ class RestIot(ShadowClientSubscriberMixin):
                             "w": white,
                         }
                     }
-                }
+                },
+                command="set_color",
             )
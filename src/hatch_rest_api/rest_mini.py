@@ -1,6 +1,11 @@
 import logging
 
-from .util import convert_to_percentage, safely_get_json_value, convert_from_percentage
+from .util import (
+    StateExtractor,
+    StateField,
+    convert_to_percentage,
+    convert_from_percentage,
+)
 from .shadow_client_subscriber import ShadowClientSubscriberMixin
 from .const import RestMiniAudioTrack
 
@@ -32,51 +37,51 @@ class RestMini(ShadowClientSubscriberMixin):
     def __str__(self):
         return f"{self.__repr__()}"
 
+    property_fields = {"is_playing": ("current_playing",)}
+    state_fields = StateExtractor(
+        (
+            StateField("connected", "is_online"),
+            StateField("deviceInfo.f", "firmware_version"),
+            StateField("current.sound.id", "audio_track", RestMiniAudioTrack),
+            StateField("current.playing", "current_playing"),
+            StateField("current.sound.v", "volume", convert_to_percentage),
+        )
+    )
+
     def _update_local_state(self, state):
-        _LOGGER.debug(f"update local state: {self.device_name}, {state}")
-        if safely_get_json_value(state, "connected") is not None:
-            self.is_online = safely_get_json_value(state, "connected")
-        if safely_get_json_value(state, "deviceInfo.f") is not None:
-            self.firmware_version = safely_get_json_value(state, "deviceInfo.f")
-        if safely_get_json_value(state, "current.sound.id") is not None:
-            self.audio_track = RestMiniAudioTrack(
-                safely_get_json_value(state, "current.sound.id")
-            )
-        if safely_get_json_value(state, "current.playing") is not None:
-            self.current_playing = safely_get_json_value(state, "current.playing")
-        if safely_get_json_value(state, "current.sound.v") is not None:
-            self.volume = convert_to_percentage(
-                safely_get_json_value(state, "current.sound.v")
-            )
-        self.publish_updates()
+        _LOGGER.debug("update local state: %s, %s", self.device_name, state)
+        changed = self._apply_state(state)
+        self.publish_updates(changed)
 
     @property
     def is_playing(self) -> bool:
         return self.current_playing != "none"
 
     def set_volume(self, percentage: int):
-        self._update(
+        return self._update(
             {
                 "current": {
                     "sound": {
                         "v": convert_from_percentage(percentage),
                     },
                 },
-            }
+            },
+            command="set_volume",
         )
 
     def set_audio_track(self, audio_track: RestMiniAudioTrack):
         if audio_track == RestMiniAudioTrack.NONE:
-            self._update(
+            return self._update(
                 {
                     "current": {
                         "playing": "none",
                         "step": 0,
                     },
-                }
+                },
+                command="set_audio_track",
             )
         else:
-            self._update(
+            return self._update(
                 {
                     "current": {
                         "playing": "remote",
@@ -86,5 +91,6 @@ class RestMini(ShadowClientSubscriberMixin):
                             "until": "indefinite",
                         },
                     },
-                }
+                },
+                command="set_audio_track",
             )
@@ -1,11 +1,12 @@
 import logging
 
 from .util import (
-    convert_to_percentage,
-    safely_get_json_value,
+    StateExtractor,
+    StateField,
     convert_from_percentage,
     convert_from_hex,
-    convert_to_hex,
+    hex_from_state,
+    percentage_from_state,
 )
 from .shadow_client_subscriber import ShadowClientSubscriberMixin
 from .const import RestPlusAudioTrack
@@ -30,38 +31,28 @@ class RestPlus(ShadowClientSubscriberMixin):
     color_random: bool = None
     color_white: bool = None
 
+    property_fields = {"is_playing": ("is_on", "audio_track")}
+    state_fields = StateExtractor(
+        (
+            StateField("deviceInfo.f", "firmware_version"),
+            StateField("deviceInfo.b", "battery_level", int),
+            StateField("isPowered", "is_on", bool),
+            StateField("connected", "is_online", bool),
+            StateField("a.t", "audio_track", lambda value: RestPlusAudioTrack(int(value))),
+            StateField("a.v", "volume", percentage_from_state),
+            StateField("c.R", "color_random", bool),
+            StateField("c.W", "color_white", bool),
+            StateField("c.r", "red", hex_from_state),
+            StateField("c.g", "green", hex_from_state),
+            StateField("c.b", "blue", hex_from_state),
+            StateField("c.i", "brightness", percentage_from_state),
+        )
+    )
+
     def _update_local_state(self, state):
-        _LOGGER.debug(f"update local state: {self.device_name}, {state}")
-        if safely_get_json_value(state, "deviceInfo.f") is not None:
-            self.firmware_version = safely_get_json_value(state, "deviceInfo.f")
-        if safely_get_json_value(state, "deviceInfo.b") is not None:
-            self.battery_level = safely_get_json_value(state, "deviceInfo.b", int)
-        if safely_get_json_value(state, "isPowered") is not None:
-            self.is_on = safely_get_json_value(state, "isPowered", bool)
-        if safely_get_json_value(state, "connected") is not None:
-            self.is_online = safely_get_json_value(state, "connected", bool)
-        if safely_get_json_value(state, "a.t") is not None:
-            self.audio_track = RestPlusAudioTrack(
-                safely_get_json_value(state, "a.t", int)
-            )
-        if safely_get_json_value(state, "a.v") is not None:
-            self.volume = convert_to_percentage(
-                safely_get_json_value(state, "a.v", int)
-            )
-        if safely_get_json_value(state, "c.R") is not None:
-            self.color_random = safely_get_json_value(state, "c.R", bool)
-        if safely_get_json_value(state, "c.W") is not None:
-            self.color_white = safely_get_json_value(state, "c.W", bool)
-        if safely_get_json_value(state, "c.r") is not None:
-            self.red = convert_to_hex(safely_get_json_value(state, "c.r", int))
-        if safely_get_json_value(state, "c.g") is not None:
-            self.green = convert_to_hex(safely_get_json_value(state, "c.g", int))
-        if safely_get_json_value(state, "c.b") is not None:
-            self.blue = convert_to_hex(safely_get_json_value(state, "c.b", int))
-        if safely_get_json_value(state, "c.i") is not None:
-            self.brightness = convert_to_percentage(
-                safely_get_json_value(state, "c.i", int)
-            )
+        _LOGGER.debug("update local state: %s, %s", self.device_name, state)
+        brightness = self.brightness
+        changed = self._apply_state(state)
         if (
             self.red == 0
             and self.green == 0
@@ -69,9 +60,12 @@ class RestPlus(ShadowClientSubscriberMixin):
             and not self.color_random
             and not self.color_white
         ):
-            self.brightness = 0
-        _LOGGER.debug(f"new state:{self}")
-        self.publish_updates()
+            self._set_state_attribute(changed, "brightness", 0)
+        # a reported brightness that black forces back to 0 is not a change
+        if "brightness" in changed and self.brightness == brightness:
+            del changed["brightness"]
+        _LOGGER.debug("new state:%s", self)
+        self.publish_updates(changed)
 
     @property
     def is_playing(self):
@@ -100,28 +94,30 @@ class RestPlus(ShadowClientSubscriberMixin):
         return f"{self.__repr__()}"
 
     def set_volume(self, percentage: int):
-        self._update(
+        return self._update(
             {
                 "a": {
                     "v": convert_from_percentage(percentage),
                 },
-            }
+            },
+            command="set_volume",
         )
 
     def set_audio_track(self, audio_track: RestPlusAudioTrack):
-        self._update(
+        return self._update(
             {
                 "a": {
                     "t": audio_track.value,
                 },
-            }
+            },
+            command="set_audio_track",
         )
 
     def set_on(self, on: bool):
-        self._update({"isPowered": on})
+        return self._update({"isPowered": on}, command="set_on")
 
     def set_color(self, red: int, green: int, blue: int, brightness: int, random: bool = False):
-        self._update(
+        return self._update(
             {
                 "c": {
                     "r": convert_from_hex(red),
@@ -131,5 +127,6 @@ class RestPlus(ShadowClientSubscriberMixin):
                     "W": False,
                     "R": random,
                 }
-            }
+            },
+            command="set_color",
         )
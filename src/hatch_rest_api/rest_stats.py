@@ -0,0 +1,178 @@
+import inspect
+import logging
+from collections import Counter
+from collections.abc import Callable
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+from .metrics import (
+    DEFAULT_BUCKETS,
+    REST_BYTES_RECEIVED,
+    REST_BYTES_SENT,
+    REST_RATE_LIMITED,
+    REST_REQUEST_SECONDS,
+    REST_REQUESTS,
+    REST_RETRIES,
+    Histogram,
+    MetricsSink,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Endpoint(NamedTuple):
+    # stats_client of the REST client, "hatch", "cognito" or "contentful"
+    client: str
+    # URL path, without host and query
+    path: str
+
+
+class RestRequest(NamedTuple):
+    """Passed to on_request_start hooks."""
+    endpoint: Endpoint
+    url: str
+
+
+class RestCall(NamedTuple):
+    """Passed to on_request_end hooks once a response was read or the request failed."""
+    endpoint: Endpoint
+    url: str
+    # None when no response arrived
+    status: int | None
+    # seconds, including any wait for the client side rate limiter
+    elapsed: float
+    bytes_sent: int
+    bytes_received: int
+    error: BaseException | None = None
+
+
+class EndpointStats:
+    __slots__ = (
+        "requests", "statuses", "errors", "retries", "rate_limited",
+        "bytes_sent", "bytes_received", "latency", "max_latency",
+    )
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.requests = 0
+        self.statuses: Counter[int] = Counter()
+        # requests that got no response at all
+        self.errors = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = Histogram(buckets)
+        self.max_latency = 0.0
+
+    def copy(self) -> "EndpointStats":
+        stats = EndpointStats(self.latency.buckets)
+        for name in self.__slots__:
+            setattr(stats, name, getattr(self, name))
+        stats.statuses = Counter(self.statuses)
+        stats.latency = self.latency.copy()
+        return stats
+
+    @property
+    def mean_latency(self) -> float:
+        return self.latency.sum / self.latency.count if self.latency.count else 0.0
+
+    def __repr__(self):
+        return (
+            f"EndpointStats(requests={self.requests}, statuses={dict(self.statuses)}, "
+            f"retries={self.retries}, rate_limited={self.rate_limited}, "
+            f"mean_latency={self.mean_latency:.3f})"
+        )
+
+
+Hook = Callable[["RestStats", RestRequest | RestCall], object]
+
+
+class RestStats:
+    """
+    Per endpoint counters and latency of the calls made by Hatch, AwsHttp and
+    Contentful, shared by passing it as their rest_stats. Read it with
+    snapshot(), forward it to a MetricsSink, or append callbacks to the
+    on_request_start and on_request_end lists, which like aiohttp's TraceConfig
+    signals are called as callback(stats, params) and may be coroutines.
+    """
+
+    def __init__(self, metrics_sink: MetricsSink | None = None, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.metrics_sink = metrics_sink
+        self.buckets = buckets
+        self.on_request_start: list[Hook] = []
+        self.on_request_end: list[Hook] = []
+        self._endpoints: dict[Endpoint, EndpointStats] = {}
+
+    def _stats(self, endpoint: Endpoint) -> EndpointStats:
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = self._endpoints[endpoint] = EndpointStats(self.buckets)
+        return stats
+
+    async def _send(self, hooks: list[Hook], params: RestRequest | RestCall):
+        for hook in hooks:
+            try:
+                result = hook(self, params)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                _LOGGER.exception("rest stats hook failed for %s", params.url)
+
+    async def request_started(self, client: str, url) -> None:
+        if self.on_request_start:
+            await self._send(self.on_request_start, RestRequest(_endpoint(client, url), str(url)))
+
+    async def request_ended(
+        self,
+        client: str,
+        url,
+        status: int | None,
+        elapsed: float,
+        bytes_sent: int = 0,
+        bytes_received: int = 0,
+        error: BaseException | None = None,
+    ) -> None:
+        endpoint = _endpoint(client, url)
+        stats = self._stats(endpoint)
+        stats.requests += 1
+        if status is None:
+            stats.errors += 1
+        else:
+            stats.statuses[status] += 1
+        if status == 429:
+            stats.rate_limited += 1
+        stats.bytes_sent += bytes_sent
+        stats.bytes_received += bytes_received
+        stats.latency.observe(elapsed)
+        stats.max_latency = max(stats.max_latency, elapsed)
+        if self.metrics_sink is not None:
+            labels = endpoint._asdict()
+            self.metrics_sink.observe(REST_REQUEST_SECONDS, elapsed, labels)
+            self.metrics_sink.increment(REST_REQUESTS, {**labels, "status": str(status or "error")})
+            self.metrics_sink.increment(REST_BYTES_SENT, labels, bytes_sent)
+            self.metrics_sink.increment(REST_BYTES_RECEIVED, labels, bytes_received)
+            if status == 429:
+                self.metrics_sink.increment(REST_RATE_LIMITED, labels)
+        if self.on_request_end:
+            await self._send(
+                self.on_request_end,
+                RestCall(endpoint, str(url), status, elapsed, bytes_sent, bytes_received, error),
+            )
+
+    def retried(self, client: str, url) -> None:
+        """Counts a retry of a rate limited request."""
+        endpoint = _endpoint(client, url)
+        self._stats(endpoint).retries += 1
+        if self.metrics_sink is not None:
+            self.metrics_sink.increment(REST_RETRIES, endpoint._asdict())
+
+    def snapshot(self) -> dict[Endpoint, EndpointStats]:
+        """Copies of the stats of every endpoint called so far."""
+        return {endpoint: stats.copy() for endpoint, stats in self._endpoints.items()}
+
+    def clear(self):
+        self._endpoints.clear()
+
+
+def _endpoint(client: str, url) -> Endpoint:
+    return Endpoint(client, urlsplit(str(url)).path or "/")
@@ -1,11 +1,12 @@
 import logging
 
 from .util import (
-    convert_to_percentage,
-    safely_get_json_value,
+    StateExtractor,
+    StateField,
     convert_from_percentage,
     convert_from_hex,
-    convert_to_hex,
+    hex_from_state,
+    percentage_from_state,
 )
 from .const import (
     RIOT_FLAGS_CLOCK_ON,
@@ -39,52 +40,37 @@ class RestoreIot(ScheduledRoutineAlarmMixin, ShadowClientSubscriberMixin):
     clock: int = 0
     flags: int = 0
 
+    property_fields = {
+        "is_on": ("color_id", "sound_id"),
+        "is_light_on": ("color_id",),
+        "is_playing": ("sound_id",),
+        "is_clock_on": ("flags",),
+        "is_clock_24h": ("flags",),
+    }
+    state_fields = StateExtractor(
+        (
+            StateField("deviceInfo.f", "firmware_version"),
+            StateField("current.playing", "current_playing"),
+            StateField("connected", "is_online", bool),
+            StateField("current.sound.v", "volume", percentage_from_state),
+            StateField("current.sound.id", "sound_id", int),
+            StateField("current.color.id", "color_id", int),
+            StateField("current.color.r", "red", hex_from_state),
+            StateField("current.color.g", "green", hex_from_state),
+            StateField("current.color.b", "blue", hex_from_state),
+            StateField("current.color.w", "white", hex_from_state),
+            StateField("current.color.i", "brightness", percentage_from_state),
+            StateField("clock.i", "clock", percentage_from_state),
+            StateField("clock.flags", "flags", int),
+        )
+    )
+
     def _update_local_state(self, state):
-        _LOGGER.debug(f"update local state: {self.device_name}, {state}")
-        if safely_get_json_value(state, "deviceInfo.f") is not None:
-            self.firmware_version = safely_get_json_value(state, "deviceInfo.f")
-
-        if safely_get_json_value(state, "current.playing") is not None:
-            self.current_playing = safely_get_json_value(state, "current.playing")
-        if safely_get_json_value(state, "connected") is not None:
-            self.is_online = safely_get_json_value(state, "connected", bool)
-        if safely_get_json_value(state, "current.sound.v") is not None:
-            self.volume = convert_to_percentage(
-                safely_get_json_value(state, "current.sound.v", int)
-            )
-        if safely_get_json_value(state, "current.sound.id", int) is not None:
-            self.sound_id = safely_get_json_value(state, "current.sound.id", int)
-        if safely_get_json_value(state, "current.color.id") is not None:
-            self.color_id = safely_get_json_value(state, "current.color.id", int)
-        if safely_get_json_value(state, "current.color.r") is not None:
-            self.red = convert_to_hex(
-                safely_get_json_value(state, "current.color.r", int)
-            )
-        if safely_get_json_value(state, "current.color.g") is not None:
-            self.green = convert_to_hex(
-                safely_get_json_value(state, "current.color.g", int)
-            )
-        if safely_get_json_value(state, "current.color.b") is not None:
-            self.blue = convert_to_hex(
-                safely_get_json_value(state, "current.color.b", int)
-            )
-        if safely_get_json_value(state, "current.color.w") is not None:
-            self.white = convert_to_hex(
-                safely_get_json_value(state, "current.color.w", int)
-            )
-        if safely_get_json_value(state, "current.color.i") is not None:
-            self.brightness = convert_to_percentage(
-                safely_get_json_value(state, "current.color.i", int)
-            )
-        if safely_get_json_value(state, "clock.i") is not None:
-            self.clock = convert_to_percentage(
-                safely_get_json_value(state, "clock.i", int)
-            )
-        if safely_get_json_value(state, "clock.flags") is not None:
-            self.flags = safely_get_json_value(state, "clock.flags", int)
+        _LOGGER.debug("update local state: %s, %s", self.device_name, state)
+        changed = self._apply_state(state)
 
-        _LOGGER.debug(f"new state:{self}")
-        self.publish_updates()
+        _LOGGER.debug("new state:%s", self)
+        self.publish_updates(changed)
 
     def __repr__(self):
         return {
@@ -133,8 +119,8 @@ class RestoreIot(ScheduledRoutineAlarmMixin, ShadowClientSubscriberMixin):
         return self.flags is not None and self.flags & RIOT_FLAGS_CLOCK_24_HOUR
 
     def set_volume(self, percentage: int):
-        _LOGGER.debug(f"Setting volume: {percentage}")
-        self._update({"current": {"sound": {"v": convert_from_percentage(percentage)}}})
+        _LOGGER.debug("Setting volume: %s", percentage)
+        return self._update({"current": {"sound": {"v": convert_from_percentage(percentage)}}}, command="set_volume")
 
     def favorite_names(self, active_only: bool = True):
         names = []
@@ -146,30 +132,31 @@ class RestoreIot(ScheduledRoutineAlarmMixin, ShadowClientSubscriberMixin):
         return names
 
     def set_clock(self, brightness: int = 0):
-        _LOGGER.debug(f"Setting clock on: {brightness}")
-        self._update(
-            {"clock": {"flags": self.flags | RIOT_FLAGS_CLOCK_ON, "i": convert_from_percentage(brightness)}}
+        _LOGGER.debug("Setting clock on: %s", brightness)
+        return self._update(
+            {"clock": {"flags": self.flags | RIOT_FLAGS_CLOCK_ON, "i": convert_from_percentage(brightness)}},
+            command="set_clock",
         )
 
     def turn_clock_off(self):
         _LOGGER.debug("Turn off clock")
-        self._update({"clock": {"flags": self.flags ^ RIOT_FLAGS_CLOCK_ON, "i": 655}})
+        return self._update({"clock": {"flags": self.flags ^ RIOT_FLAGS_CLOCK_ON, "i": 655}}, command="turn_clock_off")
 
     # favorite_name_id is expected to be a string of name-id since name alone isn't unique
     def set_favorite(self, favorite_name_id: str):
-        _LOGGER.debug(f"Setting favorite: {favorite_name_id}")
+        _LOGGER.debug("Setting favorite: %s", favorite_name_id)
         fav_id = int(favorite_name_id.rsplit("-", 1)[1])
-        self._update({"current": {"srId": fav_id, "step": 1, "playing": "routine"}})
+        return self._update({"current": {"srId": fav_id, "step": 1, "playing": "routine"}}, command="set_favorite")
 
     def turn_off(self):
         _LOGGER.debug("Turning off sound")
-        self._update({"current": {"srId": 0, "step": 0, "playing": "none"}})
+        return self._update({"current": {"srId": 0, "step": 0, "playing": "none"}}, command="turn_off")
 
     def turn_light_off(self):
         _LOGGER.debug("Turning light off")
         # if favorite is playing then light can be turned off without turning off sound
         if self.current_playing == "routine":
-            self._update(
+            return self._update(
                 {
                     "current": {
                         "color": {
@@ -180,10 +167,11 @@ class RestoreIot(ScheduledRoutineAlarmMixin, ShadowClientSubscriberMixin):
                             "w": 0,
                         }
                     }
-                }
+                },
+                command="turn_light_off",
             )
         if self.current_playing == "remote":
-            self._update(
+            return self._update(
                 {
                     "current": {
                         "playing": "none",
@@ -195,7 +183,8 @@ class RestoreIot(ScheduledRoutineAlarmMixin, ShadowClientSubscriberMixin):
                             "w": 0,
                         },
                     }
-                }
+                },
+                command="turn_light_off",
             )
 
     def set_color(
@@ -203,11 +192,16 @@ class RestoreIot(ScheduledRoutineAlarmMixin, ShadowClientSubscriberMixin):
     ):
         new_color_id = CUSTOM_COLOR_ID
         _LOGGER.debug(
-            f"red: {red} green: {green} blue: {blue} brightness: {brightness} white: {white}"
+            "red: %s green: %s blue: %s brightness: %s white: %s",
+            red,
+            green,
+            blue,
+            brightness,
+            white,
         )
         # If there is no sound playing, and you want to turn on the light the playing value has to be set to remote
         if self.current_playing == "none":
-            self._update(
+            return self._update(
                 {
                     "current": {
                         "srId": 0,
@@ -222,10 +216,11 @@ class RestoreIot(ScheduledRoutineAlarmMixin, ShadowClientSubscriberMixin):
                             "w": convert_from_hex(white),
                         },
                     }
-                }
+                },
+                command="set_color",
             )
         else:
-            self._update(
+            return self._update(
                 {
                     "current": {
                         "color": {
@@ -237,5 +232,6 @@ class RestoreIot(ScheduledRoutineAlarmMixin, ShadowClientSubscriberMixin):
                             "w": convert_from_hex(white),
                         }
                     }
-                }
+                },
+                command="set_color",
             )
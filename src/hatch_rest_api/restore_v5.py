@@ -2,11 +2,12 @@ import logging
 
 from .types import SoundContent, SimpleSoundContent
 from .util import (
-    convert_to_percentage,
-    safely_get_json_value,
+    StateExtractor,
+    StateField,
     convert_from_percentage,
     convert_from_hex,
-    convert_to_hex,
+    hex_from_state,
+    percentage_from_state,
 )
 from .const import (
     RIOT_FLAGS_CLOCK_ON,
@@ -45,63 +46,49 @@ class RestoreV5(ScheduledRoutineAlarmMixin, ShadowClientSubscriberMixin):
     clock_turn_dim_at: str = None
     clock_turn_bright_at: str = None
 
+    property_fields = {
+        "is_on": ("color_id", "sound_id"),
+        "is_light_on": ("color_id",),
+        "is_playing": ("sound_id",),
+        "is_clock_on": ("flags",),
+        "is_clock_24h": ("flags",),
+        "clock": ("clock_daytime",),
+    }
+    state_fields = StateExtractor(
+        (
+            StateField("deviceInfo.f", "firmware_version"),
+            StateField("current.playing", "current_playing"),
+            StateField("current.srId", "current_id"),
+            StateField("current.step", "current_step"),
+            StateField("connected", "is_online", bool),
+            StateField("current.sound.v", "volume", percentage_from_state),
+            StateField("current.sound.id", "sound_id", int),
+            StateField("current.color.id", "color_id", int),
+            StateField("current.color.r", "red", hex_from_state),
+            StateField("current.color.g", "green", hex_from_state),
+            StateField("current.color.b", "blue", hex_from_state),
+            StateField("current.color.w", "white", hex_from_state),
+            StateField("current.color.i", "brightness", percentage_from_state),
+            StateField(
+                "clock.i",
+                ("clock_nighttime", "clock_daytime"),
+                lambda value: unpack_dual_percentages(int(value)),
+            ),
+            StateField("clock.flags", "flags", int),
+            StateField("clock.turnOffMode", "clock_turn_off_mode"),
+            StateField("clock.turnOffAt", "clock_turn_off_at"),
+            StateField("clock.turnOnAt", "clock_turn_on_at"),
+            StateField("clock.turnDimAt", "clock_turn_dim_at"),
+            StateField("clock.turnBrightAt", "clock_turn_bright_at"),
+        )
+    )
+
     def _update_local_state(self, state):
-        _LOGGER.debug(f"update local state: {self.device_name}, {state}")
-        if safely_get_json_value(state, "deviceInfo.f") is not None:
-            self.firmware_version = safely_get_json_value(state, "deviceInfo.f")
-        if safely_get_json_value(state, "current.playing") is not None:
-            self.current_playing = safely_get_json_value(state, "current.playing")
-        if safely_get_json_value(state, "current.srId") is not None:
-            self.current_id = safely_get_json_value(state, "current.srId")
-        if safely_get_json_value(state, "current.step") is not None:
-            self.current_step = safely_get_json_value(state, "current.step")
-        if safely_get_json_value(state, "connected") is not None:
-            self.is_online = safely_get_json_value(state, "connected", bool)
-        if safely_get_json_value(state, "current.sound.v") is not None:
-            self.volume = convert_to_percentage(
-                safely_get_json_value(state, "current.sound.v", int)
-            )
-        if safely_get_json_value(state, "current.sound.id", int) is not None:
-            self.sound_id = safely_get_json_value(state, "current.sound.id", int)
-        if safely_get_json_value(state, "current.color.id") is not None:
-            self.color_id = safely_get_json_value(state, "current.color.id", int)
-        if safely_get_json_value(state, "current.color.r") is not None:
-            self.red = convert_to_hex(
-                safely_get_json_value(state, "current.color.r", int)
-            )
-        if safely_get_json_value(state, "current.color.g") is not None:
-            self.green = convert_to_hex(
-                safely_get_json_value(state, "current.color.g", int)
-            )
-        if safely_get_json_value(state, "current.color.b") is not None:
-            self.blue = convert_to_hex(
-                safely_get_json_value(state, "current.color.b", int)
-            )
-        if safely_get_json_value(state, "current.color.w") is not None:
-            self.white = convert_to_hex(
-                safely_get_json_value(state, "current.color.w", int)
-            )
-        if safely_get_json_value(state, "current.color.i") is not None:
-            self.brightness = convert_to_percentage(
-                safely_get_json_value(state, "current.color.i", int)
-            )
-        if safely_get_json_value(state, "clock.i") is not None:
-            self.clock_nighttime, self.clock_daytime = unpack_dual_percentages(safely_get_json_value(state, "clock.i", int))
-        if safely_get_json_value(state, "clock.flags") is not None:
-            self.flags = safely_get_json_value(state, "clock.flags", int)
-        if safely_get_json_value(state, "clock.turnOffMode") is not None:
-            self.clock_turn_off_mode = safely_get_json_value(state, "clock.turnOffMode")
-        if safely_get_json_value(state, "clock.turnOffAt") is not None:
-            self.clock_turn_off_at = safely_get_json_value(state, "clock.turnOffAt")
-        if safely_get_json_value(state, "clock.turnOnAt") is not None:
-            self.clock_turn_on_at = safely_get_json_value(state, "clock.turnOnAt")
-        if safely_get_json_value(state, "clock.turnDimAt") is not None:
-            self.clock_turn_dim_at = safely_get_json_value(state, "clock.turnDimAt")
-        if safely_get_json_value(state, "clock.turnBrightAt") is not None:
-            self.clock_turn_bright_at = safely_get_json_value(state, "clock.turnBrightAt")
-
-        _LOGGER.debug(f"new state:{self}")
-        self.publish_updates()
+        _LOGGER.debug("update local state: %s, %s", self.device_name, state)
+        changed = self._apply_state(state)
+
+        _LOGGER.debug("new state:%s", self)
+        self.publish_updates(changed)
 
     def __repr__(self):
         return {
@@ -162,8 +149,8 @@ class RestoreV5(ScheduledRoutineAlarmMixin, ShadowClientSubscriberMixin):
         return self.clock_daytime or 0
 
     def set_volume(self, percentage: int):
-        _LOGGER.debug(f"Setting volume: {percentage}")
-        self._update({"current": {"sound": {"v": convert_from_percentage(percentage)}}})
+        _LOGGER.debug("Setting volume: %s", percentage)
+        return self._update({"current": {"sound": {"v": convert_from_percentage(percentage)}}}, command="set_volume")
 
     def favorite_names(self, active_only: bool = True):
         names = []
@@ -179,9 +166,10 @@ class RestoreV5(ScheduledRoutineAlarmMixin, ShadowClientSubscriberMixin):
             daytime_brightness = self.clock_daytime or 0
         if nighttime_brightness is None:
             nighttime_brightness = self.clock_nighttime or 0
-        _LOGGER.debug(f"Setting clock on: daytime={daytime_brightness} nighttime={nighttime_brightness}")
-        self._update(
-            {"clock": {"flags": self.flags | RIOT_FLAGS_CLOCK_ON, "i": pack_dual_percentages(nighttime_brightness, daytime_brightness)}}
+        _LOGGER.debug("Setting clock on: daytime=%s nighttime=%s", daytime_brightness, nighttime_brightness)
+        return self._update(
+            {"clock": {"flags": self.flags | RIOT_FLAGS_CLOCK_ON, "i": pack_dual_percentages(nighttime_brightness, daytime_brightness)}},
+            command="set_clock",
         )
 
     def turn_clock_off(self):
@@ -193,26 +181,25 @@ class RestoreV5(ScheduledRoutineAlarmMixin, ShadowClientSubscriberMixin):
             clock["i"] = pack_dual_percentages(
                 self.clock_nighttime, self.clock_daytime
             )
-        self._update({"clock": clock})
+        return self._update({"clock": clock}, command="turn_clock_off")
 
     # favorite_name_id is expected to be a string of name-id since name alone isn't unique
     def set_favorite(self, favorite_name_id: str):
-        _LOGGER.debug(f"Setting favorite: {favorite_name_id}")
+        _LOGGER.debug("Setting favorite: %s", favorite_name_id)
         fav_id = int(favorite_name_id.rsplit("-", 1)[1])
-        self._update({"current": {"srId": fav_id, "step": 1, "playing": "routine"}})
+        return self._update({"current": {"srId": fav_id, "step": 1, "playing": "routine"}}, command="set_favorite")
 
     def set_sound(self, sound_or_id_or_title: SoundContent | SimpleSoundContent | str | int | None, duration: int = 0, until="indefinite"):
         """
         Set a sound by passing SoundContent item from self.sounds, id, or title.
         """
         if sound_or_id_or_title is None or sound_or_id_or_title == NO_SOUND_ID or sound_or_id_or_title == "none":
-            self.turn_off()
-            return
+            return self.turn_off()
 
         if isinstance(sound_or_id_or_title, int):
-            sound = self.sounds_by_id.get(sound_or_id_or_title)
+            sound = self.sounds.by_id.get(sound_or_id_or_title)
         elif isinstance(sound_or_id_or_title, str):
-            sound = self.sounds_by_name.get(sound_or_id_or_title)
+            sound = self.sounds.by_title.get(sound_or_id_or_title)
         else:
             # Assume it's a SoundContent or SimpleSoundContent object
             sound = sound_or_id_or_title
@@ -221,8 +208,8 @@ class RestoreV5(ScheduledRoutineAlarmMixin, ShadowClientSubscriberMixin):
             _LOGGER.error(f"Sound not found: {sound_or_id_or_title}")
             return
 
-        _LOGGER.debug(f"Setting sound: {sound.get('title') or sound['id']}")
-        self._update(
+        _LOGGER.debug("Setting sound: %s", sound.get('title') or sound['id'])
+        return self._update(
             {
                 "current": {
                     "playing": "remote",
@@ -234,18 +221,19 @@ class RestoreV5(ScheduledRoutineAlarmMixin, ShadowClientSubscriberMixin):
                         "until": until,
                     },
                 }
-            }
+            },
+            command="set_sound",
         )
 
     def turn_off(self):
         _LOGGER.debug("Turning off sound")
-        self._update({"current": {"srId": 0, "step": 0, "playing": "none"}})
+        return self._update({"current": {"srId": 0, "step": 0, "playing": "none"}}, command="turn_off")
 
     def turn_light_off(self):
         _LOGGER.debug("Turning light off")
         # if favorite is playing then light can be turned off without turning off sound
         if self.current_playing == "routine":
-            self._update(
+            return self._update(
                 {
                     "current": {
                         "color": {
@@ -256,10 +244,11 @@ class RestoreV5(ScheduledRoutineAlarmMixin, ShadowClientSubscriberMixin):
                             "w": 0,
                         }
                     }
-                }
+                },
+                command="turn_light_off",
             )
         if self.current_playing == "remote":
-            self._update(
+            return self._update(
                 {
                     "current": {
                         "playing": "none",
@@ -271,7 +260,8 @@ class RestoreV5(ScheduledRoutineAlarmMixin, ShadowClientSubscriberMixin):
                             "w": 0,
                         },
                     }
-                }
+                },
+                command="turn_light_off",
             )
 
     def set_color(
@@ -279,11 +269,16 @@ class RestoreV5(ScheduledRoutineAlarmMixin, ShadowClientSubscriberMixin):
     ):
         new_color_id = CUSTOM_COLOR_ID
         _LOGGER.debug(
-            f"red: {red} green: {green} blue: {blue} brightness: {brightness} white: {white}"
+            "red: %s green: %s blue: %s brightness: %s white: %s",
+            red,
+            green,
+            blue,
+            brightness,
+            white,
         )
         # If there is no sound playing, and you want to turn on the light the playing value has to be set to remote
         if self.current_playing == "none":
-            self._update(
+            return self._update(
                 {
                     "current": {
                         "srId": 0,
@@ -298,10 +293,11 @@ class RestoreV5(ScheduledRoutineAlarmMixin, ShadowClientSubscriberMixin):
                             "w": convert_from_hex(white),
                         },
                     }
-                }
+                },
+                command="set_color",
             )
         else:
-            self._update(
+            return self._update(
                 {
                     "current": {
                         "color": {
@@ -313,7 +309,8 @@ class RestoreV5(ScheduledRoutineAlarmMixin, ShadowClientSubscriberMixin):
                             "w": convert_from_hex(white),
                         }
                     }
-                }
+                },
+                command="set_color",
             )
 
 def unpack_dual_percentages(packed_value: int) -> tuple[int, int]:
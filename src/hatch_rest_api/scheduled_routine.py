@@ -367,6 +367,10 @@ class ScheduledRoutineAlarmMixin:
         self.alarms_loaded = alarms is not None
         self.alarms = list(alarms or [])
 
+    def set_alarm_auth_token(self, auth_token: str) -> None:
+        """Replaces the Hatch auth token alarm calls use, e.g. after a new login."""
+        self._alarm_auth_token = auth_token
+
     def alarm_by_id(self, alarm_id: int | str) -> ScheduledRoutineAlarm | None:
         alarm_id_string = str(alarm_id)
         return next(
@@ -386,7 +390,7 @@ class ScheduledRoutineAlarmMixin:
             types=[ALARM_ROUTINE_TYPE],
         )
         self.alarms_loaded = True
-        self.publish_updates()
+        self.publish_updates({"alarms"})
         return self.alarms
 
     async def set_alarm_enabled(self, alarm_id: int | str, enabled: bool) -> None:
@@ -410,7 +414,7 @@ class ScheduledRoutineAlarmMixin:
             self._replace_alarms(
                 [{**alarm, **alarm_update_payload(alarm, enabled)}]
             )
-        self.publish_updates()
+        self.publish_updates({"alarms"})
 
     async def set_alarm_wake_time(self, alarm_id: int | str, wake_time: time) -> None:
         alarm = self.alarm_by_id(alarm_id)
@@ -433,7 +437,7 @@ class ScheduledRoutineAlarmMixin:
             self._replace_alarms(
                 [{**alarm, **alarm_wake_time_update_payload(alarm, wake_time)}]
             )
-        self.publish_updates()
+        self.publish_updates({"alarms"})
 
     async def set_alarm_weekdays(
         self,
@@ -463,7 +467,7 @@ class ScheduledRoutineAlarmMixin:
             self._replace_alarms(
                 [{**alarm, **alarm_weekdays_update_payload(alarm, weekdays_list)}]
             )
-        self.publish_updates()
+        self.publish_updates({"alarms"})
 
     def _configured_alarm_api(self) -> tuple["Hatch", str]:
         if self._alarm_api is None or self._alarm_auth_token is None:
@@ -1,28 +1,230 @@
+import asyncio
+import heapq
+import itertools
+import inspect
 import logging
+import threading
+import time
+from collections.abc import Callable, Sequence
+from concurrent.futures import Future, InvalidStateError
+from typing import Any
 
 from awscrt import mqtt
 from awsiot import iotshadow
 from awsiot.iotshadow import (
     IotShadowClient,
     GetShadowResponse,
+    ShadowDeltaUpdatedEvent,
     UpdateShadowResponse,
     UpdateShadowRequest,
     ShadowState,
 )
 
 from .types import SoundContent, SimpleSoundContent
+from .util import (
+    StateExtractor,
+    StateSlot,
+    diff_state,
+    flatten_state,
+    merge_desired_state,
+    safely_get_json_value,
+    state_record_type,
+)
 
 from .callbacks import CallbacksMixin
+from .metrics import (
+    COMMAND_CONVERGENCE_SECONDS,
+    COMMAND_PUBLISH_SECONDS,
+    COMMAND_TIMEOUTS,
+    MetricsSink,
+)
+from .shadow_fleet import ShadowFleetDispatcher
+from .shadow_recorder import ShadowRecorder
+from .sound_catalog import EMPTY_SOUND_CATALOG, SoundCatalog, as_sound_catalog
 
 _LOGGER = logging.getLogger(__name__)
 
 # Seconds to wait for MQTT operations before giving up. Prevents thread pool
 # workers from blocking indefinitely when the connection is down.
 MQTT_TIMEOUT = 10
+# Seconds a setter's returned future waits for the device to report the
+# desired state before failing with TimeoutError.
+CONVERGENCE_TIMEOUT = 30
+# Attributes filled from REST metadata instead of the shadow, published by name
+# like state attributes.
+METADATA_FIELDS = ("favorites", "sounds", "alarms")
+
+_MISSING = object()
+
+
+async def await_mqtt_future(future: Future, timeout: float = MQTT_TIMEOUT):
+    """
+    Awaits an awscrt future on the running loop. The future completes on the
+    awscrt event-loop thread, so no executor thread is held while waiting. A
+    timeout leaves the awscrt future alone, it is still completed later and may
+    be shared with other waiters.
+    """
+    return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+
+
+def check_subscribed(result: dict | mqtt.QoS | None):
+    """
+    Raises SubscribeError when a subscribe future's result, the connection's
+    SUBACK dict or the QoS granted to a shadow client subscription, shows the
+    broker rejected the topic (failure code 0x80, reported as a qos of None).
+    """
+    topic = None
+    if isinstance(result, dict):
+        result, topic = result.get("qos"), result.get("topic")
+    if result is None:
+        raise mqtt.SubscribeError(topic)
+
+
+class _ConvergenceDeadlines:
+    """
+    One daemon thread expiring every ConvergenceFuture that reaches its deadline,
+    instead of a timer thread per command.
+    """
+
+    def __init__(self):
+        self._heap: list[tuple[float, int, ConvergenceFuture]] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def schedule(self, future: "ConvergenceFuture", deadline: float):
+        with self._condition:
+            heapq.heappush(self._heap, (deadline, next(self._sequence), future))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="hatch-convergence-deadlines", daemon=True
+                )
+                self._thread.start()
+            elif self._heap[0][2] is future:
+                self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._heap:
+                    self._condition.wait()
+                deadline, _, future = self._heap[0]
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+            future._expire_at(deadline)
+
+
+class ConvergenceFuture(Future):
+    """
+    Returned by setters when the device tracks convergence. Resolves with the
+    shadow document version once the device reports every desired leaf of the
+    command, or fails with TimeoutError. Await it on a loop or call result() from
+    a thread; ignoring it is fine too.
+    """
+
+    def __init__(self, expected: dict[str, Any], min_version: int):
+        super().__init__()
+        # desired leaves still to be reported, keyed by dotted path
+        self.expected = expected
+        # only reports newer than the document at publish time count
+        self.min_version = min_version
+        # monotonic time the future fails at, None once it no longer times out
+        self._deadline: float | None = None
+
+    def __await__(self):
+        return asyncio.wrap_future(self).__await__()
+
+    def start_timeout(self, timeout: float):
+        self._deadline = time.monotonic() + timeout
+        _DEADLINES.schedule(self, self._deadline)
+
+    def cancel_timeout(self):
+        self._deadline = None
+
+    def settle(self, version: int | None = None, error: BaseException | None = None):
+        """Thread safe set_result/set_exception that ignores an already settled future."""
+        try:
+            if error is not None:
+                self.set_exception(error)
+            else:
+                self.set_result(version)
+        except InvalidStateError:
+            pass
+
+    def follow(self, other: Future):
+        """Settles the same way as other, a newer command for the same leaves."""
+        # the newer command's own deadline applies from now on
+        self.cancel_timeout()
+
+        def settle_like(_):
+            if other.cancelled():
+                self.cancel()
+            else:
+                self.settle(other.result() if other.exception() is None else None, other.exception())
+
+        other.add_done_callback(settle_like)
+
+    def fail_on_error(self, publish_future: Future):
+        if publish_future.exception() is not None:
+            self.settle(error=publish_future.exception())
+
+    def _expire_at(self, deadline: float):
+        if self._deadline == deadline:
+            self.settle(error=TimeoutError(f"device did not report {self.expected}"))
+
+
+_DEADLINES = _ConvergenceDeadlines()
 
 
 class ShadowClientSubscriberMixin(CallbacksMixin):
     document_version: int = -1
+    # Seconds to collect desired state changes before publishing them as one
+    # shadow update, None publishes every change immediately.
+    coalesce_window: float | None = None
+    # Whether setters return a ConvergenceFuture that resolves once the device
+    # reports the desired state. Off by default, setters then return None.
+    track_convergence: bool = False
+    # Declarative mapping of reported shadow paths to attributes, see _apply_state.
+    state_fields: StateExtractor = StateExtractor(())
+    # Attributes _update_local_state derives from state_fields values, stored on
+    # the state record alongside them.
+    derived_state_attributes: tuple[str, ...] = ()
+    # Slotted type holding one device's state attributes, built per subclass.
+    state_record: type = state_record_type("State", ())
+    # Optional structured event sink, called as event_emitter(event, data). Set it
+    # on the class to observe every device or on one instance. Nothing is built
+    # for it while it is None.
+    event_emitter: Callable[[str, dict], None] | None = None
+    # When set, shadow messages arrive through the fleet's wildcard subscriptions
+    # instead of two subscriptions per device.
+    shadow_fleet: ShadowFleetDispatcher | None = None
+    # Optional recorder of every accepted and delta message, for replay.
+    shadow_recorder: ShadowRecorder | None = None
+    # Optional sink for per device and per command publish and convergence
+    # latency. Set it on the class or on one instance, like event_emitter.
+    metrics_sink: MetricsSink | None = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # The class level defaults become StateSlots so a fleet of devices keeps
+        # its state in compact records instead of one dict entry per attribute.
+        attributes = tuple(
+            dict.fromkeys((*cls.state_fields.attributes(), *cls.derived_state_attributes))
+        )
+        for attribute in attributes:
+            default = inspect.getattr_static(cls, attribute, None)
+            if isinstance(default, StateSlot):
+                default = default.default
+            elif isinstance(default, property):
+                raise TypeError(f"{cls.__name__}.{attribute} is a property, not state")
+            setattr(cls, attribute, StateSlot(attribute, default))
+        cls.state_record = state_record_type(f"{cls.__name__}State", attributes)
+        cls.callback_fields = frozenset(
+            (*attributes, *METADATA_FIELDS, *cls.property_fields)
+        )
 
     def __init__(
         self,
@@ -31,21 +233,116 @@ class ShadowClientSubscriberMixin(CallbacksMixin):
         mac: str,
         shadow_client: IotShadowClient,
         favorites: list | None = None,
-        sounds: list[SoundContent | SimpleSoundContent] | None = None,
+        sounds: Sequence[SoundContent | SimpleSoundContent] | None = None,
+        subscribe: bool = True,
+        coalesce_window: float | None = None,
+        track_convergence: bool | None = None,
     ):
+        """
+        With subscribe=False the device is created without touching MQTT and
+        async_subscribe() must be awaited before it receives shadow updates.
+        """
+        self._state = self.state_record()
+        self._pending_desired_lock = threading.Lock()
+        self._pending_desired: dict | None = None
+        # one future per coalesced caller, so cancelling one wait leaves the others
+        self._pending_published: list[Future] = []
+        # last full reported document, so a shadow get only applies what changed
+        self._reported: dict = {}
+        # desired values the device has not reported yet, keyed by dotted path
+        self.pending_changes: dict[str, Any] = {}
+        self._convergence_lock = threading.Lock()
+        self._convergences: list[ConvergenceFuture] = []
+        # topics _subscribe subscribed to outside a shadow fleet
+        self._subscribed_topics: list[str] = []
+        if coalesce_window is not None:
+            self.coalesce_window = coalesce_window
+        if track_convergence is not None:
+            self.track_convergence = track_convergence
         if favorites is None:
             favorites = []
         if sounds is None:
-            sounds = list[SoundContent | SimpleSoundContent]()
+            sounds = EMPTY_SOUND_CATALOG
         self.device_name = device_name
         self.thing_name = thing_name
         self.mac = mac
         self.shadow_client = shadow_client
         self.favorites = favorites
-        self.sounds = sounds
-        self.sounds_by_id = {s['id']: s for s in sounds if s.get('id')}
-        self.sounds_by_name = {s['title']: s for s in sounds if s.get('title')}
-        _LOGGER.debug(f"creating {self.__class__.__name__}: {device_name}")
+        self.set_sounds(sounds)
+        _LOGGER.debug("creating %s: %s", self.__class__.__name__, device_name)
+        if subscribe:
+            try:
+                self._subscribe_and_wait()
+            except mqtt.SubscribeError:
+                if self.shadow_fleet is None:
+                    raise
+                self._leave_shadow_fleet()
+                self._subscribe_and_wait()
+            self.refresh()
+
+    def set_sounds(self, sounds: Sequence[SoundContent | SimpleSoundContent]):
+        self.sounds: SoundCatalog = as_sound_catalog(sounds)
+
+    @property
+    def sounds_by_id(self) -> dict[int, SoundContent | SimpleSoundContent]:
+        return self.sounds.by_id
+
+    @property
+    def sounds_by_name(self) -> dict[str, SoundContent | SimpleSoundContent]:
+        return self.sounds.by_title
+
+    async def async_subscribe(self, refresh: bool = True):
+        """
+        Subscribes to the shadow topics and, unless refresh is False, gets the
+        shadow. Raises SubscribeError when the broker rejects a topic; when it
+        rejects the shadow fleet's wildcards the device leaves the fleet and
+        subscribes to its own topics instead.
+        """
+        try:
+            await self._async_subscribe_and_wait()
+        except mqtt.SubscribeError:
+            if self.shadow_fleet is None:
+                raise
+            self._leave_shadow_fleet()
+            await self._async_subscribe_and_wait()
+        if refresh:
+            await self.async_refresh()
+
+    async def async_unsubscribe(self):
+        """
+        Stops the device receiving shadow messages: leaves the shadow fleet, or
+        unsubscribes from the device's own topics.
+        """
+        if self.shadow_fleet is not None:
+            self.shadow_fleet.unregister(self)
+            return
+        topics, self._subscribed_topics = self._subscribed_topics, []
+        await asyncio.gather(
+            *(await_mqtt_future(self.shadow_client.unsubscribe(topic)) for topic in topics)
+        )
+
+    def _subscribe_and_wait(self):
+        for subscribed_future in self._subscribe():
+            check_subscribed(subscribed_future.result(timeout=MQTT_TIMEOUT))
+
+    async def _async_subscribe_and_wait(self):
+        results = await asyncio.gather(
+            *(await_mqtt_future(future) for future in self._subscribe())
+        )
+        for result in results:
+            check_subscribed(result)
+
+    def _leave_shadow_fleet(self):
+        _LOGGER.warning(
+            "%s fleet subscriptions were rejected, subscribing to its own shadow topics",
+            self.device_name,
+        )
+        self.shadow_fleet.unregister(self)
+        self.shadow_fleet = None
+
+    def _subscribe(self) -> list[Future]:
+        if self.shadow_fleet is not None:
+            return self.shadow_fleet.register(self)
 
         def update_shadow_accepted(response: UpdateShadowResponse):
             self._on_update_shadow_accepted(response)
@@ -53,16 +350,16 @@ class ShadowClientSubscriberMixin(CallbacksMixin):
         (
             update_accepted_subscribed_future,
             unsubscribe_topic_to_update_shadow_accepted,
-        ) = shadow_client.subscribe_to_update_shadow_accepted(
+        ) = self.shadow_client.subscribe_to_update_shadow_accepted(
             request=iotshadow.UpdateShadowSubscriptionRequest(
                 thing_name=self.thing_name
             ),
             qos=mqtt.QoS.AT_LEAST_ONCE,
             callback=update_shadow_accepted,
         )
-        update_accepted_subscribed_future.result(timeout=MQTT_TIMEOUT)
         _LOGGER.debug(
-            f"unsubscribe_topic_to_update_shadow_accepted: {unsubscribe_topic_to_update_shadow_accepted}"
+            "unsubscribe_topic_to_update_shadow_accepted: %s",
+            unsubscribe_topic_to_update_shadow_accepted,
         )
 
         def on_get_shadow_accepted(response: GetShadowResponse):
@@ -71,58 +368,333 @@ class ShadowClientSubscriberMixin(CallbacksMixin):
         (
             get_accepted_subscribed_future,
             unsubscribe_topic_to_get_shadow_accepted,
-        ) = shadow_client.subscribe_to_get_shadow_accepted(
+        ) = self.shadow_client.subscribe_to_get_shadow_accepted(
             request=iotshadow.GetShadowSubscriptionRequest(thing_name=self.thing_name),
             qos=mqtt.QoS.AT_LEAST_ONCE,
             callback=on_get_shadow_accepted,
         )
-        get_accepted_subscribed_future.result(timeout=MQTT_TIMEOUT)
         _LOGGER.debug(
-            f"unsubscribe_topic_to_update_shadow_accepted: {unsubscribe_topic_to_get_shadow_accepted}"
+            "unsubscribe_topic_to_get_shadow_accepted: %s",
+            unsubscribe_topic_to_get_shadow_accepted,
         )
-        self.refresh()
+
+        def on_shadow_delta_updated(event: ShadowDeltaUpdatedEvent):
+            self._on_shadow_delta_updated(event)
+
+        (
+            delta_updated_subscribed_future,
+            unsubscribe_topic_to_shadow_delta_updated,
+        ) = self.shadow_client.subscribe_to_shadow_delta_updated_events(
+            request=iotshadow.ShadowDeltaUpdatedSubscriptionRequest(
+                thing_name=self.thing_name
+            ),
+            qos=mqtt.QoS.AT_LEAST_ONCE,
+            callback=on_shadow_delta_updated,
+        )
+        _LOGGER.debug(
+            "unsubscribe_topic_to_shadow_delta_updated: %s",
+            unsubscribe_topic_to_shadow_delta_updated,
+        )
+        self._subscribed_topics = [
+            unsubscribe_topic_to_update_shadow_accepted,
+            unsubscribe_topic_to_get_shadow_accepted,
+            unsubscribe_topic_to_shadow_delta_updated,
+        ]
+        return [
+            update_accepted_subscribed_future,
+            get_accepted_subscribed_future,
+            delta_updated_subscribed_future,
+        ]
 
     def _on_update_shadow_accepted(self, response: UpdateShadowResponse):
-        _LOGGER.debug(f"update {self.device_name}, RESPONSE: {response}")
+        _LOGGER.debug("update %s, RESPONSE: %s", self.device_name, response)
+        if self.shadow_recorder is not None:
+            self.shadow_recorder.record(self.thing_name, "update/accepted", response)
         if response.version < self.document_version:
-            _LOGGER.debug(f'ignoring update {self.device_name}, response version: {response.version} < document version: {self.document_version}')
+            _LOGGER.debug("ignoring update %s, response version: %s < document version: %s", self.device_name, response.version, self.document_version)
             return
+        if self.event_emitter is not None:
+            self._emit_event("shadow.update.accepted", version=response.version)
         if response.state:
             if response.state.reported:
-                _LOGGER.debug(f'updating {self.device_name} local state: {response.state.reported}')
+                _LOGGER.debug("updating %s local state: %s", self.device_name, response.state.reported)
                 self.document_version = response.version
+                # update/accepted only carries the fields that were reported
+                merge_desired_state(self._reported, response.state.reported)
+                self._resolve_pending_changes(response.state.reported)
                 self._update_local_state(response.state.reported)
+                self._check_convergence(response.version)
 
     def _on_get_shadow_accepted(self, response: GetShadowResponse):
-        _LOGGER.debug(f"get {self.device_name}, RESPONSE: {response}")
+        _LOGGER.debug("get %s, RESPONSE: %s", self.device_name, response)
+        if self.shadow_recorder is not None:
+            self.shadow_recorder.record(self.thing_name, "get/accepted", response)
         if response.version < self.document_version:
             return
+        if self.event_emitter is not None:
+            self._emit_event("shadow.get.accepted", version=response.version)
         if response.state:
-            if response.state.delta:
-                pass
-
+            # a get carries the complete divergence, replace rather than merge
+            self.pending_changes = flatten_state(response.state.delta or {})
             if response.state.reported:
                 self.document_version = response.version
-                self._update_local_state(response.state.reported)
+                changed = diff_state(self._reported, response.state.reported)
+                self._reported = response.state.reported
+                if changed:
+                    self._update_local_state(changed)
+                self._check_convergence(response.version)
+
+    def _on_shadow_delta_updated(self, event: ShadowDeltaUpdatedEvent):
+        _LOGGER.debug("delta %s, EVENT: %s", self.device_name, event)
+        if self.shadow_recorder is not None:
+            self.shadow_recorder.record(self.thing_name, "update/delta", event)
+        if event.version is not None and event.version < self.document_version:
+            return
+        if event.state:
+            self.pending_changes.update(flatten_state(event.state))
+            if self.event_emitter is not None:
+                self._emit_event("shadow.delta", pending_changes=dict(self.pending_changes))
+
+    def _resolve_pending_changes(self, reported: dict):
+        if not self.pending_changes:
+            return
+        for path, value in flatten_state(reported).items():
+            if path in self.pending_changes and self.pending_changes[path] == value:
+                del self.pending_changes[path]
+
+    def _apply_state(self, state) -> dict:
+        """
+        Copies every state_fields value present in state onto the device and
+        returns the ones that differ from what the device already had.
+        """
+        changed = {}
+        for attribute, value in self.state_fields.extract(state).items():
+            self._set_state_attribute(changed, attribute, value)
+        if self.event_emitter is not None and changed:
+            self._emit_event("state.applied", values=changed)
+        return changed
 
-    def _update(self, desired_state):
-        _LOGGER.debug(f"updating: {desired_state}")
+    def _set_state_attribute(self, changed: dict, attribute: str, value):
+        if getattr(self, attribute, _MISSING) != value:
+            setattr(self, attribute, value)
+            changed[attribute] = value
+
+    def _emit_event(self, event: str, **data):
+        try:
+            self.event_emitter(
+                event,
+                {"device_name": self.device_name, "thing_name": self.thing_name, **data},
+            )
+        except Exception:
+            _LOGGER.exception("event emitter failed for %s", event)
+
+    def _publish_update(self, desired_state) -> Future:
+        _LOGGER.debug("updating: %s", desired_state)
+        if self.event_emitter is not None:
+            self._emit_event("shadow.update.published", desired=desired_state)
         request: UpdateShadowRequest = UpdateShadowRequest(
             thing_name=self.thing_name,
             state=ShadowState(
                 desired=desired_state,
             ),
         )
-        self.shadow_client.publish_update_shadow(
+        return self.shadow_client.publish_update_shadow(
             request, mqtt.QoS.AT_LEAST_ONCE
-        ).result(timeout=MQTT_TIMEOUT)
+        )
 
-    def refresh(self):
+    def _publish_get(self) -> Future:
         _LOGGER.debug("Requesting current shadow state...")
-        result = self.shadow_client.publish_get_shadow(
+        return self.shadow_client.publish_get_shadow(
             request=iotshadow.GetShadowRequest(
                 thing_name=self.thing_name, client_token=None
             ),
             qos=mqtt.QoS.AT_LEAST_ONCE,
-        ).result(timeout=MQTT_TIMEOUT)
-        _LOGGER.debug(f"result: {result}")
+        )
+
+    def _update(self, desired_state, command: str = "update") -> ConvergenceFuture | None:
+        converged = self._expect_convergence(desired_state) if self.track_convergence else None
+        on_published = None
+        if self.metrics_sink is not None:
+            on_published = self._measure_command(command, converged)
+        if self.coalesce_window:
+            # the setter returns straight away, the merged update goes out when
+            # the window closes
+            published = self._coalesce_update(desired_state)
+            if converged is not None:
+                published.add_done_callback(converged.fail_on_error)
+            if on_published is not None:
+                published.add_done_callback(on_published)
+            return converged
+        try:
+            published = self._publish_update(desired_state)
+            if on_published is not None:
+                published.add_done_callback(on_published)
+            published.result(timeout=MQTT_TIMEOUT)
+        except Exception as error:
+            if converged is not None:
+                converged.settle(error=error)
+            elif isinstance(error, TimeoutError) and self.metrics_sink is not None:
+                # without convergence tracking nothing else sees the timeout
+                self._count_command_timeout(command)
+            raise
+        return converged
+
+    async def async_update(self, desired_state, command: str = "async_update") -> ConvergenceFuture | None:
+        converged = self._expect_convergence(desired_state) if self.track_convergence else None
+        on_published = None
+        if self.metrics_sink is not None:
+            on_published = self._measure_command(command, converged)
+        try:
+            if self.coalesce_window:
+                published = self._coalesce_update(desired_state)
+                timeout = self.coalesce_window + MQTT_TIMEOUT
+            else:
+                published = self._publish_update(desired_state)
+                timeout = MQTT_TIMEOUT
+            if on_published is not None:
+                published.add_done_callback(on_published)
+            await await_mqtt_future(published, timeout=timeout)
+        except Exception as error:
+            if converged is not None:
+                converged.settle(error=error)
+            elif isinstance(error, TimeoutError) and self.metrics_sink is not None:
+                # without convergence tracking nothing else sees the timeout
+                self._count_command_timeout(command)
+            raise
+        return converged
+
+    def _count_command_timeout(self, command: str):
+        self.metrics_sink.increment(
+            COMMAND_TIMEOUTS, {"thing_name": self.thing_name, "command": command}
+        )
+
+    def _measure_command(self, command: str, converged: ConvergenceFuture | None) -> Callable[[Future], None]:
+        """
+        Reports the convergence time or timeout of converged, when tracked, to
+        metrics_sink and returns the done callback that reports the publish time
+        of its update.
+        """
+        sink = self.metrics_sink
+        labels = {"thing_name": self.thing_name, "command": command}
+        started = time.perf_counter()
+
+        def on_published(published: Future):
+            if not published.cancelled() and published.exception() is None:
+                sink.observe(COMMAND_PUBLISH_SECONDS, time.perf_counter() - started, labels)
+
+        def on_converged(_):
+            if converged.cancelled():
+                return
+            error = converged.exception()
+            if error is None:
+                sink.observe(COMMAND_CONVERGENCE_SECONDS, time.perf_counter() - started, labels)
+            elif isinstance(error, TimeoutError):
+                sink.increment(COMMAND_TIMEOUTS, labels)
+
+        if converged is not None:
+            converged.add_done_callback(on_converged)
+        return on_published
+
+    def _expect_convergence(self, desired_state) -> ConvergenceFuture:
+        converged = ConvergenceFuture(flatten_state(desired_state), self.document_version)
+        with self._convergence_lock:
+            pending = []
+            for earlier in self._convergences:
+                if earlier.done():
+                    continue
+                # a newer command owns the leaves it overwrites
+                for path in earlier.expected.keys() & converged.expected.keys():
+                    del earlier.expected[path]
+                if earlier.expected:
+                    pending.append(earlier)
+                else:
+                    earlier.follow(converged)
+            self._convergences = pending
+            if self._reports(converged.expected):
+                converged.settle(self.document_version)
+            else:
+                self._convergences.append(converged)
+                converged.start_timeout(CONVERGENCE_TIMEOUT)
+        return converged
+
+    def _check_convergence(self, version: int):
+        if not self._convergences:
+            return
+        with self._convergence_lock:
+            pending = []
+            for converged in self._convergences:
+                if converged.done():
+                    continue
+                if version > converged.min_version and self._reports(converged.expected):
+                    converged.settle(version)
+                else:
+                    pending.append(converged)
+            self._convergences = pending
+
+    def _reports(self, expected: dict[str, Any]) -> bool:
+        return all(
+            safely_get_json_value(self._reported, path) == value
+            for path, value in expected.items()
+        )
+
+    def _coalesce_update(self, desired_state) -> Future:
+        with self._pending_desired_lock:
+            if self._pending_desired is None:
+                self._pending_desired = {}
+                timer = threading.Timer(
+                    self.coalesce_window, self.flush_pending_update
+                )
+                timer.daemon = True
+                timer.start()
+            merge_desired_state(self._pending_desired, desired_state)
+            published = Future()
+            self._pending_published.append(published)
+            return published
+
+    def flush_pending_update(self):
+        """Publishes any coalesced desired state now instead of waiting for the window."""
+        with self._pending_desired_lock:
+            desired_state = self._pending_desired
+            waiters = self._pending_published
+            self._pending_desired = None
+            self._pending_published = []
+        if desired_state is None:
+            return
+
+        def settle(result=None, error: BaseException | None = None):
+            for published in waiters:
+                # a caller may have cancelled its own wait in the meantime
+                if published.done():
+                    continue
+                try:
+                    if error is not None:
+                        published.set_exception(error)
+                    else:
+                        published.set_result(result)
+                except InvalidStateError:
+                    pass
+
+        def on_published(publish_future: Future):
+            if publish_future.exception() is not None:
+                _LOGGER.warning(
+                    "coalesced update for %s failed: %s",
+                    self.device_name,
+                    publish_future.exception(),
+                )
+                settle(error=publish_future.exception())
+            else:
+                settle(publish_future.result())
+
+        try:
+            self._publish_update(desired_state).add_done_callback(on_published)
+        except Exception as error:
+            _LOGGER.warning("coalesced update for %s failed: %s", self.device_name, error)
+            settle(error=error)
+
+    def refresh(self):
+        result = self._publish_get().result(timeout=MQTT_TIMEOUT)
+        _LOGGER.debug("result: %s", result)
+
+    async def async_refresh(self):
+        result = await await_mqtt_future(self._publish_get())
+        _LOGGER.debug("result: %s", result)
@@ -0,0 +1,90 @@
+import json
+import logging
+import threading
+from concurrent.futures import Future
+from typing import TYPE_CHECKING
+
+from awscrt import mqtt
+from awsiot.iotshadow import (
+    GetShadowResponse,
+    ShadowDeltaUpdatedEvent,
+    UpdateShadowResponse,
+)
+
+if TYPE_CHECKING:
+    from .shadow_client_subscriber import ShadowClientSubscriberMixin
+
+_LOGGER = logging.getLogger(__name__)
+
+# topic suffix -> (response type, device handler name)
+_FLEET_HANDLERS = {
+    "update/accepted": (UpdateShadowResponse, "_on_update_shadow_accepted"),
+    "get/accepted": (GetShadowResponse, "_on_get_shadow_accepted"),
+    "update/delta": (ShadowDeltaUpdatedEvent, "_on_shadow_delta_updated"),
+}
+FLEET_TOPICS = tuple(f"$aws/things/+/shadow/{suffix}" for suffix in _FLEET_HANDLERS)
+
+
+class ShadowFleetDispatcher:
+    """
+    Holds one wildcard subscription per shadow topic for every thing on the
+    connection and routes each message to its device by thing name, instead of
+    two subscriptions per device.
+
+    Brokers whose policy does not allow the wildcards answer with a failed
+    SUBACK; subscribing then fails with SubscribeError, and each
+    device's async_subscribe falls back to subscribing to its own topics.
+    """
+
+    def __init__(self, mqtt_connection: mqtt.Connection):
+        self.mqtt_connection = mqtt_connection
+        self._devices: dict[str, ShadowClientSubscriberMixin] = {}
+        self._subscribed: list[Future] | None = None
+        self._lock = threading.Lock()
+
+    def register(self, device: "ShadowClientSubscriberMixin") -> list[Future]:
+        """Routes device's messages and returns the shared subscription futures."""
+        self._devices[device.thing_name] = device
+        return self.subscribe()
+
+    def unregister(self, device: "ShadowClientSubscriberMixin"):
+        if self._devices.get(device.thing_name) is device:
+            del self._devices[device.thing_name]
+
+    def subscribe(self) -> list[Future]:
+        with self._lock:
+            if self._subscribed is None:
+                self._subscribed = []
+                for topic in FLEET_TOPICS:
+                    subscribed_future, _ = self.mqtt_connection.subscribe(
+                        topic=topic,
+                        qos=mqtt.QoS.AT_LEAST_ONCE,
+                        callback=self._on_message,
+                    )
+                    _LOGGER.debug("subscribing to fleet topic: %s", topic)
+                    self._subscribed.append(subscribed_future)
+            return list(self._subscribed)
+
+    def resubscribe(self):
+        """
+        Forgets the wildcard subscriptions after the broker dropped the session,
+        the next register or subscribe sends them again.
+        """
+        with self._lock:
+            self._subscribed = None
+
+    def _on_message(self, topic: str, payload: bytes, dup=False, qos=None, retain=False, **kwargs):
+        # $aws/things/<thing name>/shadow/<operation>/<result>
+        parts = topic.split("/", 4)
+        if len(parts) != 5:
+            return
+        device = self._devices.get(parts[2])
+        handler = _FLEET_HANDLERS.get(parts[4])
+        if device is None or handler is None:
+            return
+        response_type, handler_name = handler
+        try:
+            response = response_type.from_payload(json.loads(payload))
+            getattr(device, handler_name)(response)
+        except Exception:
+            _LOGGER.exception("failed to handle %s", topic)
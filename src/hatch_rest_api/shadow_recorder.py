@@ -0,0 +1,176 @@
+import json
+import logging
+import threading
+import time
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from .shadow_fleet import _FLEET_HANDLERS
+
+if TYPE_CHECKING:
+    from .shadow_client_subscriber import ShadowClientSubscriberMixin
+
+_LOGGER = logging.getLogger(__name__)
+
+# Set while replay_shadow_traffic runs on a thread, so replayed messages are not
+# recorded again. Live messages keep arriving on the awscrt thread meanwhile.
+_replaying = threading.local()
+
+
+class ShadowRecord(NamedTuple):
+    """One received shadow message, a line of a recording."""
+    received_at: float
+    thing_name: str
+    # topic suffix, one of shadow_fleet.FLEET_TOPICS
+    kind: str
+    payload: dict[str, Any]
+
+
+def shadow_payload(response) -> dict[str, Any]:
+    """Rebuilds the JSON payload of a parsed shadow response, without metadata."""
+    payload: dict[str, Any] = {}
+    state = response.state
+    if isinstance(state, dict):
+        payload["state"] = state
+    elif state is not None:
+        payload["state"] = {
+            key: getattr(state, key)
+            for key in ("desired", "reported", "delta")
+            if getattr(state, key, None) is not None
+        }
+    if response.version is not None:
+        payload["version"] = response.version
+    if response.timestamp is not None:
+        payload["timestamp"] = response.timestamp.timestamp()
+    if response.client_token is not None:
+        payload["clientToken"] = response.client_token
+    return payload
+
+
+class ShadowRecorder:
+    """
+    Appends every shadow message devices receive to a line-delimited JSON file,
+    one ``[received_at, thing_name, kind, payload]`` array per line. Set it as
+    ShadowClientSubscriberMixin.shadow_recorder on the class to record every
+    device or on one instance; replay_shadow_traffic feeds the file back.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def record(self, thing_name: str, kind: str, response):
+        # called on the awscrt thread for every message, keep it cheap
+        if getattr(_replaying, "active", False):
+            return
+        line = json.dumps(
+            [round(time.time(), 6), thing_name, kind, shadow_payload(response)],
+            separators=(",", ":"),
+        )
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_recording(path: str | Path) -> Iterator[ShadowRecord]:
+    with Path(path).open(encoding="utf-8") as file:
+        for number, line in enumerate(file, start=1):
+            try:
+                yield ShadowRecord(*json.loads(line))
+            except (TypeError, ValueError):
+                _LOGGER.warning("Skipping malformed line %s of %s", number, path)
+
+
+def percentile(sorted_samples: list[float], fraction: float) -> float:
+    """Nearest rank percentile of already sorted samples."""
+    if not sorted_samples:
+        return 0.0
+    index = min(int(fraction * len(sorted_samples)), len(sorted_samples) - 1)
+    return sorted_samples[index]
+
+
+class LatencySummary(NamedTuple):
+    """Percentiles in seconds."""
+    count: int
+    p50: float
+    p90: float
+    p99: float
+    max: float
+
+    @classmethod
+    def of(cls, samples: list[float]) -> "LatencySummary":
+        ordered = sorted(samples)
+        return cls(
+            len(ordered),
+            percentile(ordered, 0.50),
+            percentile(ordered, 0.90),
+            percentile(ordered, 0.99),
+            ordered[-1] if ordered else 0.0,
+        )
+
+
+class ReplayReport(NamedTuple):
+    messages: int
+    # records for things none of the devices handle
+    skipped: int
+    elapsed: float
+    # payload to response object
+    parse: LatencySummary
+    # device handler, including _update_local_state and callback fan-out
+    dispatch: LatencySummary
+
+
+def replay_shadow_traffic(
+    path: str | Path,
+    devices: Mapping[str, "ShadowClientSubscriberMixin"],
+    speed: float | None = None,
+) -> ReplayReport:
+    """
+    Feeds a recording into devices, keyed by thing name, on the calling thread.
+    speed=None replays as fast as possible, 1.0 at the original pace and 2.0 at
+    twice that. Recorders attached to the devices skip the replayed messages.
+    """
+    parse_times = []
+    dispatch_times = []
+    skipped = 0
+    first_received_at = None
+    started = time.perf_counter()
+    _replaying.active = True
+    try:
+        for record in read_recording(path):
+            device = devices.get(record.thing_name)
+            handler = _FLEET_HANDLERS.get(record.kind)
+            if device is None or handler is None:
+                skipped += 1
+                continue
+            if speed is not None:
+                if first_received_at is None:
+                    first_received_at = record.received_at
+                due = (record.received_at - first_received_at) / speed
+                delay = due - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            response_type, handler_name = handler
+            parse_started = time.perf_counter()
+            response = response_type.from_payload(record.payload)
+            dispatch_started = time.perf_counter()
+            getattr(device, handler_name)(response)
+            dispatched = time.perf_counter()
+            parse_times.append(dispatch_started - parse_started)
+            dispatch_times.append(dispatched - dispatch_started)
+    finally:
+        _replaying.active = False
+    return ReplayReport(
+        messages=len(parse_times),
+        skipped=skipped,
+        elapsed=time.perf_counter() - started,
+        parse=LatencySummary.of(parse_times),
+        dispatch=LatencySummary.of(dispatch_times),
+    )
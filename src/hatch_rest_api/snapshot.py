@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+from .sound_catalog import (
+    EMPTY_SOUND_CATALOG,
+    UNAVAILABLE_SOUND_CATALOG,
+    SoundCatalog,
+    sound_catalog_key,
+)
+from .util import read_json_file, write_json_file
+
+_LOGGER = logging.getLogger(__name__)
+
+# Account metadata changes when the user edits favorites or alarms in the app,
+# an hour old snapshot is revalidated in the background after a restart.
+DEFAULT_SNAPSHOT_MAX_AGE = 60 * 60
+SNAPSHOT_FILE_VERSION = 1
+
+
+class BootstrapSnapshot(NamedTuple):
+    """Everything get_rest_devices fetches over REST before creating devices."""
+    iot_devices: list[dict]
+    # the per device sections are keyed by mac address
+    favorites: dict[str, list]
+    routines: dict[str, list]
+    alarms: dict[str, list | None]
+    sounds: dict[str, SoundCatalog]
+    fetched_at: float
+
+    def is_stale(self, max_age: float) -> bool:
+        return time.time() - self.fetched_at > max_age
+
+    def is_complete(self) -> bool:
+        """False when alarms or sounds fell back after a failed fetch."""
+        return all(alarms is not None for alarms in self.alarms.values()) and all(
+            sounds is not UNAVAILABLE_SOUND_CATALOG for sounds in self.sounds.values()
+        )
+
+    def macs(self) -> set[str]:
+        return {device["macAddress"] for device in self.iot_devices}
+
+    def changed_macs(self, other: "BootstrapSnapshot") -> set[str]:
+        """Macs present in both snapshots whose metadata differs."""
+        return {
+            mac
+            for mac in self.macs() & other.macs()
+            if any(
+                mine.get(mac) != theirs.get(mac)
+                for mine, theirs in (
+                    (self.favorites, other.favorites),
+                    (self.routines, other.routines),
+                    (self.alarms, other.alarms),
+                    (self.sounds, other.sounds),
+                )
+            )
+        }
+
+    def to_json(self) -> dict:
+        # devices of a product share one catalog, store it once per catalog key
+        catalogs = {}
+        for device in self.iot_devices:
+            key = sound_catalog_key(device["product"])
+            if key is not None and device["macAddress"] in self.sounds:
+                catalogs[key] = list(self.sounds[device["macAddress"]])
+        return {
+            "version": SNAPSHOT_FILE_VERSION,
+            "fetched_at": self.fetched_at,
+            "iot_devices": self.iot_devices,
+            "favorites": self.favorites,
+            "routines": self.routines,
+            "alarms": self.alarms,
+            "sound_catalogs": catalogs,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "BootstrapSnapshot":
+        catalogs = {
+            key: SoundCatalog(sounds) for key, sounds in data["sound_catalogs"].items()
+        }
+        return cls(
+            iot_devices=data["iot_devices"],
+            favorites=data["favorites"],
+            routines=data["routines"],
+            alarms=data["alarms"],
+            sounds={
+                device["macAddress"]: catalogs.get(
+                    sound_catalog_key(device["product"]), EMPTY_SOUND_CATALOG
+                )
+                for device in data["iot_devices"]
+            },
+            fetched_at=data["fetched_at"],
+        )
+
+
+class SnapshotStore:
+    """
+    Versioned on-disk copy of the last BootstrapSnapshot. A missing, corrupt or
+    older version file loads as None so the caller falls back to a full fetch.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+
+    async def load(self) -> BootstrapSnapshot | None:
+        loop = asyncio.get_running_loop()
+        try:
+            data = await loop.run_in_executor(None, read_json_file, self.path)
+        except (OSError, ValueError) as error:
+            _LOGGER.debug("No usable bootstrap snapshot at %s: %s", self.path, error)
+            return None
+        if data.get("version") != SNAPSHOT_FILE_VERSION:
+            _LOGGER.debug("Ignoring bootstrap snapshot with version %s", data.get("version"))
+            return None
+        try:
+            return BootstrapSnapshot.from_json(data)
+        except (KeyError, TypeError) as error:
+            _LOGGER.debug("Ignoring malformed bootstrap snapshot: %s", error)
+            return None
+
+    async def save(self, snapshot: BootstrapSnapshot):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, write_json_file, self.path, snapshot.to_json())
+        except OSError as error:
+            _LOGGER.warning("Could not save bootstrap snapshot to %s: %s", self.path, error)
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable, Iterable
+from pathlib import Path
+
+from aiohttp import ClientError
+
+from .types import SimpleSoundContent, SoundContent
+from .util import read_json_file, write_json_file
+
+_LOGGER = logging.getLogger(__name__)
+
+# Sound catalogs change with app content releases, not with device state, so a
+# day old catalog is still good enough to start devices with.
+DEFAULT_SOUND_CATALOG_TTL = 24 * 60 * 60
+SOUND_CATALOG_FILE_VERSION = 1
+
+
+class SoundCatalog(tuple[SoundContent | SimpleSoundContent, ...]):
+    """
+    Immutable sound list with its id, title and wav url indexes built once.
+    Devices of a product hold a reference to the same catalog, so lookups never
+    build a dict per device or per call.
+    """
+
+    def __new__(cls, sounds: Iterable[SoundContent | SimpleSoundContent] = ()):
+        catalog = super().__new__(cls, sounds)
+        catalog.by_id = {sound["id"]: sound for sound in catalog if sound.get("id")}
+        catalog.by_title = {
+            sound["title"]: sound for sound in catalog if sound.get("title")
+        }
+        catalog.wav_url_by_id = {
+            sound_id: sound["wavUrl"]
+            for sound_id, sound in catalog.by_id.items()
+            if sound.get("wavUrl")
+        }
+        return catalog
+
+
+def as_sound_catalog(sounds: Iterable[SoundContent | SimpleSoundContent]) -> SoundCatalog:
+    return sounds if isinstance(sounds, SoundCatalog) else SoundCatalog(sounds)
+
+
+EMPTY_SOUND_CATALOG = SoundCatalog()
+# Stands in for a catalog that could not be fetched. It is as empty as
+# EMPTY_SOUND_CATALOG but told apart by identity, so it is never persisted.
+UNAVAILABLE_SOUND_CATALOG = SoundCatalog()
+
+# Products whose sounds come from the same catalog share a single cache entry.
+SOUND_CATALOG_KEYS: dict[str, str] = {
+    "riot": "riot",
+    "riotPlus": "riot",
+    "restBaby": "riot",
+    "restoreV4": "restoreV4",
+    "restoreV5": "restoreV5",
+}
+
+
+def sound_catalog_key(product: str) -> str | None:
+    return SOUND_CATALOG_KEYS.get(product)
+
+
+class SoundCatalogCache:
+    """
+    Product keyed cache of sound catalogs.
+
+    Every device of a product shares the same immutable SoundCatalog. Concurrent
+    lookups for the same product wait on a single fetch, entries expire after
+    ``ttl`` seconds and, when ``path`` is set, catalogs are persisted to disk so a
+    restart can skip the fetch entirely. An expired entry is still returned if the
+    refetch fails.
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_SOUND_CATALOG_TTL,
+        path: str | Path | None = None,
+    ):
+        self.ttl = ttl
+        self.path = Path(path) if path is not None else None
+        self._entries: dict[str, tuple[float, SoundCatalog]] = {}
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self._disk_load: asyncio.Task | None = None
+
+    def peek(self, key: str) -> SoundCatalog | None:
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def put(
+        self, key: str, sounds, fetched_at: float | None = None
+    ) -> SoundCatalog:
+        catalog = SoundCatalog(sounds)
+        self._entries[key] = (time.time() if fetched_at is None else fetched_at, catalog)
+        return catalog
+
+    async def get(
+        self, key: str, loader: Callable[[], Awaitable[list]]
+    ) -> SoundCatalog:
+        if self.path is not None:
+            if self._disk_load is None:
+                self._disk_load = asyncio.ensure_future(self._load())
+            await asyncio.shield(self._disk_load)
+        catalog = self.peek(key)
+        if catalog is not None:
+            return catalog
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, loader))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(
+        self, key: str, loader: Callable[[], Awaitable[list]]
+    ) -> SoundCatalog:
+        try:
+            sounds = await loader()
+        except ClientError as error:
+            stale = self._entries.get(key)
+            if stale is None:
+                raise
+            _LOGGER.warning(
+                "Could not refresh %s sound catalog, using cached copy: %s", key, error
+            )
+            return stale[1]
+        catalog = self.put(key, sounds)
+        if self.path is not None:
+            await self._save()
+        return catalog
+
+    async def _load(self):
+        loop = asyncio.get_running_loop()
+        try:
+            data = await loop.run_in_executor(None, read_json_file, self.path)
+        except (OSError, ValueError) as error:
+            _LOGGER.debug("No usable sound catalog file at %s: %s", self.path, error)
+            return
+        if data.get("version") != SOUND_CATALOG_FILE_VERSION:
+            _LOGGER.debug("Ignoring sound catalog file with version %s", data.get("version"))
+            return
+        for key, entry in data.get("catalogs", {}).items():
+            if key not in self._entries:
+                self.put(key, entry["sounds"], fetched_at=entry["fetched_at"])
+
+    async def _save(self):
+        data = {
+            "version": SOUND_CATALOG_FILE_VERSION,
+            "catalogs": {
+                key: {"fetched_at": fetched_at, "sounds": list(catalog)}
+                for key, (fetched_at, catalog) in self._entries.items()
+            },
+        }
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, write_json_file, self.path, data)
+        except OSError as error:
+            _LOGGER.warning("Could not save sound catalogs to %s: %s", self.path, error)
@@ -1,4 +1,8 @@
+import json
 import logging
+from collections.abc import Callable, Iterable
+from pathlib import Path
+from typing import Any, NamedTuple
 
 from .const import SENSITIVE_FIELD_NAMES, MAX_IOT_VALUE
 
@@ -56,3 +60,198 @@ def safely_get_json_value(json, key, callable_to_cast=None):
     if callable_to_cast is not None and value is not None:
         value = callable_to_cast(value)
     return value
+
+
+def percentage_from_state(value) -> int:
+    return convert_to_percentage(int(value))
+
+
+def hex_from_state(value) -> int:
+    return convert_to_hex(int(value))
+
+
+def _child_value(value, key: str):
+    try:
+        return value[key]
+    except (TypeError, KeyError):
+        try:
+            return value[int(key)]
+        except (TypeError, KeyError, ValueError, IndexError):
+            return None
+
+
+class StateField(NamedTuple):
+    """
+    Maps a dotted shadow path onto a device attribute. When attribute is a tuple
+    convert must return one value per attribute.
+    """
+    path: str
+    attribute: str | tuple[str, ...]
+    convert: Callable[[Any], Any] | None = None
+
+
+class StateExtractor:
+    """
+    Reads every StateField out of a shadow document in a single traversal.
+
+    Paths are split once when the extractor is built and fields that share a
+    prefix share the walk, so each message only visits the keys it needs. Lookup
+    follows safely_get_json_value: missing keys and None values are skipped.
+    """
+
+    def __init__(self, fields: Iterable[StateField]):
+        self.fields = tuple(fields)
+        tree: dict = {}
+        for field in self.fields:
+            node = tree
+            *parents, leaf = field.path.split(".")
+            for segment in parents:
+                node = node.setdefault(segment, ({}, []))[0]
+            node.setdefault(leaf, ({}, []))[1].append(field)
+        self._tree = self._compile(tree)
+
+    @classmethod
+    def _compile(cls, tree: dict) -> tuple:
+        # (segment, compiled children, ((attribute, convert, unpack), ...))
+        return tuple(
+            (
+                segment,
+                cls._compile(children),
+                tuple(
+                    (field.attribute, field.convert, isinstance(field.attribute, tuple))
+                    for field in fields
+                ),
+            )
+            for segment, (children, fields) in tree.items()
+        )
+
+    def attributes(self) -> tuple[str, ...]:
+        """Every attribute the fields write, in declaration order."""
+        attributes = {}
+        for field in self.fields:
+            if isinstance(field.attribute, tuple):
+                attributes.update(dict.fromkeys(field.attribute))
+            else:
+                attributes[field.attribute] = None
+        return tuple(attributes)
+
+    def extract(self, state) -> dict[str, Any]:
+        values: dict[str, Any] = {}
+        if state is not None:
+            self._walk(state, self._tree, values)
+        return values
+
+    def _walk(self, value, tree: tuple, values: dict[str, Any]):
+        for segment, children, fields in tree:
+            try:
+                child = value[segment]
+            except (TypeError, KeyError):
+                child = _child_value(value, segment)
+            if child is None:
+                continue
+            for attribute, convert, unpack in fields:
+                converted = child if convert is None else convert(child)
+                if unpack:
+                    values.update(zip(attribute, converted, strict=True))
+                else:
+                    values[attribute] = converted
+            if children:
+                self._walk(child, children, values)
+
+
+class StateSlot:
+    """
+    Device class attribute stored on the instance's slotted state record rather
+    than in its __dict__. Unset slots and class level reads give the default.
+    """
+
+    __slots__ = ("name", "default")
+
+    def __init__(self, name: str, default: Any):
+        self.name = name
+        self.default = default
+
+    def __get__(self, device, owner=None):
+        if device is None:
+            return self.default
+        try:
+            return getattr(device._state, self.name)
+        except AttributeError:
+            return self.default
+
+    def __set__(self, device, value):
+        setattr(device._state, self.name, value)
+
+
+def state_record_type(name: str, attributes: Iterable[str]) -> type:
+    """Builds a __slots__ class with one slot per attribute and no instance dict."""
+    attributes = tuple(attributes)
+
+    def __repr__(self):
+        values = ", ".join(
+            f"{attribute}={getattr(self, attribute)!r}"
+            for attribute in attributes
+            if hasattr(self, attribute)
+        )
+        return f"{name}({values})"
+
+    return type(name, (), {"__slots__": attributes, "__repr__": __repr__})
+
+
+def diff_state(previous: dict, current: dict) -> dict:
+    """Returns the part of current whose leaves are missing from or differ in previous."""
+    changed = {}
+    for key, value in current.items():
+        existing = previous.get(key)
+        if isinstance(value, dict) and isinstance(existing, dict):
+            nested = diff_state(existing, value)
+            if nested:
+                changed[key] = nested
+        elif value != existing or key not in previous:
+            changed[key] = value
+    return changed
+
+
+def flatten_state(state: dict, prefix: str = "") -> dict[str, Any]:
+    """Maps every leaf of a shadow state document by its dotted path."""
+    flat = {}
+    for key, value in state.items():
+        path = prefix + key
+        if isinstance(value, dict):
+            flat.update(flatten_state(value, path + "."))
+        else:
+            flat[path] = value
+    return flat
+
+
+def merge_desired_state(pending: dict, update: dict) -> dict:
+    """
+    Deep merges update into pending in place, the value from update wins for
+    every leaf present in both.
+    """
+    for key, value in update.items():
+        if isinstance(value, dict):
+            existing = pending.get(key)
+            if not isinstance(existing, dict):
+                existing = pending[key] = {}
+            merge_desired_state(existing, value)
+        else:
+            pending[key] = value
+    return pending
+
+
+def read_json_file(path: Path) -> Any:
+    with path.open(encoding="utf-8") as file:
+        return json.load(file)
+
+
+def write_json_file(path: Path, data: Any):
+    """
+    Writes to a temporary file next to path and renames it over path, so a
+    crash mid-write never leaves a truncated file behind.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_suffix(path.suffix + ".tmp")
+    with temporary_path.open("w", encoding="utf-8") as file:
+        json.dump(data, file)
+    temporary_path.replace(path)
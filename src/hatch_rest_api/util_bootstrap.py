@@ -1,25 +1,31 @@
 import asyncio
 import logging
+import time
+from collections.abc import Callable
 from functools import partial
 from re import IGNORECASE, sub
 from uuid import uuid4
 
 from aiohttp import ClientError, ClientSession
-from awscrt import io
+from awscrt import io, mqtt
 from awscrt.auth import AwsCredentialsProvider
 from awsiot.iotshadow import IotShadowClient
 from awsiot.mqtt_connection_builder import websockets_with_default_aws_signing
 
 from . import BaseError
 from .aws_http import AwsHttp
+from .connection_supervisor import DEFAULT_RESYNC_JITTER, ConnectionSupervisor
 from .const import NO_SOUND_ID
-from .contentful import Contentful
+from .credentials import CredentialRefresher
+from .contentful import API_URL as CONTENTFUL_URL, Contentful
 from .errors import RateError
-from .hatch import Hatch
+from .hatch import API_URL as HATCH_URL, Hatch
+from .rate_limit import RateLimiter
 from .rest_baby import RestBaby
 from .rest_iot import RestIot
 from .rest_mini import RestMini
 from .rest_plus import RestPlus
+from .rest_stats import RestStats
 from .restore_iot import RestoreIot
 from .restore_v4 import RestoreV4
 from .restore_v5 import RestoreV5
@@ -28,7 +34,16 @@ from .scheduled_routine import (
     SCHEDULED_ROUTINE_ALARM_PRODUCTS,
     ScheduledRoutineAlarmMixin,
 )
-from .types import SimpleSoundContent
+from .shadow_fleet import ShadowFleetDispatcher
+from .snapshot import DEFAULT_SNAPSHOT_MAX_AGE, BootstrapSnapshot, SnapshotStore
+from .sound_catalog import (
+    EMPTY_SOUND_CATALOG,
+    UNAVAILABLE_SOUND_CATALOG,
+    SoundCatalog,
+    SoundCatalogCache,
+    sound_catalog_key,
+)
+from .util_concurrency import DEFAULT_MAX_IN_FLIGHT, BoundedFanOut, gather_or_cancel
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -36,6 +51,13 @@ _LOGGER = logging.getLogger(__name__)
 # Prevents thread pool workers from blocking indefinitely when the Hatch
 # cloud is unreachable in ways that don't fail fast (e.g. hung TCP).
 MQTT_CONNECT_TIMEOUT = 30
+# Metadata fetches fanned out over the devices, the keys get_rest_devices
+# accepts in endpoint_concurrency_limits.
+FAVORITES_ENDPOINT = "favorites"
+ROUTINES_ENDPOINT = "routines"
+ALARMS_ENDPOINT = "alarms"
+SOUNDS_ENDPOINT = "sounds"
+METADATA_ENDPOINTS = (FAVORITES_ENDPOINT, ROUTINES_ENDPOINT, ALARMS_ENDPOINT, SOUNDS_ENDPOINT)
 
 io.init_logging(io.LogLevel.NoLogs, "stderr")
 
@@ -46,77 +68,199 @@ async def get_rest_devices(
     client_session: ClientSession = None,
     on_connection_interrupted=None,
     on_connection_resumed=None,
+    max_concurrent_requests: int = DEFAULT_MAX_IN_FLIGHT,
+    endpoint_concurrency_limits: dict[str, int] | None = None,
+    sound_catalog_cache: SoundCatalogCache | None = None,
+    coalesce_window: float | None = None,
+    track_convergence: bool = False,
+    rate_limiter: RateLimiter | None = None,
+    snapshot_path: str | None = None,
+    snapshot_max_age: float = DEFAULT_SNAPSHOT_MAX_AGE,
+    fleet_subscriptions: bool = False,
+    refresh_credentials: bool = False,
+    on_credential_refresh_failed: Callable[[BaseException], None] | None = None,
+    resync_jitter: float = DEFAULT_RESYNC_JITTER,
+    callback_loop: asyncio.AbstractEventLoop | None = None,
+    api_url: str = HATCH_URL,
+    contentful_url: str = CONTENTFUL_URL,
+    cognito_url: str | None = None,
+    mqtt_connection: mqtt.Connection | None = None,
+    rest_stats: RestStats | None = None,
 ):
+    """
+    With snapshot_path set the device list and metadata are saved after a full
+    fetch and loaded on the next start, so only login, the AWS token and the MQTT
+    connection remain on the startup path. A snapshot older than
+    snapshot_max_age seconds is revalidated in the background and changed devices
+    notify their callbacks.
+
+    fleet_subscriptions=True subscribes once to wildcard shadow topics for the
+    whole account instead of twice per device.
+
+    track_convergence=True makes setters return a ConvergenceFuture that
+    resolves once the device reports the desired state.
+
+    refresh_credentials=True fetches new AWS credentials ahead of the returned
+    expiration and reconnects the same mqtt connection with them until
+    api.cleanup_client_session() is called, so nothing needs rebuilding. An
+    expired Hatch login is renewed with email and password and the new auth
+    token is handed to the alarm devices. If that is rejected too, refreshing
+    stops and on_credential_refresh_failed is called with the AuthError.
+
+    Whenever the connection comes back without its session, every device
+    subscribes again and every shadow is refetched, spread over resync_jitter
+    seconds. on_connection_resumed is still called first.
+
+    With callback_loop set, device callbacks (plain or coroutine functions) run
+    on that loop instead of the awscrt thread, see set_callback_loop.
+
+    api_url, contentful_url and cognito_url point the REST clients elsewhere,
+    e.g. at a fake_rest.FakeHatchServer. A connected mqtt_connection, such as a
+    fake_shadow.FakeShadowConnection, is used instead of connecting to AWS IoT;
+    on_connection_interrupted and on_connection_resumed are not wired to it.
+
+    rest_stats collects per endpoint counts and latency of every REST call, see
+    RestStats.snapshot.
+
+    Without a rate_limiter REST calls are not throttled up front and 429s are
+    retried with backoff where the endpoint supports it.
+
+    max_concurrent_requests caps the metadata requests in flight at once and
+    endpoint_concurrency_limits caps them per endpoint. Its keys are
+    "favorites", "routines", "alarms" and "sounds" (METADATA_ENDPOINTS); any
+    other key raises ValueError.
+    """
+    unknown_endpoints = set(endpoint_concurrency_limits or ()) - set(METADATA_ENDPOINTS)
+    if unknown_endpoints:
+        raise ValueError(
+            f"unknown endpoint_concurrency_limits keys: {', '.join(sorted(unknown_endpoints))}"
+        )
     loop = asyncio.get_running_loop()
     aws_log_level = io.LogLevel.Debug if _LOGGER.isEnabledFor(logging.DEBUG) else io.LogLevel.NoLogs
     await loop.run_in_executor(None, io.set_log_level, aws_log_level)
-    api = Hatch(client_session=client_session)
-    contentful = Contentful(client_session=client_session)
+    # a given limiter is shared so Hatch and Contentful calls draw from the same
+    # per host budgets
+    api = Hatch(
+        client_session=client_session,
+        rate_limiter=rate_limiter,
+        base_url=api_url,
+        rest_stats=rest_stats,
+    )
+    contentful = Contentful(
+        client_session=client_session,
+        rate_limiter=rate_limiter,
+        base_url=contentful_url,
+        rest_stats=rest_stats,
+    )
     token = await api.login(email=email, password=password)
-    iot_devices = await api.iot_devices(auth_token=token)
-    if len(iot_devices) == 0:
-        raise BaseError("No compatible devices found on this hatch account")
-    aws_token = await api.token(auth_token=token)
-    favorites_map = await _get_favorites_for_all_v2_devices(api, token, iot_devices)
-    routines_map = await _get_routines_for_all_v2_devices(api, token, iot_devices)
-    alarms_map = await _get_alarms_for_all_scheduled_routine_devices(
-        api, token, iot_devices
+    sound_catalogs = sound_catalog_cache or SoundCatalogCache()
+    fan_out = BoundedFanOut(
+        max_in_flight=max_concurrent_requests,
+        endpoint_limits=endpoint_concurrency_limits,
     )
-    sounds_map = await _get_sound_content_for_all_v2_devices(
-        api, token, contentful, iot_devices
+    snapshot_store = SnapshotStore(snapshot_path) if snapshot_path is not None else None
+    snapshot = await snapshot_store.load() if snapshot_store is not None else None
+    if snapshot is None:
+        iot_devices = await api.iot_devices(auth_token=token)
+        if len(iot_devices) == 0:
+            raise BaseError("No compatible devices found on this hatch account")
+        aws_token, snapshot = await gather_or_cancel(
+            api.token(auth_token=token),
+            _fetch_snapshot(api, token, contentful, iot_devices, fan_out, sound_catalogs),
+        )
+        if snapshot_store is not None:
+            await _save_snapshot(snapshot_store, snapshot)
+        revalidate = False
+    else:
+        _LOGGER.debug("starting devices from bootstrap snapshot at %s", snapshot_path)
+        aws_token = await api.token(auth_token=token)
+        revalidate = snapshot.is_stale(snapshot_max_age)
+    aws_http: AwsHttp = AwsHttp(
+        api.api_session, base_url=cognito_url, rest_stats=rest_stats
     )
-    aws_http: AwsHttp = AwsHttp(api.api_session)
     aws_credentials = await aws_http.aws_credentials(
         region=aws_token["region"],
         identityId=aws_token["identityId"],
         aws_token=aws_token["token"],
     )
     _LOGGER.debug(f"AWS credentials: {aws_credentials}")
-    credentials_provider = AwsCredentialsProvider.new_static(
-        aws_credentials["Credentials"]["AccessKeyId"],
-        aws_credentials["Credentials"]["SecretKey"],
-        session_token=aws_credentials["Credentials"]["SessionToken"],
-    )
-    event_loop_group = io.EventLoopGroup(1)
-    host_resolver = io.DefaultHostResolver(event_loop_group)
-    client_bootstrap = io.ClientBootstrap(event_loop_group, host_resolver)
-    endpoint = aws_token["endpoint"].lstrip("https://")
-    safe_email = sub("[^a-z]", "", email, flags=IGNORECASE).lower()
-    mqtt_connection = await loop.run_in_executor(
-        None,
-        partial(
-            websockets_with_default_aws_signing,
-            region=aws_token["region"],
-            credentials_provider=credentials_provider,
-            keep_alive_secs=30,
-            client_bootstrap=client_bootstrap,
-            endpoint=endpoint,
-            client_id=f"hatch_rest_api/{safe_email}/{str(uuid4())}",
-            on_connection_interrupted=on_connection_interrupted,
-            on_connection_resumed=on_connection_resumed,
-            # Opt out of the AWS IoT SDK metrics that awsiot otherwise appends
-            # to the CONNECT packet username. They report AWS SDK/platform
-            # details to AWS and are of no use to us, but building them makes
-            # awscrt introspect private ClientTlsContext internals
-            # (tls_ctx._certificate_source). On installs where awscrt's modules
-            # are not all from the same version, that attribute is missing and
-            # the connection blows up before it is ever attempted:
-            #     AttributeError: 'ClientTlsContext' object
-            #     has no attribute '_certificate_source'
-            # Disabling metrics skips that code path entirely.
-            enable_metrics_collection=False,
-        ),
+    if refresh_credentials:
+        credential_refresher = CredentialRefresher(
+            api, aws_http, token, aws_token, aws_credentials
+        )
+        credentials_provider = credential_refresher.provider
+    else:
+        credentials_provider = AwsCredentialsProvider.new_static(
+            aws_credentials["Credentials"]["AccessKeyId"],
+            aws_credentials["Credentials"]["SecretKey"],
+            session_token=aws_credentials["Credentials"]["SessionToken"],
+        )
+    connection_supervisor = ConnectionSupervisor(
+        loop, on_connection_resumed=on_connection_resumed, resync_jitter=resync_jitter
     )
-    try:
-        connect_future = await loop.run_in_executor(None, mqtt_connection.connect)
-        await loop.run_in_executor(
-            None, partial(connect_future.result, MQTT_CONNECT_TIMEOUT)
+    if mqtt_connection is None:
+        event_loop_group = io.EventLoopGroup(1)
+        host_resolver = io.DefaultHostResolver(event_loop_group)
+        client_bootstrap = io.ClientBootstrap(event_loop_group, host_resolver)
+        endpoint = aws_token["endpoint"].lstrip("https://")
+        safe_email = sub("[^a-z]", "", email, flags=IGNORECASE).lower()
+        mqtt_connection = await loop.run_in_executor(
+            None,
+            partial(
+                websockets_with_default_aws_signing,
+                region=aws_token["region"],
+                credentials_provider=credentials_provider,
+                keep_alive_secs=30,
+                client_bootstrap=client_bootstrap,
+                endpoint=endpoint,
+                client_id=f"hatch_rest_api/{safe_email}/{str(uuid4())}",
+                on_connection_interrupted=on_connection_interrupted,
+                on_connection_resumed=connection_supervisor.on_connection_resumed,
+                # Opt out of the AWS IoT SDK metrics that awsiot otherwise appends
+                # to the CONNECT packet username. They report AWS SDK/platform
+                # details to AWS and are of no use to us, but building them makes
+                # awscrt introspect private ClientTlsContext internals
+                # (tls_ctx._certificate_source). On installs where awscrt's modules
+                # are not all from the same version, that attribute is missing and
+                # the connection blows up before it is ever attempted:
+                #     AttributeError: 'ClientTlsContext' object
+                #     has no attribute '_certificate_source'
+                # Disabling metrics skips that code path entirely.
+                enable_metrics_collection=False,
+            ),
         )
-        _LOGGER.debug("mqtt connection connected")
-    except Exception as e:
-        _LOGGER.error(f"MQTT connection failed with exception {e}")
-        raise e
+        try:
+            connect_future = await loop.run_in_executor(None, mqtt_connection.connect)
+            await loop.run_in_executor(
+                None, partial(connect_future.result, MQTT_CONNECT_TIMEOUT)
+            )
+            _LOGGER.debug("mqtt connection connected")
+        except Exception as e:
+            _LOGGER.error(f"MQTT connection failed with exception {e}")
+            raise e
+
+    if refresh_credentials:
+
+        async def relogin() -> str:
+            nonlocal token
+            token = await api.login(email=email, password=password)
+            for rest_device in connection_supervisor.devices:
+                if isinstance(rest_device, ScheduledRoutineAlarmMixin):
+                    rest_device.set_alarm_auth_token(token)
+            return token
 
+        def refresh_done(task: asyncio.Task):
+            if task.cancelled() or task.exception() is None:
+                return
+            if on_credential_refresh_failed is not None:
+                on_credential_refresh_failed(task.exception())
+
+        credential_refresher.on_session_lost = connection_supervisor.resync
+        credential_refresher.relogin = relogin
+        refresher_task = api.start_background_task(
+            credential_refresher.run(mqtt_connection)
+        )
+        refresher_task.add_done_callback(refresh_done)
     shadow_client = IotShadowClient(mqtt_connection)
 
     def _with_alarm_api(rest_device, alarms):
@@ -126,27 +270,14 @@ async def get_rest_devices(
 
     def create_rest_devices(iot_device):
         mac_address = iot_device["macAddress"]
-        if mac_address in favorites_map:
-            favorites = list(favorites_map[mac_address])
-        else:
-            _LOGGER.debug(f"Iot device {iot_device} has no favorites")
-            favorites = []
-        if mac_address in routines_map:
-            routines = list(routines_map[mac_address])
-        else:
-            _LOGGER.debug(f"Iot device {iot_device} has no routines")
-            routines = []
-        if mac_address in alarms_map:
-            alarms = alarms_map[mac_address]
-        else:
-            _LOGGER.debug(f"Iot device {iot_device} has no alarms")
-            alarms = []
+        favorites, sounds, alarms = _device_metadata(iot_device, snapshot)
         if iot_device["product"] == "restPlus":
             return RestPlus(
                 device_name=iot_device["name"],
                 thing_name=iot_device["thingName"],
                 mac=mac_address,
                 shadow_client=shadow_client,
+                subscribe=False,
             )
         elif iot_device["product"] in ["riot", "riotPlus"]:
             return RestIot(
@@ -154,8 +285,9 @@ async def get_rest_devices(
                 thing_name=iot_device["thingName"],
                 mac=mac_address,
                 shadow_client=shadow_client,
+                subscribe=False,
                 favorites=favorites,
-                sounds=sounds_map[mac_address],
+                sounds=sounds,
             )
         elif iot_device["product"] == "restoreIot":
             return _with_alarm_api(
@@ -164,8 +296,9 @@ async def get_rest_devices(
                     thing_name=iot_device["thingName"],
                     mac=mac_address,
                     shadow_client=shadow_client,
-                    favorites=routines + favorites,
-                    sounds=sounds_map[mac_address],
+                    subscribe=False,
+                    favorites=favorites,
+                    sounds=sounds,
                 ),
                 alarms,
             )
@@ -176,8 +309,9 @@ async def get_rest_devices(
                     thing_name=iot_device["thingName"],
                     mac=mac_address,
                     shadow_client=shadow_client,
-                    favorites=routines + favorites,
-                    sounds=sounds_map[mac_address],
+                    subscribe=False,
+                    favorites=favorites,
+                    sounds=sounds,
                 ),
                 alarms,
             )
@@ -188,8 +322,9 @@ async def get_rest_devices(
                     thing_name=iot_device["thingName"],
                     mac=mac_address,
                     shadow_client=shadow_client,
-                    favorites=routines + favorites,
-                    sounds=sounds_map[mac_address],
+                    subscribe=False,
+                    favorites=favorites,
+                    sounds=sounds,
                 ),
                 alarms,
             )
@@ -199,8 +334,9 @@ async def get_rest_devices(
                 thing_name=iot_device["thingName"],
                 mac=mac_address,
                 shadow_client=shadow_client,
-                favorites=routines + favorites,
-                sounds=sounds_map[mac_address],
+                subscribe=False,
+                favorites=favorites,
+                sounds=sounds,
             )
         else:
             return RestMini(
@@ -208,128 +344,363 @@ async def get_rest_devices(
                 thing_name=iot_device["thingName"],
                 mac=mac_address,
                 shadow_client=shadow_client,
+                subscribe=False,
             )
 
-    rest_devices = map(create_rest_devices, iot_devices)
+    rest_devices = list(map(create_rest_devices, snapshot.iot_devices))
+    _configure_devices(
+        rest_devices,
+        coalesce_window=coalesce_window,
+        track_convergence=track_convergence,
+        callback_loop=callback_loop,
+        shadow_fleet=ShadowFleetDispatcher(mqtt_connection) if fleet_subscriptions else None,
+    )
+    rest_devices = await _subscribe_all(rest_devices)
+    connection_supervisor.devices = rest_devices
+    if revalidate:
+        api.start_background_task(
+            _revalidate_snapshot(
+                api,
+                lambda: token,
+                contentful,
+                fan_out,
+                sound_catalogs,
+                snapshot_store,
+                snapshot,
+                rest_devices,
+            )
+        )
     return (
         api,
         mqtt_connection,
-        list(rest_devices),
+        rest_devices,
         aws_credentials["Credentials"]["Expiration"],
     )
 
 
-async def _get_favorites_for_all_v2_devices(api, token, iot_devices):
-    mac_to_favorite = {}
-    for device in iot_devices:
-        if device["product"] in ["riot", "riotPlus", "restBaby", "restoreV4", "restoreV5"]:
-            mac = device["macAddress"]
-            favorites = await api.favorites(auth_token=token, mac=mac)
-            _LOGGER.debug(f"Favorites for {mac}: {favorites}")
-            mac_to_favorite[mac] = favorites
-    return mac_to_favorite
-
-
-async def _get_routines_for_all_v2_devices(api, token, iot_devices):
-    mac_to_routines = {}
-    for device in iot_devices:
-        if device["product"] in ["riot", "restBaby", "restoreIot", "restoreV4", "restoreV5"]:
-            mac = device["macAddress"]
-            routines = await api.routines(auth_token=token, mac=mac)
-            _LOGGER.debug(f"Routines for {mac}: {routines}")
-            mac_to_routines[mac] = routines
-    return mac_to_routines
-
-
-async def _get_alarms_for_all_scheduled_routine_devices(api, token, iot_devices):
-    mac_to_alarms = {}
-    for device in iot_devices:
-        if device["product"] in SCHEDULED_ROUTINE_ALARM_PRODUCTS:
-            mac = device["macAddress"]
-            try:
-                alarms = await api.scheduled_routines(
-                    auth_token=token,
-                    mac=mac,
-                    types=[ALARM_ROUTINE_TYPE],
-                )
-            except RateError:
-                raise
-            except ClientError as e:
-                _LOGGER.warning(
-                    f"Could not fetch alarm routines for {mac}: {str(e)}"
-                )
-                alarms = None
-            _LOGGER.debug(f"Alarms for {mac}: {alarms}")
-            mac_to_alarms[mac] = alarms
-    return mac_to_alarms
+def _configure_devices(
+    rest_devices: list,
+    coalesce_window: float | None,
+    track_convergence: bool,
+    callback_loop: asyncio.AbstractEventLoop | None,
+    shadow_fleet: ShadowFleetDispatcher | None,
+):
+    """Applies the per device options of get_rest_devices."""
+    for rest_device in rest_devices:
+        if coalesce_window is not None:
+            rest_device.coalesce_window = coalesce_window
+        if track_convergence:
+            rest_device.track_convergence = True
+        if callback_loop is not None:
+            rest_device.set_callback_loop(callback_loop)
+        if shadow_fleet is not None:
+            rest_device.shadow_fleet = shadow_fleet
+
+
+async def _subscribe_all(rest_devices: list) -> list:
+    """
+    Subscribes every device and requests its shadow concurrently, so the whole
+    fleet costs about one round-trip. Devices that fail are logged and left out,
+    and the subscriptions they did get are dropped so a device nobody holds is
+    not updated by shadow messages.
+    """
+    results = await asyncio.gather(
+        *(rest_device.async_subscribe() for rest_device in rest_devices),
+        return_exceptions=True,
+    )
+    subscribed = []
+    failed = []
+    for rest_device, result in zip(rest_devices, results):
+        if isinstance(result, BaseException):
+            _LOGGER.error(
+                f"Could not subscribe to {rest_device.device_name} shadow: {result!r}"
+            )
+            failed.append(rest_device)
+        else:
+            subscribed.append(rest_device)
+    unsubscribed = await asyncio.gather(
+        *(rest_device.async_unsubscribe() for rest_device in failed),
+        return_exceptions=True,
+    )
+    for rest_device, result in zip(failed, unsubscribed):
+        if isinstance(result, BaseException):
+            _LOGGER.warning(
+                "Could not unsubscribe %s after a failed subscribe: %r",
+                rest_device.device_name,
+                result,
+            )
+    if rest_devices and not subscribed:
+        raise BaseError("Could not subscribe to any hatch device shadows")
+    return subscribed
+
+
+def _device_metadata(iot_device, snapshot: BootstrapSnapshot):
+    """Returns the favorites, sounds and alarms a device is created with."""
+    mac_address = iot_device["macAddress"]
+    if mac_address in snapshot.favorites:
+        favorites = list(snapshot.favorites[mac_address])
+    else:
+        _LOGGER.debug(f"Iot device {iot_device} has no favorites")
+        favorites = []
+    if mac_address in snapshot.routines:
+        routines = list(snapshot.routines[mac_address])
+    else:
+        _LOGGER.debug(f"Iot device {iot_device} has no routines")
+        routines = []
+    if mac_address in snapshot.alarms:
+        alarms = snapshot.alarms[mac_address]
+    else:
+        _LOGGER.debug(f"Iot device {iot_device} has no alarms")
+        alarms = []
+    # the riot lists favorites only, the other sound devices list routines first
+    if iot_device["product"] not in ["riot", "riotPlus"]:
+        favorites = routines + favorites
+    return favorites, snapshot.sounds.get(mac_address, EMPTY_SOUND_CATALOG), alarms
+
+
+async def _fetch_snapshot(
+    api: Hatch,
+    token: str,
+    contentful: Contentful,
+    iot_devices,
+    fan_out: BoundedFanOut,
+    sound_catalogs: SoundCatalogCache,
+) -> BootstrapSnapshot:
+    (
+        favorites_map,
+        routines_map,
+        alarms_map,
+        sounds_map,
+    ) = await gather_or_cancel(
+        _get_favorites_for_all_v2_devices(api, token, iot_devices, fan_out),
+        _get_routines_for_all_v2_devices(api, token, iot_devices, fan_out),
+        _get_alarms_for_all_scheduled_routine_devices(
+            api, token, iot_devices, fan_out
+        ),
+        _get_sound_content_for_all_v2_devices(
+            api, token, contentful, iot_devices, fan_out, sound_catalogs
+        ),
+    )
+    return BootstrapSnapshot(
+        iot_devices=iot_devices,
+        favorites=favorites_map,
+        routines=routines_map,
+        alarms=alarms_map,
+        sounds=sounds_map,
+        fetched_at=time.time(),
+    )
+
+
+async def _save_snapshot(snapshot_store: SnapshotStore, snapshot: BootstrapSnapshot):
+    # a snapshot with sections that fell back after a failed fetch would be
+    # trusted on the next start, leave the file alone so it gets refetched
+    if not snapshot.is_complete():
+        _LOGGER.debug("Not saving bootstrap snapshot with unavailable alarms or sounds")
+        return
+    await snapshot_store.save(snapshot)
+
+
+async def _revalidate_snapshot(
+    api: Hatch,
+    auth_token: Callable[[], str],
+    contentful: Contentful,
+    fan_out: BoundedFanOut,
+    sound_catalogs: SoundCatalogCache,
+    snapshot_store: SnapshotStore,
+    snapshot: BootstrapSnapshot,
+    rest_devices: list,
+):
+    """
+    Refetches a stale snapshot and pushes any differences into the devices.
+    auth_token returns the current Hatch auth token, which a new login replaces.
+    """
+    try:
+        iot_devices = await api.iot_devices(auth_token=auth_token())
+        fresh = await _fetch_snapshot(
+            api, auth_token(), contentful, iot_devices, fan_out, sound_catalogs
+        )
+    except ClientError as error:
+        _LOGGER.warning(f"Could not revalidate bootstrap snapshot: {error}")
+        return
+    await _save_snapshot(snapshot_store, fresh)
+    if fresh.macs() != snapshot.macs():
+        _LOGGER.info(
+            "Hatch account devices changed since the last snapshot, "
+            "reload to pick up added or removed devices"
+        )
+    changed = snapshot.changed_macs(fresh)
+    iot_devices_by_mac = {device["macAddress"]: device for device in iot_devices}
+    for rest_device in rest_devices:
+        if rest_device.mac not in changed:
+            continue
+        favorites, sounds, alarms = _device_metadata(
+            iot_devices_by_mac[rest_device.mac], fresh
+        )
+        _LOGGER.debug(f"Metadata for {rest_device.mac} changed, updating device")
+        changed_attributes = set()
+        if rest_device.favorites != favorites:
+            rest_device.favorites = favorites
+            changed_attributes.add("favorites")
+        # sections that failed to refetch keep what the device already has
+        if sounds is not UNAVAILABLE_SOUND_CATALOG and tuple(
+            rest_device.sounds
+        ) != tuple(sounds):
+            rest_device.set_sounds(sounds)
+            changed_attributes.add("sounds")
+        if (
+            isinstance(rest_device, ScheduledRoutineAlarmMixin)
+            and alarms is not None
+            and rest_device.alarms != alarms
+        ):
+            rest_device.configure_alarm_api(
+                api=api, auth_token=auth_token(), alarms=alarms
+            )
+            changed_attributes.add("alarms")
+        rest_device.publish_updates(changed_attributes)
+
+
+async def _get_favorites_for_all_v2_devices(
+    api: Hatch, token: str, iot_devices, fan_out: BoundedFanOut
+):
+    macs = [
+        device["macAddress"]
+        for device in iot_devices
+        if device["product"] in ["riot", "riotPlus", "restBaby", "restoreV4", "restoreV5"]
+    ]
+
+    async def fetch(mac):
+        favorites = await api.favorites(auth_token=token, mac=mac)
+        _LOGGER.debug(f"Favorites for {mac}: {favorites}")
+        return favorites
+
+    return await fan_out.map(FAVORITES_ENDPOINT, macs, fetch)
+
+
+async def _get_routines_for_all_v2_devices(
+    api: Hatch, token: str, iot_devices, fan_out: BoundedFanOut
+):
+    macs = [
+        device["macAddress"]
+        for device in iot_devices
+        if device["product"] in ["riot", "restBaby", "restoreIot", "restoreV4", "restoreV5"]
+    ]
+
+    async def fetch(mac):
+        routines = await api.routines(auth_token=token, mac=mac)
+        _LOGGER.debug(f"Routines for {mac}: {routines}")
+        return routines
+
+    return await fan_out.map(ROUTINES_ENDPOINT, macs, fetch)
+
+
+async def _get_alarms_for_all_scheduled_routine_devices(
+    api: Hatch, token: str, iot_devices, fan_out: BoundedFanOut
+):
+    macs = [
+        device["macAddress"]
+        for device in iot_devices
+        if device["product"] in SCHEDULED_ROUTINE_ALARM_PRODUCTS
+    ]
+
+    async def fetch(mac):
+        try:
+            alarms = await api.scheduled_routines(
+                auth_token=token,
+                mac=mac,
+                types=[ALARM_ROUTINE_TYPE],
+            )
+        except RateError:
+            raise
+        except ClientError as e:
+            _LOGGER.warning(
+                f"Could not fetch alarm routines for {mac}: {str(e)}"
+            )
+            alarms = None
+        _LOGGER.debug(f"Alarms for {mac}: {alarms}")
+        return alarms
+
+    return await fan_out.map(ALARMS_ENDPOINT, macs, fetch)
 
 
 async def _get_sound_content_for_all_v2_devices(
-    api: Hatch, token: str, contentful: Contentful, iot_devices
-) -> dict[str, list[SimpleSoundContent]]:
-    mac_to_sounds = {}
-    for device in iot_devices:
-        mac = device["macAddress"]
-        if device["product"] in ["riot", "riotPlus", "restBaby"]:
-            try:
-                content = await api.content(
-                    auth_token=token, product="riot", content=["sound"]
-                )
-                sounds = [s for s in content["contentItems"] if s["id"] != NO_SOUND_ID]
-            except RateError as e:
-                _LOGGER.warning(
-                    f"Rate limit error when fetching sounds for {mac}: {str(e)}"
-                )
-                sounds = []
-        elif device["product"] in ["restoreV4", "restoreV5"]:
-            try:
-                content = await contentful.graphql_query(
-                    auth_token=token,
-                    query="""
-                        query GetSounds($product: String!) {
-                          soundCollection(
-                            limit: 1000
-                            where: {
-                              title_exists: true
-                              title_not_contains: "DVT: "
-                              wavFile_exists: true
-                              tier: "free"
-                              devices: {
-                                devCode_in: [$product]
-                              }
-                              hatchId_gt: 0
-                              hidden: false
-                            }
-                            order: [
-                              hatchId_ASC
-                            ]
-                          ) {
-                            total
-                            limit
-                            items {
-                              title
-                              id: hatchId
-                              wavFile {
-                                url
-                              }
-                            }
+    api: Hatch,
+    token: str,
+    contentful: Contentful,
+    iot_devices,
+    fan_out: BoundedFanOut,
+    sound_catalogs: SoundCatalogCache,
+) -> dict[str, SoundCatalog]:
+    catalog_keys = {
+        device["macAddress"]: sound_catalog_key(device["product"])
+        for device in iot_devices
+    }
+
+    async def load_riot_sounds():
+        content = await api.content(
+            auth_token=token, product="riot", content=["sound"]
+        )
+        return [s for s in content["contentItems"] if s["id"] != NO_SOUND_ID]
+
+    def restore_sounds_loader(product):
+        async def load_restore_sounds():
+            content = await contentful.graphql_query(
+                auth_token=token,
+                query="""
+                    query GetSounds($product: String!) {
+                      soundCollection(
+                        limit: 1000
+                        where: {
+                          title_exists: true
+                          title_not_contains: "DVT: "
+                          wavFile_exists: true
+                          tier: "free"
+                          devices: {
+                            devCode_in: [$product]
                           }
+                          hatchId_gt: 0
+                          hidden: false
                         }
-                    """,
-                    product=device["product"],
-                )
-                sounds = [
-                    {**s, "wavUrl": s["wavFile"]["url"]}
-                    for s in content["soundCollection"]["items"]
-                    if s["id"] != NO_SOUND_ID
-                ]
-            except RateError as e:
-                _LOGGER.warning(
-                    f"Rate limit error when fetching sounds for {mac}: {str(e)}"
-                )
-                sounds = []
-        else:
-            sounds = []
-        _LOGGER.debug(f"Sounds for {mac}: {sounds}")
-        mac_to_sounds[mac] = sounds
-    return mac_to_sounds
+                        order: [
+                          hatchId_ASC
+                        ]
+                      ) {
+                        total
+                        limit
+                        items {
+                          title
+                          id: hatchId
+                          wavFile {
+                            url
+                          }
+                        }
+                      }
+                    }
+                """,
+                product=product,
+            )
+            return [
+                {**s, "wavUrl": s["wavFile"]["url"]}
+                for s in content["soundCollection"]["items"]
+                if s["id"] != NO_SOUND_ID
+            ]
+
+        return load_restore_sounds
+
+    async def fetch(key):
+        loader = load_riot_sounds if key == "riot" else restore_sounds_loader(key)
+        try:
+            sounds = await sound_catalogs.get(key, loader)
+        except RateError as e:
+            _LOGGER.warning(
+                f"Rate limit error when fetching {key} sounds: {str(e)}"
+            )
+            sounds = UNAVAILABLE_SOUND_CATALOG
+        _LOGGER.debug(f"Sounds for {key}: {sounds}")
+        return sounds
+
+    keys = {key for key in catalog_keys.values() if key is not None}
+    catalogs = await fan_out.map(SOUNDS_ENDPOINT, sorted(keys), fetch)
+    return {
+        mac: catalogs.get(key, EMPTY_SOUND_CATALOG)
+        for mac, key in catalog_keys.items()
+    }
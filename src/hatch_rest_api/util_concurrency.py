@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Hashable, Iterable
+from typing import Any, TypeVar
+
+_LOGGER = logging.getLogger(__name__)
+
+# Default number of REST requests allowed in flight at once during bootstrap.
+DEFAULT_MAX_IN_FLIGHT = 8
+
+K = TypeVar("K", bound=Hashable)
+T = TypeVar("T")
+
+
+async def gather_or_cancel(*aws: Awaitable[Any]) -> list[Any]:
+    """
+    Like asyncio.gather, but the first failure cancels every sibling still running
+    and is re-raised unchanged, so callers see the same exception a sequential
+    loop would have raised.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+class BoundedFanOut:
+    """
+    Runs per-device requests concurrently while capping the total number in flight
+    and, optionally, the number in flight for each named endpoint.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        endpoint_limits: dict[str, int] | None = None,
+    ):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.max_in_flight = max_in_flight
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._endpoint_semaphores = {
+            endpoint: asyncio.Semaphore(limit)
+            for endpoint, limit in (endpoint_limits or {}).items()
+        }
+
+    async def run(
+        self,
+        endpoint: str,
+        request: Callable[..., Awaitable[T]],
+        *args,
+        **kwargs,
+    ) -> T:
+        endpoint_semaphore = self._endpoint_semaphores.get(endpoint)
+        if endpoint_semaphore is None:
+            async with self._semaphore:
+                return await request(*args, **kwargs)
+        # take the endpoint slot first so a throttled endpoint never holds a
+        # global slot another endpoint could be using
+        async with endpoint_semaphore, self._semaphore:
+            return await request(*args, **kwargs)
+
+    async def map(
+        self,
+        endpoint: str,
+        keys: Iterable[K],
+        request: Callable[[K], Awaitable[T]],
+    ) -> dict[K, T]:
+        keys = list(keys)
+        _LOGGER.debug("fanning out %s requests to %s", len(keys), endpoint)
+        results = await gather_or_cancel(
+            *(self.run(endpoint, request, key) for key in keys)
+        )
+        return dict(zip(keys, results, strict=True))
@@ -1,36 +1,104 @@
+import json
 import logging
+import time
+from typing import Any, NamedTuple
+
+from aiohttp import ClientResponse
 
 from .util import clean_dictionary_for_logging
 
 _LOGGER = logging.getLogger(__name__)
 
 
+class DecodedResponse(NamedTuple):
+    """A response whose body has been read and JSON decoded exactly once."""
+    response: ClientResponse
+    body: bytes
+    # None when the body is not valid JSON
+    json: Any
+
+    @property
+    def status(self) -> int:
+        return self.response.status
+
+    def text(self, limit: int | None = None) -> str:
+        return self.body[:limit].decode("utf-8", errors="replace")
+
+
+def decode_json_body(body: bytes) -> Any:
+    if not body:
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
 def request_with_logging(func):
-    async def request_with_logging_wrapper(*args, **kwargs):
-        url = kwargs["url"]
-        request_message = f"sending {url} request"
-        headers = kwargs.get("headers")
-        if headers is not None:
-            request_message = request_message + f"headers: {headers}"
-        json_body = kwargs.get("json_body")
+    """
+    Wraps a REST client method called with keyword arguments. A json_body is
+    serialized once and handed to the method as its data argument, so the bytes
+    sent and counted are the same. Reads and decodes the response once, logging both ends, and reports
+    the call to the client's rest_stats when it has one.
+    """
+    async def request_with_stats_wrapper(*args, json_body=None, **kwargs):
         if json_body is not None:
-            request_message = (
-                request_message
-                + f"sending {url} request with {clean_dictionary_for_logging(json_body)}"
+            kwargs["data"] = json.dumps(json_body).encode()
+        rest_stats = getattr(args[0], "rest_stats", None)
+        if rest_stats is None:
+            return await request_with_logging_wrapper(*args, json_body=json_body, **kwargs)
+        client = getattr(args[0], "stats_client", type(args[0]).__name__.lower())
+        url = kwargs["url"]
+        bytes_sent = len(kwargs.get("data") or b"")
+        await rest_stats.request_started(client, url)
+        started = time.perf_counter()
+        try:
+            decoded = await request_with_logging_wrapper(*args, json_body=json_body, **kwargs)
+        except Exception as error:
+            # a session with raise_for_status fails with the response's status
+            await rest_stats.request_ended(
+                client,
+                url,
+                getattr(error, "status", None),
+                time.perf_counter() - started,
+                bytes_sent,
+                error=error,
             )
-        _LOGGER.debug(request_message)
-        response = await func(*args, **kwargs)
-        _LOGGER.debug(
-            f"response headers:{clean_dictionary_for_logging(response.headers)}"
+            raise
+        await rest_stats.request_ended(
+            client, url, decoded.status, time.perf_counter() - started, bytes_sent, len(decoded.body)
         )
-        try:
-            response_json = await response.json()
+        return decoded
+
+    async def request_with_logging_wrapper(*args, json_body=None, **kwargs):
+        # redacting bodies for logging walks the whole payload, only do it when
+        # the debug output is actually going somewhere
+        debug = _LOGGER.isEnabledFor(logging.DEBUG)
+        url = kwargs["url"]
+        if debug:
+            request_message = f"sending {url} request"
+            headers = kwargs.get("headers")
+            if headers is not None:
+                request_message = request_message + f"headers: {headers}"
+            if json_body is not None:
+                request_message = (
+                    request_message
+                    + f"sending {url} request with {clean_dictionary_for_logging(json_body)}"
+                )
+            _LOGGER.debug(request_message)
+        response = await func(*args, **kwargs)
+        body = await response.read()
+        response_json = decode_json_body(body)
+        if debug:
             _LOGGER.debug(
-                f"response json: {clean_dictionary_for_logging(response_json)}"
+                "response headers:%s", clean_dictionary_for_logging(response.headers)
             )
-        except Exception:
-            response_text = await response.text()
-            _LOGGER.debug(f"response raw: {response_text}")
-        return response
+            if isinstance(response_json, dict):
+                _LOGGER.debug(
+                    "response json: %s", clean_dictionary_for_logging(response_json)
+                )
+            else:
+                _LOGGER.debug("response raw: %s", body.decode("utf-8", errors="replace"))
+        return DecodedResponse(response, body, response_json)
 
-    return request_with_logging_wrapper
+    return request_with_stats_wrapper
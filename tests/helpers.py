@@ -0,0 +1,17 @@
+from concurrent.futures import Future
+
+from awsiot.iotshadow import ShadowState, UpdateShadowResponse
+
+
+def done_future(result=None) -> Future:
+    """A future that is already completed, like an instantly acknowledged MQTT call."""
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def report_state(device, version, reported):
+    """Delivers reported state to device as an accepted shadow update."""
+    device._on_update_shadow_accepted(
+        UpdateShadowResponse(version=version, state=ShadowState(reported=reported))
+    )
@@ -0,0 +1,254 @@
+import asyncio
+import threading
+import unittest
+
+from hatch_rest_api.callbacks import OVERFLOW_DROP
+from hatch_rest_api.const import RIoTAudioTrack
+from hatch_rest_api.rest_baby import RestBaby
+from hatch_rest_api.rest_iot import RestIot
+from hatch_rest_api.rest_mini import RestMini
+from hatch_rest_api.rest_plus import RestPlus
+from hatch_rest_api.restore_iot import RestoreIot
+from hatch_rest_api.restore_v5 import RestoreV5
+
+from helpers import report_state
+
+
+class ChangeNotificationTest(unittest.TestCase):
+    def setUp(self):
+        self.device = RestIot("Nursery", "thing-1", "AA", None, subscribe=False)
+        self.changes = []
+        self.plain_calls = 0
+
+        def plain():
+            self.plain_calls += 1
+
+        self.plain = plain
+        self.device.register_field_callback(self.changes.append)
+        self.device.register_callback(plain)
+
+    def test_callbacks_receive_changed_attribute_names(self):
+        report_state(self.device, 1, {"connected": True, "current": {"sound": {"v": 65535}}})
+
+        self.assertEqual(self.changes, [frozenset({"is_online", "volume"})])
+        self.assertEqual(self.plain_calls, 1)
+
+    def test_repeated_heartbeats_do_not_notify(self):
+        for version in range(1, 5):
+            report_state(self.device, version, {"connected": True})
+
+        self.assertEqual(self.changes, [frozenset({"is_online"})])
+        self.assertEqual(self.plain_calls, 1)
+
+    def test_derived_attributes_are_included(self):
+        report_state(self.device, 1, {"current": {"sound": {"id": RIoTAudioTrack.Rain.value}}})
+
+        self.assertEqual(self.changes, [frozenset({"sound_id", "audio_track"})])
+        self.assertEqual(self.device.audio_track, RIoTAudioTrack.Rain)
+
+    def test_publish_without_changes_reports_unknown(self):
+        self.device.publish_updates()
+        self.device.publish_updates(set())
+
+        self.assertEqual(self.changes, [None])
+        self.assertEqual(self.plain_calls, 1)
+
+    def test_plain_callbacks_are_called_without_arguments(self):
+        calls = []
+
+        def legacy(*args):
+            calls.append(args)
+
+        self.device.register_callback(legacy, fields={"volume"})
+        report_state(self.device, 1, {"current": {"sound": {"v": 65535}}})
+
+        self.assertEqual(calls, [()])
+
+    def test_removed_callbacks_are_not_called(self):
+        self.device.remove_callback(self.plain)
+        self.device.remove_callback(self.changes.append)
+
+        report_state(self.device, 1, {"connected": True})
+
+        self.assertEqual((self.changes, self.plain_calls), ([], 0))
+
+
+class FieldSubscriptionTest(unittest.TestCase):
+    def setUp(self):
+        self.device = RestIot("Nursery", "thing-1", "AA", None, subscribe=False)
+
+    def test_callbacks_only_wake_for_their_fields(self):
+        battery, volume_or_color = [], []
+        self.device.register_field_callback(battery.append, fields={"battery_level"})
+        self.device.register_field_callback(
+            volume_or_color.append, fields={"volume", "brightness"}
+        )
+
+        report_state(self.device, 1, {"current": {"color": {"r": 65535, "i": 65535}}})
+        report_state(self.device, 2, {"deviceInfo": {"b": 80}})
+        report_state(self.device, 3, {"current": {"sound": {"v": 65535}, "color": {"i": 0}}})
+
+        self.assertEqual(battery, [frozenset({"battery_level"})])
+        self.assertEqual(
+            volume_or_color,
+            [frozenset({"red", "brightness"}), frozenset({"volume", "brightness"})],
+        )
+
+    def test_unknown_changes_wake_everyone(self):
+        calls = []
+        self.device.register_field_callback(calls.append, fields={"battery_level"})
+
+        self.device.publish_updates()
+
+        self.assertEqual(calls, [None])
+
+    def test_reregistering_replaces_the_fields(self):
+        calls = []
+        self.device.register_field_callback(calls.append, fields={"battery_level"})
+        self.device.register_field_callback(calls.append, fields={"volume"})
+
+        report_state(self.device, 1, {"deviceInfo": {"b": 80}})
+        self.assertEqual(calls, [])
+        self.device.remove_callback(calls.append)
+
+        self.assertEqual(self.device._field_callbacks, {})
+        report_state(self.device, 2, {"current": {"sound": {"v": 65535}}})
+        self.assertEqual(calls, [])
+
+
+    def test_properties_wake_for_the_attributes_they_read(self):
+        calls = []
+        self.device.register_field_callback(calls.append, fields={"is_on"})
+
+        report_state(self.device, 1, {"deviceInfo": {"b": 80}})
+        report_state(self.device, 2, {"current": {"color": {"id": 3}}})
+
+        self.assertEqual(calls, [frozenset({"color_id"})])
+        self.assertTrue(self.device.is_on)
+
+    def test_unknown_fields_raise(self):
+        calls = []
+        self.device.register_callback(calls.append, fields={"volume"})
+
+        with self.assertRaises(ValueError):
+            self.device.register_callback(calls.append, fields={"volume", "is_onn"})
+
+        self.assertEqual(self.device._callback_fields, {calls.append: {"volume"}})
+
+    def test_metadata_fields_are_accepted(self):
+        self.device.register_callback(print, fields={"favorites", "sounds", "alarms"})
+
+    def test_property_fields_name_properties_and_state(self):
+        for cls in (RestBaby, RestIot, RestMini, RestPlus, RestoreIot, RestoreV5):
+            for name, attributes in cls.property_fields.items():
+                with self.subTest(cls=cls.__name__, property=name):
+                    self.assertIsInstance(getattr(cls, name), property)
+                    self.assertLessEqual(set(attributes), set(cls.state_record.__slots__))
+
+
+class RestPlusChangeTest(unittest.TestCase):
+    def test_brightness_forced_back_to_zero_is_not_a_change(self):
+        device = RestPlus("Nursery", "thing-1", "AA", None, subscribe=False)
+        changes = []
+        device.register_field_callback(changes.append)
+        report_state(device, 1, {"c": {"r": 0, "g": 0, "b": 0, "i": 0}})
+
+        report_state(device, 2, {"c": {"i": 30000}})
+
+        self.assertEqual(device.brightness, 0)
+        self.assertEqual(changes, [frozenset({"red", "green", "blue", "brightness"})])
+
+
+class CallbackLoopTest(unittest.TestCase):
+    def setUp(self):
+        self.device = RestIot("Nursery", "thing-1", "AA", None, subscribe=False)
+
+    def test_shadow_thread_hands_off_to_the_loop(self):
+        seen = []
+
+        async def on_update(changed):
+            seen.append((changed, threading.current_thread()))
+
+        self.device.register_field_callback(on_update)
+
+        async def run():
+            self.device.set_callback_loop(asyncio.get_running_loop())
+            shadow_thread = threading.Thread(
+                target=report_state, args=(self.device, 1, {"connected": True})
+            )
+            shadow_thread.start()
+            shadow_thread.join()
+            for _ in range(10):
+                await asyncio.sleep(0.01)
+            return threading.current_thread()
+
+        loop_thread = asyncio.run(run())
+
+        self.assertEqual(seen, [(frozenset({"is_online"}), loop_thread)])
+
+    def test_full_queue_merges_into_the_newest_update(self):
+        calls = []
+        self.device.register_field_callback(calls.append)
+
+        async def run():
+            self.device.set_callback_loop(asyncio.get_running_loop(), max_pending=2)
+            for changed in ({"volume"}, {"red"}, {"green"}, {"blue"}):
+                self.device.publish_updates(changed)
+            await asyncio.sleep(0.01)
+
+        asyncio.run(run())
+
+        self.assertEqual(
+            calls, [frozenset({"volume"}), frozenset({"red", "green", "blue"})]
+        )
+
+    def test_full_queue_drops_the_oldest_update(self):
+        calls = []
+        self.device.register_field_callback(calls.append)
+
+        async def run():
+            self.device.set_callback_loop(
+                asyncio.get_running_loop(), max_pending=2, overflow=OVERFLOW_DROP
+            )
+            for changed in ({"volume"}, {"red"}, {"green"}):
+                self.device.publish_updates(changed)
+            await asyncio.sleep(0.01)
+
+        asyncio.run(run())
+
+        self.assertEqual(calls, [frozenset({"red"}), frozenset({"green"})])
+
+    def test_failing_callbacks_do_not_stop_the_others(self):
+        calls = []
+
+        def failing():
+            raise ValueError("boom")
+
+        self.device.register_callback(failing)
+        self.device.register_field_callback(calls.append)
+
+        async def run():
+            self.device.set_callback_loop(asyncio.get_running_loop())
+            self.device.publish_updates({"volume"})
+            await asyncio.sleep(0.01)
+
+        with self.assertLogs("hatch_rest_api.callbacks", "ERROR"):
+            asyncio.run(run())
+        self.assertEqual(calls, [frozenset({"volume"})])
+
+    def test_coroutine_callback_without_loop_warns(self):
+        async def on_update():
+            raise AssertionError("should not run")
+
+        self.device.register_callback(on_update)
+
+        with self.assertLogs("hatch_rest_api.callbacks", "WARNING"):
+            self.device.publish_updates({"volume"})
+
+    def test_unknown_overflow_policy(self):
+        with self.assertRaises(ValueError):
+            self.device.set_callback_loop(None, overflow="block")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+import asyncio
+import threading
+import unittest
+
+from awscrt import mqtt
+from awsiot.iotshadow import IotShadowClient
+
+from hatch_rest_api.connection_supervisor import ConnectionSupervisor
+from hatch_rest_api.fake_shadow import FakeShadowConnection
+from hatch_rest_api.rest_iot import RestIot
+from hatch_rest_api.shadow_fleet import FLEET_TOPICS, ShadowFleetDispatcher
+
+
+class FakeDevice:
+    shadow_fleet = None
+
+    def __init__(self, name, error=None, subscribe_error=None):
+        self.device_name = name
+        self.error = error
+        self.subscribe_error = subscribe_error
+        self.subscribes = 0
+        self.refreshes = 0
+
+    async def async_subscribe(self, refresh=True):
+        self.subscribes += 1
+        if self.subscribe_error is not None:
+            raise self.subscribe_error
+        if refresh:
+            await self.async_refresh()
+
+    async def async_refresh(self):
+        self.refreshes += 1
+        if self.error is not None:
+            raise self.error
+
+
+class RejectingShadowConnection(FakeShadowConnection):
+    """Answers subscriptions to the rejected thing's topics with SUBACK 0x80."""
+
+    def __init__(self, rejected_thing: str):
+        super().__init__()
+        self.rejected_thing = rejected_thing
+
+    def subscribe(self, topic, qos, callback=None):
+        subscribed_future, packet_id = super().subscribe(topic, qos, callback)
+        if f"/{self.rejected_thing}/" in topic:
+            subscribed_future.add_done_callback(lambda future: future.result().update(qos=None))
+        return subscribed_future, packet_id
+
+
+class ConnectionSupervisorTest(unittest.TestCase):
+    def test_session_present_only_forwards_callback(self):
+        calls = []
+        device = FakeDevice("Nursery")
+
+        async def run():
+            supervisor = ConnectionSupervisor(
+                asyncio.get_running_loop(),
+                on_connection_resumed=lambda **kwargs: calls.append(kwargs),
+            )
+            supervisor.devices = [device]
+            supervisor.on_connection_resumed(None, 0, True)
+            await asyncio.sleep(0.01)
+
+        asyncio.run(run())
+
+        self.assertEqual(calls[0]["session_present"], True)
+        self.assertEqual((device.subscribes, device.refreshes), (0, 0))
+
+    def test_lost_session_resubscribes_and_refreshes_every_device(self):
+        devices = [
+            FakeDevice("Nursery", subscribe_error=mqtt.SubscribeError("a")),
+            FakeDevice("Kitchen", TimeoutError()),
+            FakeDevice("Den"),
+        ]
+
+        async def run():
+            supervisor = ConnectionSupervisor(asyncio.get_running_loop(), resync_jitter=0.01)
+            supervisor.devices = devices
+            # resumes are reported from the awscrt thread
+            thread = threading.Thread(
+                target=supervisor.on_connection_resumed, args=(None, 0, False)
+            )
+            thread.start()
+            thread.join()
+            await asyncio.wrap_future(supervisor._resync)
+
+        with self.assertLogs("hatch_rest_api.connection_supervisor", "WARNING") as logs:
+            asyncio.run(run())
+
+        self.assertEqual([device.subscribes for device in devices], [1, 1, 1])
+        self.assertEqual([device.refreshes for device in devices], [1, 1, 1])
+        self.assertIn("resubscribe Nursery", logs.output[0])
+        self.assertIn("refresh Kitchen", logs.output[1])
+
+    def test_callback_errors_do_not_stop_the_resync(self):
+        def failing_callback(**kwargs):
+            raise ValueError("boom")
+
+        device = FakeDevice("Nursery")
+
+        async def run():
+            supervisor = ConnectionSupervisor(
+                asyncio.get_running_loop(), failing_callback, resync_jitter=0
+            )
+            supervisor.devices = [device]
+            supervisor.on_connection_resumed(None, 0, False)
+            await asyncio.wrap_future(supervisor._resync)
+
+        with self.assertLogs("hatch_rest_api.connection_supervisor", "ERROR"):
+            asyncio.run(run())
+
+        self.assertEqual(device.refreshes, 1)
+
+
+class ResubscribeTest(unittest.TestCase):
+    def _resync(self, connection, devices):
+        async def run():
+            supervisor = ConnectionSupervisor(asyncio.get_running_loop(), resync_jitter=0)
+            supervisor.devices = devices
+            # the broker forgot the session
+            connection._subscriptions.clear()
+            connection.resubscribe_existing_topics = None
+            await supervisor.resync()
+
+        asyncio.run(run())
+
+    def _devices(self, connection, count, **options):
+        shadow_client = IotShadowClient(connection)
+        return [
+            RestIot(f"Device {index}", f"thing-{index}", str(index), shadow_client, subscribe=False, **options)
+            for index in range(count)
+        ]
+
+    def test_every_device_subscribes_its_own_topics(self):
+        connection = FakeShadowConnection()
+        self.addCleanup(connection.close)
+        devices = self._devices(connection, 10)
+
+        self._resync(connection, devices)
+
+        self.assertEqual(len(connection._subscriptions), 30)
+        self.assertIn("$aws/things/thing-9/shadow/update/delta", connection._subscriptions)
+
+    def test_fleet_subscribes_its_wildcards_again(self):
+        connection = FakeShadowConnection()
+        self.addCleanup(connection.close)
+        fleet = ShadowFleetDispatcher(connection)
+        devices = self._devices(connection, 10)
+        for device in devices:
+            device.shadow_fleet = fleet
+            fleet.register(device)
+
+        self._resync(connection, devices)
+
+        self.assertEqual(sorted(connection._subscriptions), sorted(FLEET_TOPICS))
+
+    def test_rejected_subscriptions_are_reported_per_device(self):
+        connection = RejectingShadowConnection("thing-1")
+        self.addCleanup(connection.close)
+        devices = self._devices(connection, 3)
+
+        with self.assertLogs("hatch_rest_api.connection_supervisor", "WARNING") as logs:
+            self._resync(connection, devices)
+
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("resubscribe Device 1", logs.output[0])
+        self.assertIn("SubscribeError", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
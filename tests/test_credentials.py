@@ -0,0 +1,145 @@
+import asyncio
+import time
+import unittest
+
+from hatch_rest_api.credentials import CredentialRefresher
+from hatch_rest_api.errors import AuthError
+
+from helpers import done_future
+
+
+def _cognito_credentials(key: str, expires_in: float) -> dict:
+    return {
+        "Credentials": {
+            "AccessKeyId": key,
+            "SecretKey": "secret",
+            "SessionToken": "session",
+            "Expiration": time.time() + expires_in,
+        }
+    }
+
+
+class FakeHatch:
+    def __init__(self, valid_token="auth-token"):
+        self.valid_token = valid_token
+        self.token_calls = 0
+
+    async def token(self, auth_token):
+        self.token_calls += 1
+        if auth_token != self.valid_token:
+            raise AuthError
+        return {"region": "us-east-1", "identityId": "identity-1", "token": "aws-token"}
+
+
+class FakeAwsHttp:
+    def __init__(self, *credentials):
+        self.credentials = list(credentials)
+
+    async def aws_credentials(self, **kwargs):
+        return self.credentials.pop(0)
+
+
+class FakeMqttConnection:
+    def __init__(self, session_present: bool = True):
+        self.session_present = session_present
+        self.calls = []
+
+    def disconnect(self):
+        self.calls.append("disconnect")
+        return done_future()
+
+    def connect(self):
+        self.calls.append("connect")
+        return done_future({"session_present": self.session_present})
+
+
+def _refresher(aws_http, expires_in: float, refresh_margin: float = 300) -> CredentialRefresher:
+    return CredentialRefresher(
+        FakeHatch(),
+        aws_http,
+        "auth-token",
+        {"region": "us-east-1", "identityId": "identity-1", "token": "aws-token"},
+        _cognito_credentials("first", expires_in),
+        refresh_margin=refresh_margin,
+    )
+
+
+class CredentialRefresherTest(unittest.TestCase):
+    def test_provider_hands_out_refreshed_credentials(self):
+        refresher = _refresher(FakeAwsHttp(_cognito_credentials("second", 3600)), 3600)
+        self.assertEqual(
+            refresher.provider.get_credentials().result(5).access_key_id, "first"
+        )
+
+        asyncio.run(refresher.refresh())
+
+        self.assertEqual(refresher.api.token_calls, 1)
+        self.assertEqual(
+            refresher.provider.get_credentials().result(5).access_key_id, "second"
+        )
+        self.assertGreater(refresher.seconds_until_refresh(), 3000)
+
+    def test_refresh_is_scheduled_ahead_of_expiration(self):
+        refresher = _refresher(FakeAwsHttp(), 3600, refresh_margin=600)
+
+        self.assertAlmostEqual(refresher.seconds_until_refresh(), 3000, delta=5)
+        self.assertEqual(_refresher(FakeAwsHttp(), 60).seconds_until_refresh(), 0)
+
+    def test_run_refreshes_and_reconnects_the_same_connection(self):
+        refresher = _refresher(FakeAwsHttp(_cognito_credentials("second", 3600)), 0.05, 0)
+        connection = FakeMqttConnection()
+
+        async def run():
+            task = asyncio.ensure_future(refresher.run(connection))
+            while len(connection.calls) < 2:
+                await asyncio.sleep(0.01)
+            task.cancel()
+
+        asyncio.run(asyncio.wait_for(run(), 5))
+
+        self.assertEqual(connection.calls, ["disconnect", "connect"])
+        self.assertEqual(refresher.provider.get_credentials().result(5).access_key_id, "second")
+
+
+    def test_lost_session_after_reconnect_is_reported(self):
+        refresher = _refresher(FakeAwsHttp(), 3600)
+        refresher.mqtt_connection = FakeMqttConnection(session_present=False)
+        lost = []
+
+        async def on_session_lost():
+            lost.append(True)
+
+        refresher.on_session_lost = on_session_lost
+        asyncio.run(refresher.reconnect())
+
+        self.assertEqual(lost, [True])
+
+    def test_rejected_auth_token_logs_in_again(self):
+        refresher = _refresher(FakeAwsHttp(_cognito_credentials("second", 3600)), 3600)
+        refresher.api = FakeHatch(valid_token="new-auth-token")
+
+        async def relogin():
+            return "new-auth-token"
+
+        refresher.relogin = relogin
+        asyncio.run(refresher.refresh())
+
+        self.assertEqual(refresher.auth_token, "new-auth-token")
+        self.assertEqual(refresher.api.token_calls, 2)
+        self.assertEqual(refresher.provider.get_credentials().result(5).access_key_id, "second")
+
+    def test_run_stops_when_the_login_is_rejected(self):
+        refresher = _refresher(FakeAwsHttp(), 0, 0)
+        refresher.api = FakeHatch(valid_token="new-auth-token")
+
+        with (
+            self.assertLogs("hatch_rest_api.credentials", "ERROR"),
+            self.assertRaises(AuthError),
+        ):
+            asyncio.run(asyncio.wait_for(refresher.run(FakeMqttConnection()), 5))
+
+        self.assertEqual(refresher.api.token_calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
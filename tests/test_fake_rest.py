@@ -0,0 +1,116 @@
+import asyncio
+import unittest
+
+from aiohttp import ClientSession
+
+from hatch_rest_api.aws_http import AwsHttp
+from hatch_rest_api.contentful import Contentful
+from hatch_rest_api.errors import RateError
+from hatch_rest_api.fake_rest import FakeHatchServer, fake_iot_devices
+from hatch_rest_api.fake_shadow import FakeShadowConnection
+from hatch_rest_api.hatch import Hatch
+from hatch_rest_api.rest_iot import RestIot
+from hatch_rest_api.restore_v5 import RestoreV5
+from hatch_rest_api.util_bootstrap import get_rest_devices
+
+
+class FakeHatchServerTest(unittest.TestCase):
+    def _run(self, test, **server_options):
+        async def run():
+            async with (
+                FakeHatchServer(fake_iot_devices(2), **server_options) as server,
+                ClientSession() as session,
+            ):
+                return await test(server, session)
+
+        return asyncio.run(run())
+
+    def test_rest_clients_follow_the_base_urls(self):
+        async def test(server, session):
+            api = Hatch(session, base_url=server.api_url)
+            token = await api.login(email="user@example.com", password="password")
+            devices = await api.iot_devices(auth_token=token)
+            favorites = await api.favorites(auth_token=token, mac=devices[0]["macAddress"])
+            sounds = await Contentful(session, base_url=server.contentful_url).graphql_query("query")
+            credentials = await AwsHttp(session, base_url=server.cognito_url).aws_credentials(
+                region="us-east-1", identityId="identity", aws_token="token"
+            )
+            return server, devices, favorites, sounds, credentials
+
+        server, devices, favorites, sounds, credentials = self._run(test)
+
+        self.assertEqual([device["product"] for device in devices], ["riot", "restoreV5"])
+        self.assertEqual(len(favorites), 2)
+        self.assertEqual(len(sounds["soundCollection"]["items"]), 20)
+        self.assertIn("SessionToken", credentials["Credentials"])
+        self.assertEqual(server.request_counts["/service/app/routine/v2/fetch"], 1)
+
+    def test_injected_429s_are_retried_then_raised(self):
+        async def test(server, session):
+            api = Hatch(session, base_url=server.api_url)
+            with self.assertRaises(RateError) as raised:
+                await api.content(auth_token="token", product="riot", content=["sound"], max_retries=2)
+            return server, raised.exception
+
+        server, error = self._run(test, rate_limit=1.0, retry_after=0)
+
+        self.assertEqual(server.throttled["/service/app/content/v1/fetchByProduct"], 3)
+        self.assertEqual(error.retry_after, 0)
+
+    def test_default_session_retries_429s(self):
+        async def test():
+            async with FakeHatchServer(fake_iot_devices(2), rate_limit=1.0, retry_after=0) as server:
+                api = Hatch(base_url=server.api_url)
+                try:
+                    with self.assertRaises(RateError):
+                        await api.content(auth_token="token", product="riot", content=["sound"], max_retries=2)
+                finally:
+                    await api.cleanup_client_session()
+                return server
+
+        server = asyncio.run(test())
+
+        self.assertEqual(server.throttled["/service/app/content/v1/fetchByProduct"], 3)
+
+    def test_alarm_edits_are_confirmed(self):
+        async def test(server, session):
+            api = Hatch(session, base_url=server.api_url)
+            mac = fake_iot_devices(2)[1]["macAddress"]
+            alarms = await api.scheduled_routines(auth_token="token", mac=mac, types=["alarm"])
+            return server, await api.update_scheduled_routine_alarm_enabled(
+                auth_token="token", mac=mac, alarm=alarms[0], enabled=False
+            )
+
+        server, alarms = self._run(test)
+
+        self.assertEqual([alarm["enabled"] for alarm in alarms], [False])
+        self.assertEqual(server.request_counts["/service/app/v2/dataVersion"], 1)
+
+    def test_bootstrap_runs_against_the_fakes(self):
+        connection = FakeShadowConnection(seed=1)
+        self.addCleanup(connection.close)
+        for device in fake_iot_devices(2):
+            connection.add_thing(device["thingName"], reported={"connected": True})
+
+        async def test(server, session):
+            _, mqtt_connection, devices, _ = await get_rest_devices(
+                "user@example.com",
+                "password",
+                client_session=session,
+                api_url=server.api_url,
+                contentful_url=server.contentful_url,
+                cognito_url=server.cognito_url,
+                mqtt_connection=connection,
+            )
+            return mqtt_connection, devices
+
+        mqtt_connection, devices = self._run(test)
+
+        self.assertIs(mqtt_connection, connection)
+        self.assertEqual([type(device) for device in devices], [RestIot, RestoreV5])
+        self.assertEqual(len(devices[1].alarms), 1)
+        self.assertEqual(len(devices[0].sounds), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
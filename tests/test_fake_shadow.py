@@ -0,0 +1,121 @@
+import asyncio
+import json
+import threading
+import unittest
+
+from awsiot.iotshadow import IotShadowClient
+
+from hatch_rest_api.fake_shadow import FakeShadowConnection, shadow_delta, topic_matches
+from hatch_rest_api.rest_iot import RestIot
+from hatch_rest_api.shadow_fleet import ShadowFleetDispatcher
+
+REPORTED = {"connected": True, "current": {"playing": "none", "sound": {"id": 10137, "v": 0}}}
+
+
+class FakeShadowConnectionTest(unittest.TestCase):
+    def setUp(self):
+        self.connection = FakeShadowConnection(latency=0.001, seed=1)
+        self.addCleanup(self.connection.close)
+        self.connection.add_thing("thing-1", reported=REPORTED)
+
+    def _device(self, **kwargs) -> RestIot:
+        return RestIot(
+            "Nursery", "thing-1", "AA", IotShadowClient(self.connection),
+            subscribe=False, **kwargs,
+        )
+
+    def _wait_for_update(self, device) -> threading.Event:
+        updated = threading.Event()
+        device.register_callback(updated.set)
+        return updated
+
+    def test_subscribe_applies_the_shadow(self):
+        device = self._device()
+        updated = self._wait_for_update(device)
+
+        asyncio.run(device.async_subscribe())
+
+        self.assertTrue(updated.wait(1))
+        self.assertIs(device.is_online, True)
+        self.assertEqual(device.document_version, 1)
+
+    def test_setter_converges_once_the_device_reports(self):
+        device = self._device(track_convergence=True)
+
+        async def run():
+            await device.async_subscribe()
+            converged = await device.async_update({"current": {"sound": {"v": 65535}}})
+            return await asyncio.wait_for(converged, 1)
+
+        version = asyncio.run(run())
+
+        self.assertEqual(version, 3)
+        self.assertEqual(device.volume, 100)
+        self.assertEqual(self.connection.shadow("thing-1")["reported"]["current"]["sound"]["v"], 65535)
+
+    def test_unreported_desired_state_arrives_as_delta(self):
+        self.connection.device_latency = None
+        device = self._device()
+
+        async def run():
+            await device.async_subscribe()
+            await device.async_update({"current": {"sound": {"v": 65535}}})
+            await asyncio.sleep(0.05)
+
+        asyncio.run(run())
+
+        self.assertEqual(device.pending_changes, {"current.sound.v": 65535})
+        self.assertEqual(device.volume, 0)
+
+    def test_fleet_wildcards_route_by_thing_name(self):
+        device = self._device()
+        device.shadow_fleet = ShadowFleetDispatcher(self.connection)
+        updated = self._wait_for_update(device)
+        asyncio.run(device.async_subscribe())
+        self.assertTrue(updated.wait(1))
+        updated.clear()
+
+        self.connection.report("thing-1", {"connected": False})
+
+        self.assertTrue(updated.wait(1))
+        self.assertIs(device.is_online, False)
+
+    def test_loss_drops_messages_to_subscribers(self):
+        self.connection.loss = 1.0
+        device = self._device()
+
+        asyncio.run(device.async_subscribe())
+
+        self.assertEqual(device.document_version, -1)
+        self.assertEqual(self.connection.delivered, 0)
+
+    def test_unknown_thing_is_rejected(self):
+        rejected = threading.Event()
+        messages = []
+
+        def on_rejected(topic, payload, **kwargs):
+            messages.append(json.loads(payload))
+            rejected.set()
+
+        self.connection.subscribe("$aws/things/+/shadow/get/rejected", 1, on_rejected)
+        self.connection.publish("$aws/things/missing/shadow/get", "{}", 1)
+
+        self.assertTrue(rejected.wait(1))
+        self.assertEqual(messages[0]["code"], 404)
+
+
+class ShadowHelpersTest(unittest.TestCase):
+    def test_topic_matches_wildcards(self):
+        self.assertTrue(topic_matches("$aws/things/+/shadow/get/accepted", "$aws/things/a/shadow/get/accepted"))
+        self.assertTrue(topic_matches("$aws/things/#", "$aws/things/a/shadow/update/delta"))
+        self.assertFalse(topic_matches("$aws/things/+/shadow/get", "$aws/things/a/shadow/get/accepted"))
+
+    def test_delta_only_keeps_unreported_leaves(self):
+        self.assertEqual(
+            shadow_delta({"a": 1, "b": {"c": 2, "d": 3}}, {"a": 1, "b": {"c": 2}}),
+            {"b": {"d": 3}},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import unittest
+
+from aiohttp import ClientError
+
+from hatch_rest_api.errors import RateError
+from hatch_rest_api.hatch import Hatch
+from hatch_rest_api.rate_limit import RateLimiter
+
+
+class FakeResponse:
+    def __init__(self, url: str, body: bytes, status: int = 200, headers=None):
+        self.url = url
+        self.status = status
+        self.headers = headers or {}
+        self._body = body
+        self.reads = 0
+
+    async def read(self):
+        self.reads += 1
+        return self._body
+
+    async def json(self):
+        raise AssertionError("response bodies are decoded once by the pipeline")
+
+    async def text(self):
+        raise AssertionError("response bodies are decoded once by the pipeline")
+
+
+class FakeSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    async def get(self, url: str, headers: dict, params: dict):
+        self.calls.append(("GET", url, params))
+        return self.responses.pop(0)
+
+    async def post(self, url: str, data: bytes, headers: dict):
+        self.calls.append(("POST", url, json.loads(data)))
+        return self.responses.pop(0)
+
+
+def _json_response(payload: dict, status: int = 200) -> FakeResponse:
+    return FakeResponse("https://example", json.dumps(payload).encode(), status)
+
+
+class HatchResponsePipelineTest(unittest.TestCase):
+    def test_body_is_read_once_and_payload_returned(self):
+        response = _json_response({"status": "success", "payload": {"id": 7}})
+        api = Hatch(client_session=FakeSession(response))
+
+        member = asyncio.run(api.member(auth_token="token"))
+
+        self.assertEqual(member, {"id": 7})
+        self.assertEqual(response.reads, 1)
+
+    def test_login_returns_token(self):
+        api = Hatch(
+            client_session=FakeSession(
+                _json_response({"status": "success", "token": "abc"})
+            )
+        )
+
+        self.assertEqual(
+            asyncio.run(api.login(email="user@example.com", password="hunter2")),
+            "abc",
+        )
+
+    def test_invalid_json_raises_client_error(self):
+        api = Hatch(
+            client_session=FakeSession(FakeResponse("https://example", b"<html>"))
+        )
+
+        with self.assertRaisesRegex(ClientError, "Invalid response format"):
+            asyncio.run(api.token(auth_token="token"))
+
+    def test_rate_limit_raises_rate_error(self):
+        api = Hatch(client_session=FakeSession(_json_response({}, status=429)))
+
+        with self.assertRaises(RateError):
+            asyncio.run(api.iot_devices(auth_token="token"))
+
+    def test_content_retry_honors_retry_after(self):
+        limited = FakeResponse(
+            "https://example", b"{}", status=429, headers={"Retry-After": "0.05"}
+        )
+        session = FakeSession(
+            limited, _json_response({"status": "success", "payload": ["rain"]})
+        )
+        limiter = RateLimiter()
+        api = Hatch(client_session=session, rate_limiter=limiter)
+
+        async def run():
+            start = asyncio.get_running_loop().time()
+            payload = await api.content("token", "riot", ["sound"])
+            return payload, asyncio.get_running_loop().time() - start
+
+        payload, elapsed = asyncio.run(run())
+
+        self.assertEqual(payload, ["rain"])
+        self.assertEqual(len(session.calls), 2)
+        self.assertGreaterEqual(elapsed, 0.04)
+
+
+    def test_content_retry_without_a_limiter_sleeps_itself(self):
+        limited = FakeResponse(
+            "https://example", b"{}", status=429, headers={"Retry-After": "0.05"}
+        )
+        session = FakeSession(
+            limited, _json_response({"status": "success", "payload": ["rain"]})
+        )
+        api = Hatch(client_session=session)
+
+        async def run():
+            start = asyncio.get_running_loop().time()
+            payload = await api.content("token", "riot", ["sound"])
+            return payload, asyncio.get_running_loop().time() - start
+
+        payload, elapsed = asyncio.run(run())
+
+        self.assertIsNone(api.rate_limiter)
+        self.assertEqual(payload, ["rain"])
+        self.assertGreaterEqual(elapsed, 0.04)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+from hatch_rest_api.metrics import Histogram, InMemoryMetricsSink, prometheus_text
+
+
+class InMemoryMetricsSinkTest(unittest.TestCase):
+    def setUp(self):
+        self.sink = InMemoryMetricsSink(buckets=(0.1, 1.0))
+
+    def test_histograms_are_kept_per_label_set(self):
+        self.sink.observe("latency", 0.05, {"command": "set_color", "thing_name": "a"})
+        self.sink.observe("latency", 0.1, {"thing_name": "a", "command": "set_color"})
+        self.sink.observe("latency", 5.0, {"command": "set_color", "thing_name": "b"})
+
+        histogram = self.sink.histogram("latency", command="set_color", thing_name="a")
+
+        self.assertEqual((histogram.count, histogram.counts), (2, [2, 0, 0]))
+        self.assertAlmostEqual(histogram.sum, 0.15)
+        self.assertEqual(self.sink.histogram("latency", command="set_color", thing_name="b").counts, [0, 0, 1])
+        self.assertIsNone(self.sink.histogram("latency", command="set_volume", thing_name="a"))
+
+    def test_counters_add_up(self):
+        self.sink.increment("timeouts", {"command": "set_color"})
+        self.sink.increment("timeouts", {"command": "set_color"}, 2)
+
+        self.assertEqual(self.sink.counter("timeouts", command="set_color"), 3)
+        self.assertEqual(self.sink.counter("timeouts", command="set_volume"), 0)
+
+    def test_snapshot_is_a_copy(self):
+        self.sink.observe("latency", 0.5, {})
+        snapshot = self.sink.snapshot()
+        self.sink.observe("latency", 0.5, {})
+
+        self.assertEqual(snapshot["latency"][()].count, 1)
+
+
+class PrometheusTextTest(unittest.TestCase):
+    def test_renders_histograms_and_counters(self):
+        sink = InMemoryMetricsSink(buckets=(0.1, 1.0))
+        sink.observe("latency_seconds", 0.5, {"command": 'say "hi"'})
+        sink.increment("timeouts_total", {"command": "set_color"})
+
+        text = prometheus_text(sink, {"latency_seconds": "Latency."})
+
+        self.assertEqual(
+            text,
+            "# HELP latency_seconds Latency.\n"
+            "# TYPE latency_seconds histogram\n"
+            'latency_seconds_bucket{command="say \\"hi\\"",le="0.1"} 0\n'
+            'latency_seconds_bucket{command="say \\"hi\\"",le="1.0"} 1\n'
+            'latency_seconds_bucket{command="say \\"hi\\"",le="+Inf"} 1\n'
+            'latency_seconds_sum{command="say \\"hi\\""} 0.5\n'
+            'latency_seconds_count{command="say \\"hi\\""} 1\n'
+            "# TYPE timeouts_total counter\n"
+            'timeouts_total{command="set_color"} 1\n',
+        )
+
+    def test_empty_sink_renders_nothing(self):
+        self.assertEqual(prometheus_text(InMemoryMetricsSink()), "")
+
+    def test_cumulative_buckets(self):
+        histogram = Histogram((1.0, 2.0))
+        for value in (0.5, 1.5, 1.5, 3.0):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.cumulative(), [(1.0, 1), (2.0, 3), (float("inf"), 4)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import asyncio
+import time
+import unittest
+from email.utils import format_datetime
+from datetime import UTC, datetime, timedelta
+
+from hatch_rest_api.rate_limit import RateLimiter, TokenBucket, parse_retry_after
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_burst_is_free_then_paced(self):
+        bucket = TokenBucket(rate=100, burst=3)
+
+        waits = [bucket.try_acquire() for _ in range(4)]
+
+        self.assertEqual(waits[:3], [0.0, 0.0, 0.0])
+        self.assertGreater(waits[3], 0)
+        self.assertLessEqual(waits[3], 0.01)
+
+    def test_acquire_waits_for_refill(self):
+        bucket = TokenBucket(rate=50, burst=1)
+
+        async def run():
+            start = time.monotonic()
+            for _ in range(3):
+                await bucket.acquire()
+            return time.monotonic() - start
+
+        self.assertGreaterEqual(asyncio.run(run()), 0.03)
+
+    def test_block_for_holds_back_callers(self):
+        bucket = TokenBucket(rate=1000, burst=10)
+
+        bucket.block_for(5)
+
+        self.assertGreater(bucket.try_acquire(), 4)
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_buckets_are_per_host(self):
+        limiter = RateLimiter(
+            rate=1, burst=1, host_limits={"graphql.contentful.com": (10, 5)}
+        )
+
+        hatch = limiter.bucket("https://data.hatchbaby.com/service/app/v2/member")
+        self.assertIs(hatch, limiter.bucket("https://data.hatchbaby.com/public/v1/login"))
+        contentful = limiter.bucket("https://graphql.contentful.com/content/v1")
+        self.assertIsNot(hatch, contentful)
+        self.assertEqual((contentful.rate, contentful.burst), (10, 5))
+
+    def test_retry_after_wins_over_backoff(self):
+        limiter = RateLimiter(max_backoff=30)
+
+        self.assertEqual(limiter.retry_delay(1, retry_after=7), 7)
+        self.assertEqual(limiter.retry_delay(1, retry_after=300), 30)
+
+    def test_backoff_is_jittered_within_bounds(self):
+        limiter = RateLimiter(max_backoff=60)
+
+        delays = {limiter.retry_delay(3) for _ in range(20)}
+
+        self.assertTrue(all(4 <= delay <= 8 for delay in delays))
+        self.assertGreater(len(delays), 1)
+
+    def test_throttle_blocks_the_host(self):
+        limiter = RateLimiter()
+
+        limiter.throttle("https://data.hatchbaby.com/x", 1, retry_after=2)
+
+        self.assertGreater(limiter.bucket("https://data.hatchbaby.com/y").try_acquire(), 1)
+        self.assertEqual(limiter.bucket("https://graphql.contentful.com/").try_acquire(), 0)
+
+
+class ParseRetryAfterTest(unittest.TestCase):
+    def test_seconds_and_dates(self):
+        self.assertEqual(parse_retry_after("12"), 12)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+        later = datetime.now(UTC) + timedelta(seconds=30)
+        self.assertAlmostEqual(parse_retry_after(format_datetime(later, usegmt=True)), 30, delta=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
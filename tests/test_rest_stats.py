@@ -0,0 +1,190 @@
+import asyncio
+import json
+import unittest
+
+from aiohttp import ClientResponseError, ClientSession
+
+from hatch_rest_api.aws_http import AwsHttp
+from hatch_rest_api.contentful import Contentful
+from hatch_rest_api.errors import RateError
+from hatch_rest_api.fake_rest import FakeHatchServer, fake_iot_devices
+from hatch_rest_api.fake_shadow import FakeShadowConnection
+from hatch_rest_api.hatch import Hatch
+from hatch_rest_api.metrics import (
+    REST_RATE_LIMITED,
+    REST_REQUEST_SECONDS,
+    REST_REQUESTS,
+    REST_RETRIES,
+    InMemoryMetricsSink,
+)
+from hatch_rest_api.rest_stats import Endpoint, RestStats
+from hatch_rest_api.util_bootstrap import get_rest_devices
+
+IOT_DEVICES = Endpoint("hatch", "/service/app/iotDevice/v2/fetch")
+CONTENT = Endpoint("hatch", "/service/app/content/v1/fetchByProduct")
+
+
+class RestStatsTest(unittest.TestCase):
+    def _run(self, test, **server_options):
+        async def run():
+            async with (
+                FakeHatchServer(fake_iot_devices(2), **server_options) as server,
+                ClientSession() as session,
+            ):
+                return await test(server, session)
+
+        return asyncio.run(run())
+
+    def test_counts_calls_per_endpoint(self):
+        stats = RestStats()
+
+        async def test(server, session):
+            api = Hatch(session, base_url=server.api_url, rest_stats=stats)
+            await api.iot_devices(auth_token="token")
+            await api.iot_devices(auth_token="token")
+            await api.login(email="user@example.com", password="password")
+            await Contentful(session, base_url=server.contentful_url, rest_stats=stats).graphql_query("query")
+            await AwsHttp(session, base_url=server.cognito_url, rest_stats=stats).aws_credentials(
+                region="us-east-1", identityId="identity", aws_token="token"
+            )
+
+        self._run(test)
+        snapshot = stats.snapshot()
+
+        self.assertEqual(
+            set(snapshot),
+            {
+                IOT_DEVICES,
+                Endpoint("hatch", "/public/v1/login"),
+                Endpoint("contentful", "/contentful"),
+                Endpoint("cognito", "/cognito"),
+            },
+        )
+        self.assertEqual(snapshot[IOT_DEVICES].requests, 2)
+        self.assertEqual(snapshot[IOT_DEVICES].statuses, {200: 2})
+        self.assertEqual(snapshot[IOT_DEVICES].latency.count, 2)
+        self.assertGreater(snapshot[IOT_DEVICES].bytes_received, 0)
+        self.assertEqual(snapshot[IOT_DEVICES].bytes_sent, 0)
+        self.assertGreater(snapshot[Endpoint("hatch", "/public/v1/login")].bytes_sent, 0)
+
+    def test_bytes_sent_are_the_serialized_body(self):
+        stats = RestStats()
+
+        async def test(server, session):
+            api = Hatch(session, base_url=server.api_url, rest_stats=stats)
+            await api.login(email="user@example.com", password="password")
+            await Contentful(session, base_url=server.contentful_url, rest_stats=stats).graphql_query("query")
+
+        self._run(test)
+        snapshot = stats.snapshot()
+
+        self.assertEqual(
+            snapshot[Endpoint("hatch", "/public/v1/login")].bytes_sent,
+            len(json.dumps({"email": "user@example.com", "password": "password"}).encode()),
+        )
+        self.assertEqual(
+            snapshot[Endpoint("contentful", "/contentful")].bytes_sent,
+            len(json.dumps({"query": "query", "variables": {}}).encode()),
+        )
+
+    def test_429s_and_retries_reach_the_metrics_sink(self):
+        sink = InMemoryMetricsSink()
+        stats = RestStats(metrics_sink=sink)
+
+        async def test(server, session):
+            api = Hatch(session, base_url=server.api_url, rest_stats=stats)
+            with self.assertRaises(RateError):
+                await api.content(auth_token="token", product="riot", content=["sound"], max_retries=2)
+
+        self._run(test, rate_limit=1.0, retry_after=0)
+        content = stats.snapshot()[CONTENT]
+        labels = CONTENT._asdict()
+
+        self.assertEqual((content.requests, content.rate_limited, content.retries), (3, 3, 2))
+        self.assertEqual(sink.counter(REST_RATE_LIMITED, **labels), 3)
+        self.assertEqual(sink.counter(REST_RETRIES, **labels), 2)
+        self.assertEqual(sink.counter(REST_REQUESTS, status="429", **labels), 3)
+        self.assertEqual(sink.histogram(REST_REQUEST_SECONDS, **labels).count, 3)
+
+    def test_statuses_of_raised_responses_are_counted(self):
+        stats = RestStats()
+
+        async def test(server, session):
+            async with ClientSession(raise_for_status=True) as raising_session:
+                api = Hatch(raising_session, base_url=server.api_url, rest_stats=stats)
+                with self.assertRaises(ClientResponseError):
+                    await api.content(auth_token="token", product="riot", content=["sound"])
+
+        self._run(test, rate_limit=1.0, retry_after=0)
+        content = stats.snapshot()[CONTENT]
+
+        self.assertEqual(
+            (content.errors, content.statuses, content.rate_limited), (0, {429: 1}, 1)
+        )
+
+    def test_hooks_see_every_call(self):
+        stats = RestStats()
+        started = []
+        ended = []
+
+        async def on_request_end(rest_stats, call):
+            ended.append(call)
+
+        stats.on_request_start.append(lambda rest_stats, request: started.append(request))
+        stats.on_request_end.append(on_request_end)
+
+        async def test(server, session):
+            api = Hatch(session, base_url=server.api_url, rest_stats=stats)
+            await api.iot_devices(auth_token="token")
+
+        self._run(test)
+
+        self.assertEqual([request.endpoint for request in started], [IOT_DEVICES])
+        self.assertEqual([(call.endpoint, call.status, call.error) for call in ended], [(IOT_DEVICES, 200, None)])
+
+    def test_failed_requests_are_counted_as_errors(self):
+        stats = RestStats()
+
+        async def test():
+            async with ClientSession() as session:
+                api = Hatch(session, base_url="http://127.0.0.1:1/", rest_stats=stats)
+                with self.assertRaises(OSError):
+                    await api.iot_devices(auth_token="token")
+
+        asyncio.run(test())
+        failed = stats.snapshot()[IOT_DEVICES]
+
+        self.assertEqual((failed.requests, failed.errors, failed.statuses), (1, 1, {}))
+
+    def test_bootstrap_reports_every_stage(self):
+        stats = RestStats()
+        connection = FakeShadowConnection(seed=1)
+        self.addCleanup(connection.close)
+        for device in fake_iot_devices(2):
+            connection.add_thing(device["thingName"], reported={"connected": True})
+
+        async def test(server, session):
+            await get_rest_devices(
+                "user@example.com",
+                "password",
+                client_session=session,
+                api_url=server.api_url,
+                contentful_url=server.contentful_url,
+                cognito_url=server.cognito_url,
+                mqtt_connection=connection,
+                rest_stats=stats,
+            )
+            return server
+
+        server = self._run(test)
+        snapshot = stats.snapshot()
+
+        self.assertEqual(
+            sum(endpoint.requests for endpoint in snapshot.values()),
+            sum(server.request_counts.values()),
+        )
+        self.assertIn(Endpoint("cognito", "/cognito"), snapshot)
+
+
+if __name__ == "__main__":
+    unittest.main()
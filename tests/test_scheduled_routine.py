@@ -1,3 +1,4 @@
+import json
 import unittest
 from datetime import datetime, time
 
@@ -25,6 +26,9 @@ class FakeResponse:
     async def json(self):
         return self._payload
 
+    async def read(self):
+        return json.dumps(self._payload).encode()
+
     async def text(self):
         return str(self._payload)
 
@@ -54,22 +58,23 @@ class FakeSession:
             },
         )
 
-    async def post(self, url: str, json: dict, headers: dict):
-        self.calls.append(("POST", url, headers, json))
+    async def post(self, url: str, data: bytes, headers: dict):
+        body = json.loads(data)
+        self.calls.append(("POST", url, headers, body))
         if url.endswith("/service/app/routine/v2/editMultiple"):
-            self.last_mrds = json["mrds"]
+            self.last_mrds = body["mrds"]
             item = {
-                "id": json["mrds"][0]["id"],
-                "name": json["mrds"][0]["name"],
-                "active": json["mrds"][0]["active"],
-                "enabled": json["mrds"][0]["enabled"],
+                "id": body["mrds"][0]["id"],
+                "name": body["mrds"][0]["name"],
+                "active": body["mrds"][0]["active"],
+                "enabled": body["mrds"][0]["enabled"],
                 "type": "alarm",
                 "macAddress": "AA:BB:CC",
-                "startTime": json["mrds"][0]["startTime"],
-                "endTime": json["mrds"][0]["endTime"],
+                "startTime": body["mrds"][0]["startTime"],
+                "endTime": body["mrds"][0]["endTime"],
             }
-            if "daysOfWeek" in json["mrds"][0]:
-                item["daysOfWeek"] = json["mrds"][0]["daysOfWeek"]
+            if "daysOfWeek" in body["mrds"][0]:
+                item["daysOfWeek"] = body["mrds"][0]["daysOfWeek"]
             return FakeResponse(
                 url,
                 {
@@ -152,7 +157,7 @@ class FakeAlarmDevice(ScheduledRoutineAlarmMixin):
     def __init__(self):
         self.publish_count = 0
 
-    def publish_updates(self):
+    def publish_updates(self, changed=None):
         self.publish_count += 1
 
 
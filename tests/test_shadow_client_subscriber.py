@@ -0,0 +1,491 @@
+import asyncio
+import logging
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+from unittest.mock import MagicMock, patch
+
+from awsiot.iotshadow import (
+    GetShadowResponse,
+    ShadowDeltaUpdatedEvent,
+    ShadowState,
+    ShadowStateWithDelta,
+    UpdateShadowResponse,
+)
+
+from hatch_rest_api import shadow_client_subscriber
+from hatch_rest_api.metrics import (
+    COMMAND_CONVERGENCE_SECONDS,
+    COMMAND_PUBLISH_SECONDS,
+    COMMAND_TIMEOUTS,
+    InMemoryMetricsSink,
+)
+from hatch_rest_api.rest_iot import RestIot
+from hatch_rest_api.shadow_client_subscriber import (
+    ShadowClientSubscriberMixin,
+    await_mqtt_future,
+)
+
+from helpers import report_state
+
+
+def _completed_later(result=None, delay=0.01) -> Future:
+    """A future completed from another thread, like the ones awscrt hands out."""
+    future = Future()
+    threading.Timer(delay, future.set_result, args=(result,)).start()
+    return future
+
+
+class FakeShadowClient:
+    def __init__(self, publish_delay: float = 0.01):
+        self.publish_delay = publish_delay
+        self.subscriptions = []
+        self.updates = []
+        self.gets = []
+
+    def subscribe_to_update_shadow_accepted(self, request, qos, callback):
+        self.subscriptions.append(("update/accepted", request.thing_name, callback))
+        return _completed_later(qos), "update/accepted"
+
+    def subscribe_to_get_shadow_accepted(self, request, qos, callback):
+        self.subscriptions.append(("get/accepted", request.thing_name, callback))
+        return _completed_later(qos), "get/accepted"
+
+    def subscribe_to_shadow_delta_updated_events(self, request, qos, callback):
+        self.subscriptions.append(("update/delta", request.thing_name, callback))
+        return _completed_later(qos), "update/delta"
+
+    def publish_update_shadow(self, request, qos):
+        self.updates.append(request.state.desired)
+        return _completed_later(delay=self.publish_delay)
+
+    def publish_get_shadow(self, request, qos):
+        self.gets.append(request.thing_name)
+        return _completed_later(delay=self.publish_delay)
+
+
+class FakeDevice(ShadowClientSubscriberMixin):
+    def _update_local_state(self, state):
+        self.publish_updates()
+
+
+def _device(shadow_client, **kwargs) -> FakeDevice:
+    return FakeDevice(
+        device_name="Nursery",
+        thing_name="thing-1",
+        mac="AA:BB",
+        shadow_client=shadow_client,
+        **kwargs,
+    )
+
+
+class AsyncShadowApiTest(unittest.TestCase):
+    def test_blocking_constructor_subscribes_and_refreshes(self):
+        shadow_client = FakeShadowClient()
+
+        _device(shadow_client)
+
+        self.assertEqual(len(shadow_client.subscriptions), 3)
+        self.assertEqual(shadow_client.gets, ["thing-1"])
+
+    def test_deferred_subscription_is_awaitable(self):
+        shadow_client = FakeShadowClient()
+        device = _device(shadow_client, subscribe=False)
+        self.assertEqual(shadow_client.subscriptions, [])
+
+        asyncio.run(device.async_subscribe())
+
+        self.assertEqual(len(shadow_client.subscriptions), 3)
+        self.assertEqual(shadow_client.gets, ["thing-1"])
+
+    def test_async_update_does_not_use_executor_threads(self):
+        shadow_client = FakeShadowClient(publish_delay=0.05)
+        device = _device(shadow_client, subscribe=False)
+
+        async def run():
+            loop = asyncio.get_running_loop()
+
+            def no_executor(*args):
+                raise AssertionError("executor used")
+
+            loop.run_in_executor = no_executor
+            await asyncio.gather(
+                *(device.async_update({"a": {"v": volume}}) for volume in range(50))
+            )
+
+        asyncio.run(run())
+
+        self.assertEqual(len(shadow_client.updates), 50)
+
+    def test_async_refresh_times_out(self):
+        class HangingShadowClient(FakeShadowClient):
+            def publish_get_shadow(self, request, qos):
+                return Future()
+
+        device = _device(HangingShadowClient(), subscribe=False)
+
+        async def run():
+            await await_mqtt_future(device._publish_get(), timeout=0.01)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(run())
+
+    def test_timeout_does_not_cancel_the_mqtt_future(self):
+        future = Future()
+
+        async def run():
+            with self.assertRaises(asyncio.TimeoutError):
+                await await_mqtt_future(future, timeout=0.01)
+
+        asyncio.run(run())
+
+        self.assertFalse(future.cancelled())
+        future.set_result({"packet_id": 1})
+
+
+class CoalescedUpdateTest(unittest.TestCase):
+    def test_rapid_updates_publish_one_merged_request(self):
+        shadow_client = FakeShadowClient()
+        device = _device(shadow_client, subscribe=False, coalesce_window=0.05)
+
+        for volume in range(20):
+            device._update({"current": {"sound": {"v": volume}}})
+        device._update({"current": {"color": {"r": 1, "g": 2}}})
+        device._update({"current": {"color": {"g": 3}}})
+
+        self.assertEqual(shadow_client.updates, [])
+        asyncio.run(
+            device.async_update({"current": {"sound": {"id": 7}}})
+        )
+
+        self.assertEqual(
+            shadow_client.updates,
+            [
+                {
+                    "current": {
+                        "sound": {"v": 19, "id": 7},
+                        "color": {"r": 1, "g": 3},
+                    }
+                }
+            ],
+        )
+
+    def test_cancelled_caller_leaves_the_others_waiting(self):
+        shadow_client = FakeShadowClient()
+        device = _device(shadow_client, subscribe=False, coalesce_window=0.05)
+
+        async def run():
+            first = asyncio.ensure_future(device.async_update({"a": {"v": 1}}))
+            second = asyncio.ensure_future(device.async_update({"b": {"v": 2}}))
+            await asyncio.sleep(0)
+            first.cancel()
+            await second
+            return first
+
+        first = asyncio.run(run())
+
+        self.assertTrue(first.cancelled())
+        self.assertEqual(shadow_client.updates, [{"a": {"v": 1}, "b": {"v": 2}}])
+
+    def test_flush_publishes_immediately(self):
+        shadow_client = FakeShadowClient()
+        device = _device(shadow_client, subscribe=False, coalesce_window=60)
+
+        device._update({"a": {"v": 1}})
+        device.flush_pending_update()
+        device.flush_pending_update()
+
+        self.assertEqual(shadow_client.updates, [{"a": {"v": 1}}])
+
+    def test_without_window_every_update_is_published(self):
+        shadow_client = FakeShadowClient(publish_delay=0)
+        device = _device(shadow_client, subscribe=False)
+
+        device._update({"a": {"v": 1}})
+        device._update({"a": {"v": 2}})
+
+        self.assertEqual(shadow_client.updates, [{"a": {"v": 1}}, {"a": {"v": 2}}])
+
+
+class ShadowLoggingTest(unittest.TestCase):
+    def test_state_is_not_formatted_when_debug_is_off(self):
+        class CountingRestIot(RestIot):
+            formatted = 0
+
+            def __str__(self):
+                CountingRestIot.formatted += 1
+                return super().__str__()
+
+        device = CountingRestIot("Nursery", "thing-1", "AA", None, subscribe=False)
+        logger = logging.getLogger("hatch_rest_api")
+        previous_level = logger.level
+        logger.setLevel(logging.INFO)
+        try:
+            device._on_update_shadow_accepted(
+                UpdateShadowResponse(
+                    version=1, state=ShadowState(reported={"connected": True})
+                )
+            )
+        finally:
+            logger.setLevel(previous_level)
+
+        self.assertIs(device.is_online, True)
+        self.assertEqual(CountingRestIot.formatted, 0)
+
+    def test_event_emitter_receives_structured_events(self):
+        emitter = MagicMock()
+        device = RestIot("Nursery", "thing-1", "AA", None, subscribe=False)
+        device.event_emitter = emitter
+
+        device._on_update_shadow_accepted(
+            UpdateShadowResponse(version=3, state=ShadowState(reported={"connected": True}))
+        )
+
+        self.assertEqual(
+            [call.args for call in emitter.call_args_list],
+            [
+                (
+                    "shadow.update.accepted",
+                    {"device_name": "Nursery", "thing_name": "thing-1", "version": 3},
+                ),
+                (
+                    "state.applied",
+                    {
+                        "device_name": "Nursery",
+                        "thing_name": "thing-1",
+                        "values": {"is_online": True},
+                    },
+                ),
+            ],
+        )
+
+
+class RecordingRestIot(RestIot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.applied = []
+
+    def _update_local_state(self, state):
+        self.applied.append(state)
+        super()._update_local_state(state)
+
+
+class ShadowDeltaTest(unittest.TestCase):
+    reported = {"connected": True, "current": {"sound": {"v": 0, "id": 10137}}}
+
+    def _get(self, device, version, reported, delta=None):
+        device._on_get_shadow_accepted(
+            GetShadowResponse(
+                version=version,
+                state=ShadowStateWithDelta(reported=reported, delta=delta),
+            )
+        )
+
+    def test_get_applies_only_changed_fields(self):
+        device = RecordingRestIot("Nursery", "thing-1", "AA", None, subscribe=False)
+
+        self._get(device, 1, self.reported)
+        self._get(device, 2, self.reported)
+        self._get(device, 3, {"connected": True, "current": {"sound": {"v": 65535, "id": 10137}}})
+
+        self.assertEqual(
+            device.applied,
+            [self.reported, {"current": {"sound": {"v": 65535}}}],
+        )
+        self.assertEqual(device.volume, 100)
+
+    def test_pending_changes_follow_delta_and_reported(self):
+        device = RestIot("Nursery", "thing-1", "AA", None, subscribe=False)
+        self._get(device, 1, self.reported)
+
+        device._on_shadow_delta_updated(
+            ShadowDeltaUpdatedEvent(version=2, state={"current": {"sound": {"v": 100, "id": 3}}})
+        )
+        self.assertEqual(
+            device.pending_changes, {"current.sound.v": 100, "current.sound.id": 3}
+        )
+
+        device._on_update_shadow_accepted(
+            UpdateShadowResponse(
+                version=3, state=ShadowState(reported={"current": {"sound": {"v": 100}}})
+            )
+        )
+        self.assertEqual(device.pending_changes, {"current.sound.id": 3})
+
+        self._get(device, 4, self.reported, delta={"current": {"sound": {"id": 3}}})
+        self.assertEqual(device.pending_changes, {"current.sound.id": 3})
+        self._get(device, 5, self.reported)
+        self.assertEqual(device.pending_changes, {})
+
+    def test_reported_updates_are_merged_into_the_cache(self):
+        device = RecordingRestIot("Nursery", "thing-1", "AA", None, subscribe=False)
+        self._get(device, 1, self.reported)
+        device._on_update_shadow_accepted(
+            UpdateShadowResponse(version=2, state=ShadowState(reported={"connected": False}))
+        )
+
+        self._get(device, 3, {**self.reported, "connected": False})
+
+        self.assertEqual(device.applied[-1], {"connected": False})
+        self.assertEqual(len(device.applied), 2)
+
+
+class ConvergenceTest(unittest.TestCase):
+    def setUp(self):
+        self.device = RestIot(
+            "Nursery", "thing-1", "AA", FakeShadowClient(publish_delay=0),
+            subscribe=False, track_convergence=True,
+        )
+        report_state(self.device, 1, {"current": {"sound": {"v": 0}}})
+
+    def test_resolves_when_reported_state_matches(self):
+        converged = self.device.set_volume(100)
+        self.assertFalse(converged.done())
+
+        report_state(self.device, 2, {"connected": True})
+        self.assertFalse(converged.done())
+        report_state(self.device, 3, {"current": {"sound": {"v": 65535}}})
+
+        self.assertEqual(converged.result(0), 3)
+
+    def test_is_awaitable(self):
+        async def run():
+            converged = self.device.set_volume(100)
+            asyncio.get_running_loop().call_later(
+                0.01, report_state, self.device, 2, {"current": {"sound": {"v": 65535}}}
+            )
+            return await converged
+
+        self.assertEqual(asyncio.run(run()), 2)
+
+    def test_already_reported_state_resolves_immediately(self):
+        self.assertEqual(self.device.set_volume(0).result(0), 1)
+
+    def test_times_out(self):
+        with patch.object(shadow_client_subscriber, "CONVERGENCE_TIMEOUT", 0.02):
+            converged = self.device.set_volume(100)
+
+        with self.assertRaises(TimeoutError):
+            converged.result(1)
+        self.assertEqual(self.device._convergences, [converged])
+        self.device.set_volume(50)
+        self.assertEqual(len(self.device._convergences), 1)
+
+    def test_superseded_command_follows_the_newer_one(self):
+        first = self.device.set_volume(100)
+        second = self.device.set_volume(50)
+
+        report_state(self.device, 2, {"current": {"sound": {"v": 32768}}})
+
+        self.assertEqual(first.result(0), 2)
+        self.assertEqual(second.result(0), 2)
+
+    def test_tracking_is_opt_in(self):
+        device = RestIot("Nursery", "thing-1", "AA", FakeShadowClient(publish_delay=0), subscribe=False)
+
+        self.assertIsNone(device.set_volume(100))
+        self.assertEqual(device._convergences, [])
+
+    def test_timeouts_share_one_thread(self):
+        self.device.set_volume(100)
+        threads = threading.active_count()
+
+        for volume in range(300):
+            self.device.set_volume(volume % 100)
+
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_superseded_command_ignores_its_own_deadline(self):
+        with patch.object(shadow_client_subscriber, "CONVERGENCE_TIMEOUT", 0.02):
+            first = self.device.set_volume(100)
+        second = self.device.set_volume(50)
+
+        time.sleep(0.05)
+        self.assertFalse(first.done())
+        report_state(self.device, 2, {"current": {"sound": {"v": 32768}}})
+
+        self.assertEqual(first.result(0), 2)
+        self.assertEqual(second.result(0), 2)
+
+    def test_failed_publish_fails_the_future(self):
+        class FailingShadowClient(FakeShadowClient):
+            def publish_update_shadow(self, request, qos):
+                raise ValueError("offline")
+
+        device = RestIot(
+            "Nursery", "thing-1", "AA", FailingShadowClient(), subscribe=False, track_convergence=True
+        )
+        device.coalesce_window = 0.01
+
+        converged = device.set_volume(10)
+
+        with self.assertRaisesRegex(ValueError, "offline"):
+            converged.result(1)
+
+
+class CommandMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.sink = InMemoryMetricsSink()
+        self.device = RestIot(
+            "Nursery", "thing-1", "AA", FakeShadowClient(publish_delay=0),
+            subscribe=False, track_convergence=True,
+        )
+        self.device.metrics_sink = self.sink
+        report_state(self.device, 1, {"current": {"sound": {"v": 0}}})
+
+    def test_setters_record_publish_and_convergence_time(self):
+        self.device.set_volume(100)
+        report_state(self.device, 2, {"current": {"sound": {"v": 65535}}})
+
+        for name in (COMMAND_PUBLISH_SECONDS, COMMAND_CONVERGENCE_SECONDS):
+            histogram = self.sink.histogram(name, thing_name="thing-1", command="set_volume")
+            self.assertEqual(histogram.count, 1, name)
+
+    def test_async_update_is_labelled_with_the_given_command(self):
+        async def run():
+            await self.device.async_update({"current": {"sound": {"v": 0}}}, command="quiet")
+
+        asyncio.run(run())
+
+        self.assertEqual(
+            self.sink.histogram(COMMAND_CONVERGENCE_SECONDS, thing_name="thing-1", command="quiet").count, 1
+        )
+
+    def test_timeouts_are_counted(self):
+        with patch.object(shadow_client_subscriber, "CONVERGENCE_TIMEOUT", 0.02):
+            converged = self.device.set_volume(100)
+        # done callbacks run in order, after the metrics one
+        settled = threading.Event()
+        converged.add_done_callback(lambda _: settled.set())
+
+        self.assertTrue(settled.wait(1))
+        self.assertIsInstance(converged.exception(), TimeoutError)
+        self.assertEqual(self.sink.counter(COMMAND_TIMEOUTS, thing_name="thing-1", command="set_volume"), 1)
+        self.assertIsNone(
+            self.sink.histogram(COMMAND_CONVERGENCE_SECONDS, thing_name="thing-1", command="set_volume")
+        )
+
+    def test_publish_timeouts_are_counted_without_convergence_tracking(self):
+        class HangingShadowClient(FakeShadowClient):
+            def publish_update_shadow(self, request, qos):
+                return Future()
+
+        device = _device(HangingShadowClient(), subscribe=False)
+        device.metrics_sink = self.sink
+
+        async def run():
+            await device.async_update({"a": {"v": 1}}, command="quiet")
+
+        with patch.object(shadow_client_subscriber, "MQTT_TIMEOUT", 0.01):
+            with self.assertRaises(TimeoutError):
+                device._update({"a": {"v": 1}}, command="set_volume")
+            with self.assertRaises(TimeoutError):
+                asyncio.run(run())
+
+        for command in ("set_volume", "quiet"):
+            self.assertEqual(self.sink.counter(COMMAND_TIMEOUTS, thing_name="thing-1", command=command), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import unittest
+
+from awsiot.iotshadow import IotShadowClient
+
+from hatch_rest_api.fake_shadow import FakeShadowConnection
+from hatch_rest_api.rest_iot import RestIot
+from hatch_rest_api.shadow_fleet import FLEET_TOPICS, ShadowFleetDispatcher
+
+from helpers import done_future
+
+
+class FakeMqttConnection:
+    def __init__(self):
+        self.subscriptions = {}
+
+    def subscribe(self, topic, qos, callback):
+        self.subscriptions[topic] = callback
+        return done_future({"packet_id": len(self.subscriptions), "topic": topic, "qos": qos}), len(self.subscriptions)
+
+    def deliver(self, topic: str, payload: dict):
+        for subscribed_topic, callback in self.subscriptions.items():
+            if subscribed_topic.split("/")[3:] == topic.split("/")[3:]:
+                callback(topic=topic, payload=json.dumps(payload).encode(), dup=False, qos=1, retain=False)
+
+
+class WildcardRejectingConnection(FakeShadowConnection):
+    """Answers wildcard subscriptions with SUBACK failure code 0x80."""
+
+    def subscribe(self, topic, qos, callback=None):
+        if "+" in topic:
+            return done_future({"packet_id": 0, "topic": topic, "qos": None}), 0
+        return super().subscribe(topic, qos, callback)
+
+
+class FakeShadowClient:
+    def __init__(self):
+        self.gets = []
+
+    def __getattr__(self, name):
+        raise AssertionError(f"{name} should go through the fleet dispatcher")
+
+    def publish_get_shadow(self, request, qos):
+        self.gets.append(request.thing_name)
+        return done_future()
+
+
+class ShadowFleetDispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.connection = FakeMqttConnection()
+        self.shadow_client = FakeShadowClient()
+        self.fleet = ShadowFleetDispatcher(self.connection)
+        self.devices = [
+            RestIot(f"Device {index}", f"thing-{index}", str(index), self.shadow_client, subscribe=False)
+            for index in range(100)
+        ]
+        for device in self.devices:
+            device.shadow_fleet = self.fleet
+
+    def test_fleet_subscribes_once(self):
+        async def run():
+            await asyncio.gather(*(device.async_subscribe() for device in self.devices))
+
+        asyncio.run(run())
+
+        self.assertEqual(sorted(self.connection.subscriptions), sorted(FLEET_TOPICS))
+        self.assertEqual(len(self.shadow_client.gets), 100)
+
+    def test_messages_are_routed_by_thing_name(self):
+        asyncio.run(self.devices[42].async_subscribe())
+        asyncio.run(self.devices[7].async_subscribe())
+
+        self.connection.deliver(
+            "$aws/things/thing-42/shadow/update/accepted",
+            {"version": 3, "state": {"reported": {"current": {"sound": {"v": 65535}}}}},
+        )
+        self.connection.deliver(
+            "$aws/things/thing-7/shadow/get/accepted",
+            {"version": 5, "state": {"reported": {"connected": True}}},
+        )
+
+        self.assertEqual(self.devices[42].volume, 100)
+        self.assertEqual(self.devices[42].document_version, 3)
+        self.assertIs(self.devices[7].is_online, True)
+        self.assertEqual(self.devices[7].document_version, 5)
+        self.assertEqual(self.devices[0].document_version, -1)
+
+    def test_unknown_things_and_bad_payloads_are_ignored(self):
+        asyncio.run(self.devices[1].async_subscribe())
+        callback = self.connection.subscriptions[FLEET_TOPICS[0]]
+
+        callback(topic="$aws/things/unknown/shadow/update/accepted", payload=b"{}")
+        with self.assertLogs("hatch_rest_api.shadow_fleet", "ERROR"):
+            callback(topic="$aws/things/thing-1/shadow/update/accepted", payload=b"not json")
+
+        self.fleet.unregister(self.devices[1])
+        self.connection.deliver(
+            "$aws/things/thing-1/shadow/update/accepted",
+            {"version": 9, "state": {"reported": {"connected": True}}},
+        )
+        self.assertEqual(self.devices[1].document_version, -1)
+
+    def test_rejected_wildcards_fall_back_to_device_subscriptions(self):
+        connection = WildcardRejectingConnection()
+        self.addCleanup(connection.close)
+        fleet = ShadowFleetDispatcher(connection)
+        devices = []
+        for index in range(2):
+            connection.add_thing(f"thing-{index}", reported={"connected": True})
+            device = RestIot(f"Device {index}", f"thing-{index}", str(index), IotShadowClient(connection), subscribe=False)
+            device.shadow_fleet = fleet
+            devices.append(device)
+
+        async def run():
+            await asyncio.gather(*(device.async_subscribe() for device in devices))
+            await asyncio.sleep(0.05)
+
+        with self.assertLogs("hatch_rest_api.shadow_client_subscriber", "WARNING") as logs:
+            asyncio.run(run())
+
+        self.assertEqual(len(logs.output), 2)
+        self.assertEqual([device.shadow_fleet for device in devices], [None, None])
+        self.assertNotIn(FLEET_TOPICS[0], connection._subscriptions)
+        self.assertIn("$aws/things/thing-1/shadow/update/delta", connection._subscriptions)
+        self.assertEqual([device.is_online for device in devices], [True, True])
+
+if __name__ == "__main__":
+    unittest.main()
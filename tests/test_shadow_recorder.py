@@ -0,0 +1,118 @@
+import asyncio
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from awsiot.iotshadow import GetShadowResponse, IotShadowClient, ShadowDeltaUpdatedEvent
+
+from hatch_rest_api.fake_shadow import FakeShadowConnection
+from hatch_rest_api.rest_iot import RestIot
+from hatch_rest_api.shadow_recorder import (
+    LatencySummary,
+    ShadowRecorder,
+    read_recording,
+    replay_shadow_traffic,
+    shadow_payload,
+)
+
+REPORTED = {"connected": True, "current": {"playing": "none", "sound": {"id": 10137, "v": 0}}}
+
+
+class ShadowRecorderTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "shadow.jsonl"
+
+    def _device(self, connection=None) -> RestIot:
+        if connection is None:
+            connection = FakeShadowConnection()
+            self.addCleanup(connection.close)
+        return RestIot("Nursery", "thing-1", "AA", IotShadowClient(connection), subscribe=False)
+
+    def _record_session(self) -> RestIot:
+        connection = FakeShadowConnection(latency=0.001, seed=1)
+        self.addCleanup(connection.close)
+        connection.add_thing("thing-1", reported=REPORTED)
+        recorder = ShadowRecorder(self.path)
+        device = self._device(connection)
+        device.track_convergence = True
+        device.shadow_recorder = recorder
+
+        async def run():
+            await device.async_subscribe()
+            converged = await device.async_update({"current": {"sound": {"v": 65535}}})
+            await asyncio.wait_for(converged, 1)
+
+        asyncio.run(run())
+        recorder.close()
+        return device
+
+    def test_payload_round_trips_through_from_payload(self):
+        payload = {
+            "state": {"reported": REPORTED, "desired": {"a": 1}, "delta": {"a": 1}},
+            "version": 4,
+            "timestamp": 1700000000,
+        }
+        self.assertEqual(shadow_payload(GetShadowResponse.from_payload(payload)), payload)
+        delta = {"state": {"a": 1}, "version": 5}
+        self.assertEqual(shadow_payload(ShadowDeltaUpdatedEvent.from_payload(delta)), delta)
+
+    def test_records_every_accepted_and_delta_message(self):
+        self._record_session()
+
+        records = list(read_recording(self.path))
+
+        self.assertEqual([record.kind for record in records][:1], ["get/accepted"])
+        self.assertIn("update/accepted", {record.kind for record in records})
+        self.assertEqual({record.thing_name for record in records}, {"thing-1"})
+        self.assertEqual(records, sorted(records, key=lambda record: record.received_at))
+
+    def test_replay_rebuilds_the_recorded_state(self):
+        recorded = self._record_session()
+        device = self._device()
+
+        report = replay_shadow_traffic(self.path, {"thing-1": device, "thing-2": self._device()})
+
+        self.assertEqual(report.messages, len(list(read_recording(self.path))))
+        self.assertEqual(report.skipped, 0)
+        self.assertEqual(report.dispatch.count, report.messages)
+        self.assertEqual(device.document_version, recorded.document_version)
+        self.assertEqual(device.volume, 100)
+
+    def test_replay_into_a_recording_device_does_not_record_again(self):
+        self._record_session()
+        recorded = self.path.read_text()
+        device = self._device()
+        device.shadow_recorder = ShadowRecorder(self.path)
+        self.addCleanup(device.shadow_recorder.close)
+
+        report = replay_shadow_traffic(self.path, {"thing-1": device})
+        device.shadow_recorder.close()
+
+        self.assertEqual(report.messages, len(recorded.splitlines()))
+        self.assertEqual(self.path.read_text(), recorded)
+
+    def test_replay_at_original_speed_keeps_the_gaps(self):
+        with self.path.open("w") as file:
+            for received_at, version in ((100.0, 1), (100.1, 2)):
+                file.write(f'[{received_at},"thing-1","update/delta",{{"state":{{"a":1}},"version":{version}}}]\n')
+            file.write("not json\n")
+            file.write('[100.1,"thing-9","update/delta",{"state":{"a":1}}]\n')
+
+        started = time.perf_counter()
+        report = replay_shadow_traffic(self.path, {"thing-1": self._device()}, speed=2.0)
+
+        self.assertGreaterEqual(time.perf_counter() - started, 0.05)
+        self.assertEqual((report.messages, report.skipped), (2, 1))
+
+    def test_latency_summary_percentiles(self):
+        summary = LatencySummary.of([index / 100 for index in range(100, 0, -1)])
+
+        self.assertEqual(summary, LatencySummary(100, 0.51, 0.91, 1.0, 1.0))
+        self.assertEqual(LatencySummary.of([]), LatencySummary(0, 0.0, 0.0, 0.0, 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import asyncio
+import json
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from hatch_rest_api.snapshot import (
+    SNAPSHOT_FILE_VERSION,
+    BootstrapSnapshot,
+    SnapshotStore,
+)
+
+RAIN = {"id": 1, "title": "Rain"}
+
+
+def _snapshot(favorites=None, fetched_at=None) -> BootstrapSnapshot:
+    catalog = (RAIN,)
+    return BootstrapSnapshot(
+        iot_devices=[
+            {"product": "riot", "macAddress": "AA"},
+            {"product": "riotPlus", "macAddress": "BB"},
+            {"product": "restMini", "macAddress": "CC"},
+        ],
+        favorites=favorites if favorites is not None else {"AA": [{"id": 5}], "BB": []},
+        routines={"AA": []},
+        alarms={},
+        sounds={"AA": catalog, "BB": catalog, "CC": ()},
+        fetched_at=time.time() if fetched_at is None else fetched_at,
+    )
+
+
+class BootstrapSnapshotTest(unittest.TestCase):
+    def test_catalogs_are_stored_once_and_shared_after_load(self):
+        data = json.loads(json.dumps(_snapshot().to_json()))
+
+        self.assertEqual(data["sound_catalogs"], {"riot": [RAIN]})
+        loaded = BootstrapSnapshot.from_json(data)
+        self.assertEqual(loaded.sounds["AA"], (RAIN,))
+        self.assertIs(loaded.sounds["AA"], loaded.sounds["BB"])
+        self.assertEqual(loaded.sounds["CC"], ())
+
+    def test_changed_macs(self):
+        snapshot = _snapshot()
+        fresh = _snapshot(favorites={"AA": [{"id": 5}], "BB": [{"id": 6}]})
+
+        self.assertEqual(snapshot.changed_macs(snapshot), set())
+        self.assertEqual(snapshot.changed_macs(fresh), {"BB"})
+
+    def test_is_stale(self):
+        self.assertFalse(_snapshot().is_stale(60))
+        self.assertTrue(_snapshot(fetched_at=time.time() - 120).is_stale(60))
+
+
+class SnapshotStoreTest(unittest.TestCase):
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = SnapshotStore(Path(directory) / "nested" / "snapshot.json")
+            snapshot = _snapshot()
+
+            asyncio.run(store.save(snapshot))
+
+            self.assertEqual(asyncio.run(store.load()), snapshot)
+
+    def test_missing_or_other_version_loads_as_none(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "snapshot.json"
+            store = SnapshotStore(path)
+            self.assertIsNone(asyncio.run(store.load()))
+
+            path.write_text(json.dumps({"version": SNAPSHOT_FILE_VERSION + 1}))
+            self.assertIsNone(asyncio.run(store.load()))
+
+            path.write_text("{not json")
+            self.assertIsNone(asyncio.run(store.load()))
+
+
+if __name__ == "__main__":
+    unittest.main()
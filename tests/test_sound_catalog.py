@@ -0,0 +1,110 @@
+import asyncio
+import tempfile
+import unittest
+from concurrent.futures import Future
+from pathlib import Path
+
+from hatch_rest_api.const import RIoTAudioTrack
+from hatch_rest_api.errors import RateError
+from hatch_rest_api.rest_iot import RestIot
+from hatch_rest_api.sound_catalog import SoundCatalog, SoundCatalogCache
+
+RAIN = {"id": RIoTAudioTrack.Rain.value, "title": "Rain", "wavUrl": "https://example.com/rain.wav"}
+OCEAN = {"id": RIoTAudioTrack.Ocean.value, "title": "Ocean", "mp3Url": "https://example.com/ocean.mp3"}
+
+
+class RecordingShadowClient:
+    def __init__(self):
+        self.updates = []
+
+    def publish_update_shadow(self, request, qos):
+        self.updates.append(request.state.desired)
+        future = Future()
+        future.set_result(None)
+        return future
+
+
+class SoundCatalogTest(unittest.TestCase):
+    def test_indexes_are_built_once(self):
+        catalog = SoundCatalog([RAIN, OCEAN, {"title": "No id"}])
+
+        self.assertEqual(catalog, (RAIN, OCEAN, {"title": "No id"}))
+        self.assertEqual(catalog.by_id, {RAIN["id"]: RAIN, OCEAN["id"]: OCEAN})
+        self.assertIs(catalog.by_title["Ocean"], OCEAN)
+        self.assertEqual(catalog.wav_url_by_id, {RAIN["id"]: RAIN["wavUrl"]})
+
+    def test_devices_share_the_catalog(self):
+        catalog = SoundCatalog([RAIN])
+        first = RestIot("Nursery", "thing-1", "AA", None, sounds=catalog, subscribe=False)
+        second = RestIot("Bedroom", "thing-2", "BB", None, sounds=catalog, subscribe=False)
+
+        self.assertIs(first.sounds, second.sounds)
+        self.assertIs(first.sounds_by_id, second.sounds_by_id)
+        self.assertIs(first.sounds_by_name["Rain"], RAIN)
+
+    def test_set_audio_track_prefers_the_catalog_url(self):
+        shadow_client = RecordingShadowClient()
+        device = RestIot(
+            "Nursery", "thing-1", "AA", shadow_client, sounds=[RAIN], subscribe=False
+        )
+
+        device.set_audio_track(RIoTAudioTrack.Rain)
+        device.set_audio_track(RIoTAudioTrack.Ocean)
+        device.set_sound("Rain")
+
+        urls = [update["current"]["sound"]["url"] for update in shadow_client.updates]
+        self.assertEqual(urls[0], RAIN["wavUrl"])
+        self.assertEqual(urls[1], RIoTAudioTrack.sound_url_map()[RIoTAudioTrack.Ocean.value])
+        self.assertEqual(urls[2], RAIN["wavUrl"])
+
+
+class SoundCatalogCacheTest(unittest.TestCase):
+    def test_concurrent_gets_share_one_fetch_and_one_catalog(self):
+        calls = []
+
+        async def loader():
+            calls.append(True)
+            await asyncio.sleep(0.01)
+            return [{"id": 1, "title": "Rain"}]
+
+        async def run():
+            cache = SoundCatalogCache()
+            return await asyncio.gather(*(cache.get("riot", loader) for _ in range(5)))
+
+        catalogs = asyncio.run(run())
+
+        self.assertEqual(len(calls), 1)
+        self.assertIsInstance(catalogs[0], SoundCatalog)
+        self.assertTrue(all(catalog is catalogs[0] for catalog in catalogs))
+
+    def test_expired_entry_is_refetched_but_kept_when_refetch_fails(self):
+        cache = SoundCatalogCache(ttl=60)
+        cache.put("riot", [{"id": 1}], fetched_at=0)
+
+        async def rate_limited():
+            raise RateError("limited")
+
+        async def fresh():
+            return [{"id": 2}]
+
+        self.assertEqual(asyncio.run(cache.get("riot", rate_limited)), ({"id": 1},))
+        self.assertEqual(asyncio.run(cache.get("riot", fresh)), ({"id": 2},))
+
+    def test_catalogs_persist_to_disk(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "sounds.json"
+
+            async def loader():
+                return [{"id": 1, "title": "Rain"}]
+
+            async def fail():
+                raise AssertionError("should have been loaded from disk")
+
+            asyncio.run(SoundCatalogCache(path=path).get("restoreV5", loader))
+            catalog = asyncio.run(SoundCatalogCache(path=path).get("restoreV5", fail))
+
+        self.assertEqual(catalog, ({"id": 1, "title": "Rain"},))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from hatch_rest_api.const import NO_SOUND_ID, RestBabyAudioTrack, RIoTAudioTrack
+from hatch_rest_api.rest_baby import RestBaby
+from hatch_rest_api.rest_iot import RestIot
+from hatch_rest_api.restore_v4 import RestoreV4
+from hatch_rest_api.restore_v5 import RestoreV5
+from hatch_rest_api.util import (
+    StateExtractor,
+    StateField,
+    diff_state,
+    flatten_state,
+    merge_desired_state,
+    read_json_file,
+    safely_get_json_value,
+    write_json_file,
+)
+
+REPORTED = {
+    "connected": True,
+    "deviceInfo": {"f": "1.2.3", "b": 80, "powerStatus": 3},
+    "current": {
+        "playing": "remote",
+        "srId": 0,
+        "step": 1,
+        "sound": {"id": 10137, "v": 32767},
+        "color": {"id": 9999, "r": 65535, "g": 0, "b": 0, "w": 0, "i": 65535},
+    },
+    "clock": {"i": (65535 << 16) | 32767, "flags": 1 << 15},
+    "toddlerLock": {"turnOnMode": "always"},
+}
+
+
+class StateExtractorTest(unittest.TestCase):
+    def test_matches_safely_get_json_value(self):
+        paths = [
+            "connected",
+            "deviceInfo.f",
+            "current.sound.v",
+            "current.color.r",
+            "current.missing",
+            "missing.deeper.key",
+            "connected.not_a_dict",
+        ]
+        extractor = StateExtractor(StateField(path, path) for path in paths)
+
+        values = extractor.extract(REPORTED)
+
+        for path in paths:
+            expected = safely_get_json_value(REPORTED, path)
+            if expected is None:
+                self.assertNotIn(path, values)
+            else:
+                self.assertEqual(values[path], expected)
+
+    def test_converts_and_unpacks_tuple_attributes(self):
+        extractor = StateExtractor(
+            (
+                StateField("a.b", "double", lambda value: value * 2),
+                StateField("a.c", ("first", "second"), lambda value: tuple(value)),
+            )
+        )
+
+        self.assertEqual(
+            extractor.extract({"a": {"b": 2, "c": [3, 4]}}),
+            {"double": 4, "first": 3, "second": 4},
+        )
+        self.assertEqual(extractor.extract(None), {})
+
+    def test_rest_iot_applies_reported_state(self):
+        device = RestIot("Nursery", "thing-1", "AA", None, subscribe=False)
+
+        device._update_local_state(REPORTED)
+
+        self.assertEqual(device.firmware_version, "1.2.3")
+        self.assertEqual(device.battery_level, 80)
+        self.assertIs(device.is_online, True)
+        self.assertEqual(device.volume, 50)
+        self.assertEqual(device.audio_track, RIoTAudioTrack.WhiteNoise)
+        self.assertEqual(device.red, 255)
+        self.assertEqual(device.brightness, 100)
+        self.assertEqual(device.toddler_lock_mode, "always")
+
+    def test_first_report_of_the_default_sound_sets_the_track(self):
+        for device_class, none_track in ((RestIot, RIoTAudioTrack.NONE), (RestBaby, RestBabyAudioTrack.NONE)):
+            device = device_class("Nursery", "thing-1", "AA", None, subscribe=False)
+
+            device._update_local_state({"current": {"sound": {"id": NO_SOUND_ID}}})
+
+            self.assertEqual(device.audio_track, none_track, device_class)
+
+    def test_restore_v5_unpacks_dual_clock_brightness(self):
+        device = RestoreV5("Bedroom", "thing-2", "BB", None, subscribe=False)
+
+        device._update_local_state(REPORTED)
+
+        self.assertEqual((device.clock_nighttime, device.clock_daytime), (100, 50))
+
+
+class StateRecordTest(unittest.TestCase):
+    def test_state_lives_on_the_slotted_record(self):
+        device = RestIot("Nursery", "thing-1", "AA", None, subscribe=False)
+
+        device._update_local_state(REPORTED)
+
+        self.assertFalse(hasattr(device._state, "__dict__"))
+        self.assertEqual(device._state.volume, 50)
+        self.assertEqual(device._state.audio_track, RIoTAudioTrack.WhiteNoise)
+        for attribute in (*RestIot.state_fields.attributes(), "audio_track"):
+            self.assertNotIn(attribute, device.__dict__)
+
+    def test_unset_attributes_read_the_class_default(self):
+        device = RestIot("Nursery", "thing-1", "AA", None, subscribe=False)
+
+        self.assertEqual(RestIot.current_playing, "none")
+        self.assertEqual(device.current_playing, "none")
+        self.assertIsNone(device.battery_level)
+        device.volume = 20
+        self.assertEqual(device.volume, 20)
+        self.assertEqual(RestIot("Other", "thing-2", "BB", None, subscribe=False).volume, 0)
+
+    def test_subclasses_get_their_own_record(self):
+        device = RestoreV4("Bedroom", "thing-2", "BB", None, subscribe=False)
+
+        device._update_local_state(REPORTED)
+
+        self.assertEqual(type(device._state).__name__, "RestoreV4State")
+        self.assertEqual((device.clock_nighttime, device.clock_daytime), (100, 50))
+        self.assertEqual(RestoreV4.color_id, RestoreV5.color_id)
+
+
+class MergeDesiredStateTest(unittest.TestCase):
+    def test_last_writer_wins_per_leaf(self):
+        pending = {}
+        first = {"current": {"color": {"r": 1, "g": 2}}}
+
+        merge_desired_state(pending, first)
+        merge_desired_state(pending, {"current": {"color": {"g": 3}, "playing": "remote"}})
+
+        self.assertEqual(
+            pending, {"current": {"color": {"r": 1, "g": 3}, "playing": "remote"}}
+        )
+        self.assertEqual(first, {"current": {"color": {"r": 1, "g": 2}}})
+
+
+class StateDiffTest(unittest.TestCase):
+    def test_diff_keeps_only_changed_leaves(self):
+        previous = {"connected": True, "current": {"sound": {"v": 1, "id": 2}, "step": 1}}
+        current = {"connected": True, "current": {"sound": {"v": 5, "id": 2}, "step": 1}, "clock": {"i": 3}}
+
+        self.assertEqual(
+            diff_state(previous, current),
+            {"current": {"sound": {"v": 5}}, "clock": {"i": 3}},
+        )
+        self.assertEqual(diff_state(current, current), {})
+
+    def test_flatten_uses_dotted_paths(self):
+        self.assertEqual(
+            flatten_state({"current": {"sound": {"v": 5}}, "connected": False}),
+            {"current.sound.v": 5, "connected": False},
+        )
+
+
+class JsonFileTest(unittest.TestCase):
+    def test_write_replaces_the_file_without_leaving_a_temporary(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "cache" / "state.json"
+            write_json_file(path, {"version": 1})
+            write_json_file(path, {"version": 2})
+
+            self.assertEqual(read_json_file(path), {"version": 2})
+            self.assertEqual([child.name for child in path.parent.iterdir()], ["state.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
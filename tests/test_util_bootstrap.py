@@ -1,8 +1,23 @@
 import asyncio
+import json
+import tempfile
 import unittest
+from pathlib import Path
 from unittest.mock import MagicMock, patch
 
+from awscrt import mqtt
+from awsiot.iotshadow import IotShadowClient
+
 from hatch_rest_api import util_bootstrap
+from hatch_rest_api.errors import AuthError, BaseError, RateError
+from hatch_rest_api.fake_rest import FakeHatchServer, fake_iot_devices
+from hatch_rest_api.fake_shadow import FakeShadowConnection
+from hatch_rest_api.rest_iot import RestIot
+from hatch_rest_api.restore_v5 import RestoreV5
+from hatch_rest_api.sound_catalog import SoundCatalogCache
+from hatch_rest_api.util_concurrency import BoundedFanOut
+
+from helpers import done_future
 
 
 class FakeHatch:
@@ -51,14 +66,14 @@ class FakeAwsHttp:
 class FakeShadowClient:
     """IotShadowClient stub.
 
-    subscribe_* returns the (future, topic) pair the real client returns;
-    publish_* returns a future whose .result() is a MagicMock.
+    subscribe_* returns the (future, topic) pair the real client returns, with
+    the granted QoS; publish_* returns an already completed future.
     """
 
     def __getattr__(self, name):
         if name.startswith("subscribe_"):
-            return lambda *args, **kwargs: (MagicMock(), MagicMock())
-        return lambda *args, **kwargs: MagicMock()
+            return lambda *args, **kwargs: (done_future(mqtt.QoS.AT_LEAST_ONCE), MagicMock())
+        return lambda *args, **kwargs: done_future()
 
 
 class GetRestDevicesMetricsTest(unittest.TestCase):
@@ -117,5 +132,415 @@ class GetRestDevicesMetricsTest(unittest.TestCase):
         )
 
 
+class RateLimitedHatch:
+    async def scheduled_routines(self, **kwargs):
+        raise RateError("limited")
+
+    async def content(self, **kwargs):
+        raise RateError("limited")
+
+
+class MetadataFanOutTest(unittest.TestCase):
+    devices = [
+        {"product": "restoreV5", "macAddress": "AA"},
+        {"product": "riot", "macAddress": "BB"},
+    ]
+
+    def test_rate_error_from_alarms_propagates(self):
+        with self.assertRaises(RateError):
+            asyncio.run(
+                util_bootstrap._get_alarms_for_all_scheduled_routine_devices(
+                    RateLimitedHatch(), "token", self.devices, BoundedFanOut()
+                )
+            )
+
+    def test_rate_error_from_sounds_is_swallowed(self):
+        contentful = MagicMock()
+
+        async def graphql_query(**kwargs):
+            raise RateError("limited")
+
+        contentful.graphql_query = graphql_query
+        sounds = asyncio.run(
+            util_bootstrap._get_sound_content_for_all_v2_devices(
+                RateLimitedHatch(),
+                "token",
+                contentful,
+                self.devices,
+                BoundedFanOut(),
+                SoundCatalogCache(),
+            )
+        )
+
+        self.assertEqual(sounds, {"AA": (), "BB": ()})
+
+    def test_sound_catalog_fetched_once_per_product(self):
+        devices = [
+            {"product": "riot", "macAddress": "AA"},
+            {"product": "riotPlus", "macAddress": "BB"},
+            {"product": "restBaby", "macAddress": "CC"},
+            {"product": "restMini", "macAddress": "DD"},
+        ]
+        calls = []
+
+        class ContentHatch:
+            async def content(self, **kwargs):
+                calls.append(kwargs)
+                return {"contentItems": [{"id": 1, "title": "Rain"}]}
+
+        sounds = asyncio.run(
+            util_bootstrap._get_sound_content_for_all_v2_devices(
+                ContentHatch(),
+                "token",
+                MagicMock(),
+                devices,
+                BoundedFanOut(),
+                SoundCatalogCache(),
+            )
+        )
+
+        self.assertEqual(len(calls), 1)
+        self.assertIs(sounds["AA"], sounds["BB"])
+        self.assertIs(sounds["AA"], sounds["CC"])
+        self.assertEqual(sounds["DD"], ())
+
+    def test_unknown_endpoint_limits_are_rejected(self):
+        with self.assertRaisesRegex(ValueError, "favourites"):
+            asyncio.run(
+                util_bootstrap.get_rest_devices(
+                    "user@example.com",
+                    "password",
+                    endpoint_concurrency_limits={"sounds": 1, "favourites": 1},
+                )
+            )
+
+
+class SnapshotHatch(FakeHatch):
+    """FakeHatch with a riot device whose favorites change between runs."""
+
+    favorites_payload = [{"id": 1}]
+    calls: list
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tasks = []
+
+    async def iot_devices(self, **kwargs):
+        self.calls.append("iot_devices")
+        return [
+            {
+                "product": "riot",
+                "name": "Nursery",
+                "thingName": "thing-1",
+                "macAddress": "AA",
+            }
+        ]
+
+    async def favorites(self, **kwargs):
+        return list(self.favorites_payload)
+
+    async def routines(self, **kwargs):
+        return []
+
+    async def content(self, **kwargs):
+        return {"contentItems": [{"id": 2, "title": "Rain"}]}
+
+    def start_background_task(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.append(task)
+        return task
+
+
+class TwoDeviceSnapshotHatch(SnapshotHatch):
+    async def iot_devices(self, **kwargs):
+        self.calls.append("iot_devices")
+        return [
+            {"product": "riot", "name": "Nursery", "thingName": "thing-1", "macAddress": "AA"},
+            {"product": "riot", "name": "Bedroom", "thingName": "thing-2", "macAddress": "BB"},
+        ]
+
+
+class RateLimitedSoundsSnapshotHatch(SnapshotHatch):
+    async def content(self, **kwargs):
+        raise RateError("limited")
+
+
+class SnapshotBootstrapTest(unittest.TestCase):
+    def _run_bootstrap(self, path, on_devices=None, hatch_class=SnapshotHatch, **kwargs):
+        SnapshotHatch.calls = []
+
+        async def run():
+            api, _, devices, _ = await util_bootstrap.get_rest_devices(
+                email="user@example.com",
+                password="hunter2",
+                snapshot_path=path,
+                **kwargs,
+            )
+            if on_devices is not None:
+                on_devices(devices)
+            await asyncio.gather(*api.tasks)
+            return api, devices
+
+        with (
+            patch.object(util_bootstrap, "Hatch", hatch_class),
+            patch.object(util_bootstrap, "Contentful", MagicMock()),
+            patch.object(util_bootstrap, "AwsHttp", FakeAwsHttp),
+            patch.object(util_bootstrap, "AwsCredentialsProvider", MagicMock()),
+            patch.object(util_bootstrap, "io", MagicMock()),
+            patch.object(
+                util_bootstrap, "IotShadowClient", lambda *a, **kw: FakeShadowClient()
+            ),
+            patch.object(
+                util_bootstrap,
+                "websockets_with_default_aws_signing",
+                MagicMock(return_value=MagicMock()),
+            ),
+        ):
+            return asyncio.run(run())
+
+    def test_warm_start_skips_metadata_fetch(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "snapshot.json"
+            self._run_bootstrap(path)
+            self.assertEqual(SnapshotHatch.calls, ["iot_devices"])
+            self.assertTrue(path.exists())
+
+            api, devices = self._run_bootstrap(path)
+
+            self.assertEqual(SnapshotHatch.calls, [])
+            self.assertEqual(api.tasks, [])
+            self.assertEqual(devices[0].favorites, [{"id": 1}])
+            self.assertEqual(devices[0].sounds, ({"id": 2, "title": "Rain"},))
+
+    def test_stale_snapshot_revalidates_and_notifies(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "snapshot.json"
+            self._run_bootstrap(path)
+            SnapshotHatch.favorites_payload = [{"id": 1}, {"id": 3}]
+            notified = []
+
+            def register(devices):
+                # before revalidation, devices start from the snapshot contents
+                self.assertEqual(devices[0].favorites, [{"id": 1}])
+                devices[0].register_callback(lambda: notified.append(True))
+
+            try:
+                api, devices = self._run_bootstrap(
+                    path, on_devices=register, snapshot_max_age=-1
+                )
+            finally:
+                SnapshotHatch.favorites_payload = [{"id": 1}]
+
+            self.assertEqual(SnapshotHatch.calls, ["iot_devices"])
+            self.assertEqual(len(api.tasks), 1)
+            self.assertEqual(devices[0].favorites, [{"id": 1}, {"id": 3}])
+            self.assertEqual(notified, [True])
+            saved = json.loads(path.read_text())
+            self.assertEqual(saved["favorites"]["AA"], [{"id": 1}, {"id": 3}])
+
+    def test_snapshot_with_unavailable_sounds_is_not_saved(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "snapshot.json"
+            _, devices = self._run_bootstrap(
+                path, hatch_class=RateLimitedSoundsSnapshotHatch
+            )
+
+            self.assertEqual(devices[0].sounds, ())
+            self.assertFalse(path.exists())
+
+    def test_failed_revalidation_keeps_the_saved_sections(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "snapshot.json"
+            self._run_bootstrap(path)
+            saved = path.read_text()
+
+            _, devices = self._run_bootstrap(
+                path, hatch_class=RateLimitedSoundsSnapshotHatch, snapshot_max_age=-1
+            )
+
+            self.assertEqual(devices[0].sounds, ({"id": 2, "title": "Rain"},))
+            self.assertEqual(path.read_text(), saved)
+
+    def test_stale_snapshot_updates_every_changed_device(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "snapshot.json"
+            self._run_bootstrap(path, hatch_class=TwoDeviceSnapshotHatch)
+            SnapshotHatch.favorites_payload = [{"id": 1}, {"id": 3}]
+            try:
+                _, devices = self._run_bootstrap(
+                    path, hatch_class=TwoDeviceSnapshotHatch, snapshot_max_age=-1
+                )
+            finally:
+                SnapshotHatch.favorites_payload = [{"id": 1}]
+
+            self.assertEqual(
+                [device.favorites for device in devices],
+                [[{"id": 1}, {"id": 3}], [{"id": 1}, {"id": 3}]],
+            )
+
+
+class FailingDevice:
+    def __init__(self, name, error=None):
+        self.device_name = name
+        self.error = error
+        self.subscribed = False
+        self.unsubscribed = False
+
+    async def async_subscribe(self):
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        self.subscribed = True
+
+    async def async_unsubscribe(self):
+        self.unsubscribed = True
+
+
+class DeltaRejectingConnection(FakeShadowConnection):
+    """Answers the subscription to the rejected thing's delta topic with SUBACK 0x80."""
+
+    def __init__(self, rejected_thing: str):
+        super().__init__()
+        self.rejected_thing = rejected_thing
+
+    def subscribe(self, topic, qos, callback=None):
+        if topic == f"$aws/things/{self.rejected_thing}/shadow/update/delta":
+            return done_future({"packet_id": 0, "topic": topic, "qos": None}), 0
+        return super().subscribe(topic, qos, callback)
+
+
+class SubscribeAllTest(unittest.TestCase):
+    def test_failed_devices_are_left_out(self):
+        devices = [
+            FailingDevice("Nursery"),
+            FailingDevice("Kitchen", TimeoutError()),
+            FailingDevice("Bedroom"),
+        ]
+
+        subscribed = asyncio.run(util_bootstrap._subscribe_all(devices))
+
+        self.assertEqual(subscribed, [devices[0], devices[2]])
+        self.assertTrue(devices[2].subscribed)
+        self.assertEqual([device.unsubscribed for device in devices], [False, True, False])
+
+    def test_failed_devices_drop_their_partial_subscriptions(self):
+        connection = DeltaRejectingConnection("thing-1")
+        self.addCleanup(connection.close)
+        shadow_client = IotShadowClient(connection)
+        devices = []
+        for index in range(3):
+            connection.add_thing(f"thing-{index}", reported={"connected": True})
+            devices.append(RestIot(f"Device {index}", f"thing-{index}", str(index), shadow_client, subscribe=False))
+
+        with self.assertLogs("hatch_rest_api.util_bootstrap", "ERROR"):
+            subscribed = asyncio.run(util_bootstrap._subscribe_all(devices))
+
+        self.assertEqual(subscribed, [devices[0], devices[2]])
+        self.assertFalse([topic for topic in connection._subscriptions if "/thing-1/" in topic])
+        self.assertEqual(len(connection._subscriptions), 6)
+
+    def test_all_failing_raises(self):
+        devices = [FailingDevice("Nursery", TimeoutError())]
+
+        with self.assertRaisesRegex(BaseError, "any hatch device"):
+            asyncio.run(util_bootstrap._subscribe_all(devices))
+
+    def test_subscriptions_run_concurrently(self):
+        class SlowDevice(FailingDevice):
+            async def async_subscribe(self):
+                await asyncio.sleep(0.05)
+
+        async def run():
+            start = asyncio.get_running_loop().time()
+            await util_bootstrap._subscribe_all(
+                [SlowDevice(str(index)) for index in range(50)]
+            )
+            return asyncio.get_running_loop().time() - start
+
+        self.assertLess(asyncio.run(run()), 0.5)
+
+
+class CredentialRefreshBootstrapTest(unittest.TestCase):
+    def setUp(self):
+        self.connection = FakeShadowConnection()
+        self.addCleanup(self.connection.close)
+        for device in fake_iot_devices(2):
+            self.connection.add_thing(device["thingName"], reported={"connected": True})
+
+    def _run_refreshing_bootstrap(self, refresher_class, during, **kwargs):
+        async def run():
+            async with FakeHatchServer(fake_iot_devices(2)) as server:
+                api, _, devices, _ = await util_bootstrap.get_rest_devices(
+                    "user@example.com",
+                    "password",
+                    api_url=server.api_url,
+                    contentful_url=server.contentful_url,
+                    cognito_url=server.cognito_url,
+                    mqtt_connection=self.connection,
+                    refresh_credentials=True,
+                    resync_jitter=0,
+                    **kwargs,
+                )
+                await during(api)
+                await api.cleanup_client_session()
+            return devices
+
+        with patch.object(util_bootstrap, "CredentialRefresher", refresher_class):
+            return asyncio.run(run())
+
+    def test_lost_session_after_a_refresh_resyncs_the_devices(self):
+        refreshers = []
+
+        class RecordingRefresher(util_bootstrap.CredentialRefresher):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                refreshers.append(self)
+
+        async def lose_session(api):
+            self.connection._subscriptions.clear()
+            await refreshers[0].on_session_lost()
+
+        devices = self._run_refreshing_bootstrap(RecordingRefresher, lose_session)
+
+        self.assertEqual(len(devices), 2)
+        self.assertEqual(len(self.connection._subscriptions), 6)
+
+    def test_relogin_hands_the_new_token_to_alarm_devices(self):
+        refreshers = []
+
+        class RecordingRefresher(util_bootstrap.CredentialRefresher):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                refreshers.append(self)
+
+        async def relogin(api):
+            async def login(**kwargs):
+                return "new-auth-token"
+
+            api.login = login
+            self.assertEqual(await refreshers[0].relogin(), "new-auth-token")
+
+        devices = self._run_refreshing_bootstrap(RecordingRefresher, relogin)
+
+        self.assertIsInstance(devices[1], RestoreV5)
+        self.assertEqual(devices[1]._alarm_auth_token, "new-auth-token")
+
+    def test_refresh_failure_is_reported(self):
+        failures = []
+
+        class RejectedRefresher(util_bootstrap.CredentialRefresher):
+            async def run(self, mqtt_connection):
+                raise AuthError("rejected")
+
+        async def settle(api):
+            await asyncio.sleep(0)
+
+        self._run_refreshing_bootstrap(
+            RejectedRefresher, settle, on_credential_refresh_failed=failures.append
+        )
+
+        self.assertEqual([type(error) for error in failures], [AuthError])
+
+
 if __name__ == "__main__":
     unittest.main()
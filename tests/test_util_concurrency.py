@@ -0,0 +1,69 @@
+import asyncio
+import unittest
+
+from hatch_rest_api.errors import RateError
+from hatch_rest_api.util_concurrency import BoundedFanOut, gather_or_cancel
+
+
+class BoundedFanOutTest(unittest.TestCase):
+    def test_map_preserves_key_order(self):
+        async def fetch(key):
+            await asyncio.sleep(0.01 * (3 - key))
+            return key * 10
+
+        result = asyncio.run(BoundedFanOut(max_in_flight=3).map("x", [0, 1, 2], fetch))
+
+        self.assertEqual(list(result.items()), [(0, 0), (1, 10), (2, 20)])
+
+    def test_never_exceeds_global_or_endpoint_limit(self):
+        in_flight = {"all": 0, "sounds": 0}
+        peak = {"all": 0, "sounds": 0}
+
+        def request(endpoint):
+            async def fetch(key):
+                for name in {"all", endpoint} & in_flight.keys():
+                    in_flight[name] += 1
+                    peak[name] = max(peak[name], in_flight[name])
+                await asyncio.sleep(0.01)
+                for name in {"all", endpoint} & in_flight.keys():
+                    in_flight[name] -= 1
+                return key
+
+            return fetch
+
+        async def run():
+            fan_out = BoundedFanOut(max_in_flight=4, endpoint_limits={"sounds": 1})
+            await asyncio.gather(
+                fan_out.map("sounds", range(5), request("sounds")),
+                fan_out.map("favorites", range(10), request("favorites")),
+            )
+
+        asyncio.run(run())
+
+        self.assertEqual(peak["sounds"], 1)
+        self.assertEqual(peak["all"], 4)
+
+    def test_first_error_propagates_unchanged_and_cancels_siblings(self):
+        cancelled = []
+
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def rate_limited():
+            raise RateError("limited")
+
+        with self.assertRaises(RateError):
+            asyncio.run(gather_or_cancel(slow(), rate_limited()))
+        self.assertEqual(cancelled, [True])
+
+    def test_rejects_non_positive_limit(self):
+        with self.assertRaises(ValueError):
+            BoundedFanOut(max_in_flight=0)
+
+
+if __name__ == "__main__":
+    unittest.main()